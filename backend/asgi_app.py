@@ -0,0 +1,291 @@
+"""
+ASGI entrypoint used when SERVER_MODE=async (see gunicorn.conf.py).
+
+POST /chat and POST /chat/stream run natively on the event loop (through
+`graph.ainvoke` and `streaming_graph.astream`), so a single process
+can hold many chats that are waiting on Groq instead of one per sync worker.
+Every other route is served by the Flask app through asgiref's WSGI adapter,
+on a thread pool so slow routes such as /auth/login don't queue behind each other.
+"""
+import asyncio
+import json
+import logging
+import time
+from tempfile import SpooledTemporaryFile
+
+from asgiref.sync import AsyncToSync, sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask_jwt_extended import decode_token
+from jwt.exceptions import ExpiredSignatureError
+from langchain_core.messages import HumanMessage, AIMessage
+
+from flask_server_a import (
+    app, graph, streaming_graph, llm, history_manager, get_session_history_wrapper,
+    STREAM_STAGES, ANSWER_ERROR_MESSAGE, sse_event,
+)
+from metrics import REQUEST_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadPoolWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """
+    asgiref runs WSGI apps with thread_sensitive=True, i.e. one request at a time on a single
+    thread per process. Flask is thread-safe, so this instance runs it on the executor's thread
+    pool instead, using only the adapter's documented helpers (build_environ, start_response).
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            raise ValueError("WSGI wrapper received a non-HTTP scope")
+        self.scope = scope
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message["type"] != "http.request":
+                    raise ValueError("WSGI wrapper received a non-HTTP-request message")
+                body.write(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            body.seek(0)
+            # Lets the worker thread send response messages on the event loop
+            self.sync_send = AsyncToSync(send)
+            await sync_to_async(self.run_in_thread, thread_sensitive=False)(body)
+
+    def run_in_thread(self, body):
+        environ = self.build_environ(self.scope, body)
+        response = self.wsgi_application(environ, self.start_response)
+        try:
+            bytes_sent = 0
+            for output in response:
+                if not self.response_started:
+                    self.response_started = True
+                    self.sync_send(self.response_start)
+                # Never send more than the Content-Length the app declared
+                if self.response_content_length is not None:
+                    output = output[:self.response_content_length - bytes_sent]
+                self.sync_send({"type": "http.response.body", "body": output, "more_body": True})
+                bytes_sent += len(output)
+                if bytes_sent == self.response_content_length:
+                    break
+        finally:
+            # Runs Flask's response close hooks, as a WSGI server would
+            if hasattr(response, "close"):
+                response.close()
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({"type": "http.response.body"})
+
+
+class ThreadPoolWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadPoolWsgiToAsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+flask_asgi = ThreadPoolWsgiToAsgi(app)
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_json(send, status: int, payload: dict):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            # Matches the default CORS(app) policy of the Flask routes
+            (b"access-control-allow-origin", b"*"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def authenticate(headers: dict):
+    """
+    Validate the bearer token the same way @jwt_required() does for the Flask routes.
+
+    Returns:
+        (user, None) on success, or (None, (status, payload)) with the error response.
+    """
+    auth_header = headers.get(b"authorization", b"").decode()
+    if not auth_header.startswith("Bearer "):
+        return None, (401, {"error": "Missing or invalid access token",
+                            "details": "Missing Authorization Header"})
+    try:
+        with app.app_context():
+            claims = decode_token(auth_header[len("Bearer "):])
+    except ExpiredSignatureError:
+        return None, (401, {"error": "Token has expired"})
+    except Exception as e:
+        return None, (422, {"error": "Invalid token", "details": str(e)})
+
+    if claims.get("type") != "access":
+        return None, (422, {"error": "Invalid token", "details": "Only access tokens are allowed"})
+
+    return {
+        "user_id": claims.get("sub"),
+        "role": claims.get("role", "employee"),
+        "employee_code": claims.get("employee_code"),
+        "email": claims.get("email"),
+    }, None
+
+
+async def chat(scope, receive, send):
+    """Async counterpart of the Flask /chat route."""
+    user, error = authenticate(dict(scope["headers"]))
+    if error:
+        await send_json(send, *error)
+        return
+
+    try:
+        data = json.loads(await read_body(receive) or b"{}")
+    except ValueError:
+        await send_json(send, 400, {"response": "Request body must be JSON."})
+        return
+
+    user_query = data.get("message")
+    session_id = data.get("session_id", "default_session")
+    if not user_query:
+        await send_json(send, 400, {"response": "No message provided."})
+        return
+
+    started = time.perf_counter()
+    try:
+        # Loaded off the event loop: with SESSION_BACKEND=sql this reads the database. (The
+        # graph_with_history wrapper of the Flask route would load it synchronously here.)
+        history = await asyncio.to_thread(get_session_history_wrapper, user["user_id"], session_id)
+        ans = await graph.ainvoke({
+            "question": user_query,
+            "employee_code": user["employee_code"],
+            "role": user["role"],
+            "chat_history": list(history.messages),
+        })
+        logger.info(f"Query Type: {ans.get('query_type')} (via {ans.get('classification_source')})")
+        logger.info(f"Final Answer: {ans.get('final_answer')}")
+        history.add_messages([HumanMessage(content=user_query), AIMessage(content=ans["final_answer"])])
+        history_manager.fold_in_background(history, f"{user['user_id']}:{session_id}")
+        REQUEST_DURATION.labels(endpoint="chat_async", query_type=ans.get("query_type") or "unknown").observe(
+            time.perf_counter() - started)
+        await send_json(send, 200, {"response": ans["final_answer"]})
+
+    except Exception as e:
+        logger.error(f"Error during processing: {e}")
+        await send_json(send, 500, {"response": "Sorry, something went wrong on the server. Please try again later."})
+
+
+async def chat_stream(scope, receive, send):
+    """Async counterpart of the Flask /chat/stream route: same Server-Sent Events."""
+    user, error = authenticate(dict(scope["headers"]))
+    if error:
+        await send_json(send, *error)
+        return
+
+    try:
+        data = json.loads(await read_body(receive) or b"{}")
+    except ValueError:
+        await send_json(send, 400, {"response": "Request body must be JSON."})
+        return
+
+    user_query = data.get("message")
+    session_id = data.get("session_id", "default_session")
+    if not user_query:
+        await send_json(send, 400, {"response": "No message provided."})
+        return
+
+    # May load the history from the session backend
+    history = await asyncio.to_thread(get_session_history_wrapper, user["user_id"], session_id)
+    inputs = {
+        "question": user_query,
+        "employee_code": user["employee_code"],
+        "role": user["role"],
+        "chat_history": list(history.messages),
+    }
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+            (b"access-control-allow-origin", b"*"),
+        ],
+    })
+
+    async def emit(event: str, payload: dict):
+        await send({"type": "http.response.body", "body": sse_event(event, payload).encode("utf-8"),
+                    "more_body": True})
+
+    started = time.perf_counter()
+    try:
+        state = {}
+        async for update in streaming_graph.astream(inputs, stream_mode="updates"):
+            for node, output in update.items():
+                state.update(output or {})
+                if node in STREAM_STAGES:
+                    payload = {"stage": STREAM_STAGES[node]}
+                    if node == "classify_query":
+                        payload["query_type"] = state.get("query_type")
+                    await emit("stage", payload)
+
+        answer = state.get("final_answer")
+        if answer is None:
+            chunks = []
+            try:
+                async for chunk in llm.astream(state["answer_prompt"],
+                                               config={"metadata": {"stage": "generate_answer",
+                                                                    "query_type": state.get("query_type")}}):
+                    if chunk.content:
+                        chunks.append(chunk.content)
+                        await emit("token", {"text": chunk.content})
+                answer = "".join(chunks)
+            except Exception as e:
+                logger.error(f"Error streaming final answer: {e}")
+                answer = ANSWER_ERROR_MESSAGE
+                await emit("token", {"text": answer})
+        else:
+            await emit("token", {"text": answer})
+
+        # Commit the turn to memory only once the full answer is known
+        history.add_messages([HumanMessage(content=user_query), AIMessage(content=answer)])
+        history_manager.fold_in_background(history, f"{user['user_id']}:{session_id}")
+        REQUEST_DURATION.labels(endpoint="chat_stream_async",
+                                query_type=state.get("query_type") or "unknown").observe(time.perf_counter() - started)
+        await emit("done", {"response": answer})
+
+    except Exception as e:
+        logger.error(f"Error during streaming: {e}")
+        await emit("error", {"response": "Sorry, something went wrong on the server. Please try again later."})
+
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def asgi_app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http" and scope["path"] == "/chat" and scope["method"] == "POST":
+        await chat(scope, receive, send)
+    elif scope["type"] == "http" and scope["path"] == "/chat/stream" and scope["method"] == "POST":
+        await chat_stream(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
@@ -9,14 +9,69 @@ from flask_jwt_extended import (
 )
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
+
+from config import Config
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are queued or a hash doesn't finish in time."""
+
+
+# PBKDF2 runs on a small bounded pool so a login storm queues (and is turned away with a 503)
+# instead of occupying every request thread. hashlib.pbkdf2_hmac releases the GIL, so threads
+# hash on separate cores; unlike a process pool they don't re-import the app's __main__.
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(Config.PASSWORD_HASH_MAX_PENDING)
+
+
+def _get_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS,
+                                            thread_name_prefix="password-hash")
+        return _hash_pool
+
+
+def _run_hashing(func, *args):
+    if Config.PASSWORD_HASH_WORKERS <= 0:
+        return func(*args)
+    if not _hash_slots.acquire(timeout=Config.PASSWORD_HASH_TIMEOUT_SECONDS):
+        raise PasswordHasherBusy("Password hashing queue is full")
+    try:
+        future = _get_hash_pool().submit(func, *args)
+    except Exception:
+        _hash_slots.release()
+        raise
+    # The slot is freed when the hash finishes, not when the caller stops waiting, so
+    # PASSWORD_HASH_MAX_PENDING bounds the hashes actually queued or running
+    future.add_done_callback(lambda _: _hash_slots.release())
+    try:
+        return future.result(timeout=Config.PASSWORD_HASH_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        future.cancel()  # drops it if it hasn't started yet
+        raise PasswordHasherBusy("Password hashing timed out")
+
+
+def password_hash_method() -> str:
+    return f"pbkdf2:sha256:{Config.PASSWORD_HASH_ITERATIONS}"
+
 
 # Hash the user's password
 def hash_password(password: str) -> str:
-    return generate_password_hash(password, method='pbkdf2:sha256')
+    return _run_hashing(generate_password_hash, password, password_hash_method())
 
 # Verify password on login
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return check_password_hash(hashed_password, plain_password)
+    return _run_hashing(check_password_hash, hashed_password, plain_password)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when a stored hash was made with a different method or cost than configured."""
+    return hashed_password.split("$", 1)[0] != password_hash_method()
 
 
 def create_tokens(user_id: int, role: str, employee_code: int, email: str):
@@ -5,7 +5,9 @@ from auth import (
     hash_password,
     verify_password,
     validate_password,
-    create_tokens
+    needs_rehash,
+    create_tokens,
+    PasswordHasherBusy
 )
 import logging
 import mysql.connector
@@ -14,14 +16,14 @@ import re
 # from flask_server_a import limiter
 
 
-def create_auth_blueprint(db):
+def create_auth_blueprint(engine):
     auth_bp = Blueprint('auth', __name__)
     logger = logging.getLogger(__name__)
 
     @auth_bp.route('/signup', methods=['POST'])
     # @limiter.limit("5 per minute")
     def signup():
-        if db is None:
+        if engine is None:
             logger.error("DB not initialized")
             return jsonify({"error": "Database not connected"}), 500
         try:
@@ -57,7 +59,7 @@ def create_auth_blueprint(db):
             cursor = None
 
             try:
-                conn = db._engine.raw_connection()
+                conn = engine.raw_connection()
                 cursor = conn.cursor(dictionary=True)
 
                 # Check if employee  int the company records
@@ -127,6 +129,9 @@ def create_auth_blueprint(db):
                 if cursor: cursor.close()
                 if conn: conn.close()
 
+        except PasswordHasherBusy:
+            logger.warning("Password hashing queue full, rejecting signup")
+            return jsonify({"error": "Too many requests, please try again shortly"}), 503
         except Exception as e:
             logger.exception(f"Signup failed: {str(e)}")
             return jsonify({"error": "Internal server error"}), 500
@@ -134,7 +139,7 @@ def create_auth_blueprint(db):
     @auth_bp.route('/login', methods=['POST'])
     # @limiter.limit("5 per minute")
     def login():
-        if db is None:
+        if engine is None:
             logger.error("DB not initialized")
             return jsonify({"error": "Database not connected"}), 500
         try:
@@ -158,7 +163,7 @@ def create_auth_blueprint(db):
             cursor = None
 
             try:
-                conn = db._engine.raw_connection()
+                conn = engine.raw_connection()
                 cursor = conn.cursor(dictionary=True)
 
                 cursor.execute("""
@@ -174,6 +179,16 @@ def create_auth_blueprint(db):
                 if not verify_password(password, user["password_hash"]):
                     return jsonify({"error": "Invalid email or password"}), 401
 
+                # Upgrade hashes made with another cost while the plain password is at hand
+                if needs_rehash(user["password_hash"]):
+                    try:
+                        cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s",
+                                       (hash_password(password), user["id"]))
+                        conn.commit()
+                        logger.info(f"Rehashed password of user {user['id']} with the configured cost")
+                    except Exception as e:
+                        logger.warning(f"Password rehash failed for user {user['id']}: {e}")
+
                 access_token, refresh_token = create_tokens(
                     user_id=user["id"],
                     email=user["email"],
@@ -203,6 +218,9 @@ def create_auth_blueprint(db):
                 if cursor: cursor.close()
                 if conn: conn.close()
 
+        except PasswordHasherBusy:
+            logger.warning("Password hashing queue full, rejecting login")
+            return jsonify({"error": "Too many requests, please try again shortly"}), 503
         except Exception as e:
             logger.exception(f"Login failed: {str(e)}")
             return jsonify({"error": "Internal server error"}), 500
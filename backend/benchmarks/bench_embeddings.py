@@ -0,0 +1,66 @@
+"""
+Embedding throughput of the policy indexing backends.
+
+    cd backend
+    python -m benchmarks.bench_embeddings --backends torch onnx onnx-int8 --processes 1 0 --repeat 20
+
+Chunks the documents in POLICY_DOCS_DIR the way rag_index.py does, repeats
+them --repeat times to stand in for a larger corpus, and embeds them with
+each backend, batch size and process count. Reports chunks per second and
+the mean cosine similarity of each backend's vectors to the torch ones, so
+the speed of the quantized model can be weighed against its drift.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from config import Config
+from embedding_pipeline import EmbeddingPipeline, resolve_backend
+from rag_index import load_documents, split_documents
+
+
+def cosine_agreement(vectors: np.ndarray, reference: np.ndarray) -> float:
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    return float(np.mean(np.sum(vectors * reference, axis=1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[32, 64, 128])
+    parser.add_argument("--processes", nargs="+", type=int, default=[1, 0], help="0 uses every core")
+    parser.add_argument("--repeat", type=int, default=10, help="Copies of the policy chunks to embed")
+    parser.add_argument("--docs", default=None, help="Directory of policy documents (default: POLICY_DOCS_DIR)")
+    args = parser.parse_args()
+
+    chunks = split_documents(load_documents(args.docs or Config.POLICY_DOCS_DIR),
+                             Config.POLICY_CHUNK_SIZE, Config.POLICY_CHUNK_OVERLAP)
+    texts = [chunk.page_content for chunk in chunks.values()] * args.repeat
+    print(f"{len(texts)} chunks\n")
+
+    reference = None
+    print(f"{'backend':>10} {'batch':>6} {'procs':>6} {'chunks/s':>9} {'seconds':>8} {'cosine vs torch':>16}")
+    for backend in args.backends:
+        if resolve_backend(backend) != backend:
+            print(f"{backend:>10}  skipped: optimum[onnxruntime] is not installed")
+            continue
+        for processes in args.processes:
+            for batch_size in args.batch_sizes:
+                pipeline = EmbeddingPipeline(backend, batch_size=batch_size, processes=processes,
+                                             progress=lambda done, total, elapsed: None)
+                pipeline.embed(texts[:batch_size])  # load the model outside the timed window
+                started = time.perf_counter()
+                vectors = np.asarray(pipeline.embed(texts), dtype=np.float32)
+                elapsed = time.perf_counter() - started
+
+                if reference is None and backend == "torch":
+                    reference = vectors
+                agreement = f"{cosine_agreement(vectors, reference):.4f}" if reference is not None else "-"
+                print(f"{backend:>10} {batch_size:>6} {pipeline.processes:>6} {len(texts) / elapsed:>9.1f} "
+                      f"{elapsed:>8.1f} {agreement:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Recall and latency of the HNSW and IVF-PQ policy search indexes against exact flat search.
+
+    cd backend
+    python -m benchmarks.bench_index_types --sizes 10000 100000 1000000 --queries 500
+
+For each corpus size it generates clustered vectors with the dimension of
+the policy embeddings (seeded from index_folder when one exists), builds
+every index type the way rag_index.py does, and reports recall@k against
+the flat index, p50/p95 search latency of single queries, and the size of
+the serialized index, i.e. the memory each worker holds for it (for
+IVF-PQ with POLICY_INDEX_MMAP, mapped from the file instead).
+"""
+import argparse
+import os
+import time
+
+import faiss
+import numpy as np
+
+from vector_index import INDEX_TYPES, build_search_index, configure_search
+
+INDEX_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "index_folder")
+
+
+def seed_centroids(count: int, dimension: int, rng: np.random.Generator) -> np.ndarray:
+    """Cluster centres from the real policy vectors when available, random otherwise."""
+    try:
+        flat = faiss.read_index(os.path.join(INDEX_FOLDER, "index.faiss"))
+        real = flat.reconstruct_n(0, flat.ntotal)
+        return real[rng.integers(0, len(real), count)]
+    except Exception:
+        return rng.normal(size=(count, dimension)).astype(np.float32)
+
+
+def clustered_vectors(size: int, dimension: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = seed_centroids(max(size // 100, 1), dimension, rng)
+    spread = float(np.linalg.norm(centroids, axis=1).mean()) * 0.15 / np.sqrt(dimension)
+    vectors = centroids[rng.integers(0, len(centroids), size)]
+    return (vectors + rng.normal(scale=spread, size=vectors.shape)).astype(np.float32)
+
+
+def search_latencies(index: faiss.Index, queries: np.ndarray, k: int):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(ids[0])
+    return np.array(latencies), np.array(results)
+
+
+def recall(results: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--threads", type=int, default=1, help="faiss OpenMP threads (1 = one request's share)")
+    args = parser.parse_args()
+    faiss.omp_set_num_threads(args.threads)
+    rng = np.random.default_rng(0)
+
+    print(f"{'vectors':>9} {'type':>6} {'build s':>8} {'recall@' + str(args.k):>9} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'index MB':>9}")
+    for size in args.sizes:
+        vectors = clustered_vectors(size + args.queries, args.dimension, rng)
+        corpus, queries = vectors[:size], vectors[size:]
+
+        flat = faiss.IndexFlatL2(args.dimension)
+        flat.add(corpus)
+        truth = None
+        for index_type in INDEX_TYPES:
+            started = time.perf_counter()
+            built = None if index_type == "flat" else build_search_index(corpus, index_type)
+            index = flat if built is None else configure_search(built)
+            build_seconds = time.perf_counter() - started
+
+            latencies, results = search_latencies(index, queries, args.k)
+            if truth is None:
+                truth = results
+            megabytes = faiss.serialize_index(index).nbytes / 1024 / 1024
+            print(f"{size:>9} {index_type:>6} {build_seconds:>8.1f} {recall(results, truth):>9.3f} "
+                  f"{np.percentile(latencies, 50):>7.2f} {np.percentile(latencies, 95):>7.2f} {megabytes:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Per-stage latency and accuracy of candidate models, to decide which stages
+in Config.STAGE_MODELS can use a smaller model.
+
+Runs against the live Groq API, MySQL and the policy index configured in `.env`:
+
+    cd backend
+    python -m benchmarks.bench_model_tiers --models llama-3.1-8b-instant llama-3.3-70b-versatile
+
+Stages and how they are scored:
+- classify: the one-word label matches the corpus label of the question.
+- rag_rephrase: overlap (Jaccard) of the top-5 policy chunks retrieved for the
+  rephrased query with those retrieved for the reference model's rephrasing.
+- sql_reasoning / sql_generation: the two-pass SQL is correct as defined in
+  `bench_sql_generation.is_correct`, with only that stage's model swapped.
+Latency is the model call of the stage alone, measured with a callback.
+Free-text answer stages are not scored automatically.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_groq import ChatGroq
+
+import flask_server_a as server
+from benchmarks.bench_sql_generation import QUESTIONS as SQL_QUESTIONS, is_correct
+from benchmarks.corpus import CONVERSATIONS
+from chat_history import format_chat_history_for_llm
+from config import Config
+from rag_graph2 import rephrase_prompt
+
+STAGES = ["classify", "rag_rephrase", "sql_reasoning", "sql_generation"]
+
+# Policy follow-ups that need the conversation to become a standalone search query
+REPHRASE_CASES = [
+    ([("What is the company's sick leave policy?", "Employees get 10 days of paid sick leave per year.")],
+     "Does it need a medical certificate?"),
+    ([("How many casual leaves can I carry forward?", "Up to 5 casual leaves can be carried forward.")],
+     "What happens to the rest?"),
+    ([("What is the notice period for resignation?", "The notice period is 60 days.")],
+     "Can it be bought out?"),
+    ([("Tell me about the work from home policy.", "Employees may work from home two days a week.")],
+     "Do I need my manager's approval for that?"),
+]
+
+
+class CallTimer(BaseCallbackHandler):
+    """Collects the duration of every chat model call made through the client."""
+
+    def __init__(self):
+        self.durations = []
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                self.durations.append(time.perf_counter() - started)
+
+
+def make_client(model: str):
+    timer = CallTimer()
+    return ChatGroq(model=model, api_key=Config.GROQ_API_KEY, callbacks=[timer]), timer
+
+
+def bench_classify(client, repeat: int) -> tuple:
+    correct = total = 0
+    for conversation in CONVERSATIONS:
+        state = {"question": conversation["turns"][0], "chat_history": []}
+        for _ in range(repeat):
+            response = client.invoke(server.build_classification_prompt(state, ""))
+            correct += server.parse_classification(response.content)["query_type"] == conversation["type"]
+            total += 1
+    return correct, total
+
+
+def retrieve_chunks(vector_store, query: str) -> set:
+    return {doc.page_content for doc in vector_store.similarity_search(query, k=5)}
+
+
+def bench_rag_rephrase(client, repeat: int, reference_queries: dict, vector_store) -> tuple:
+    overlaps = []
+    for index, (turns, question) in enumerate(REPHRASE_CASES):
+        history = [message for q, a in turns for message in (HumanMessage(q), AIMessage(a))]
+        prompt = rephrase_prompt.invoke({"question": question, "chat_history": format_chat_history_for_llm(history)})
+        for _ in range(repeat):
+            query = client.invoke(prompt).content.strip()
+            if index not in reference_queries:
+                reference_queries[index] = retrieve_chunks(vector_store, query)
+            found, expected = retrieve_chunks(vector_store, query), reference_queries[index]
+            overlaps.append(len(found & expected) / len(found | expected) if found | expected else 1.0)
+    return sum(overlaps), len(overlaps)
+
+
+def bench_sql(stage: str, client, repeat: int) -> tuple:
+    # generate_sql_two_pass reads the stage clients from module globals at call time
+    attribute = "sql_reasoning_llm" if stage == "sql_reasoning" else "sql_llm"
+    original = getattr(server, attribute)
+    setattr(server, attribute, client)
+    correct = total = 0
+    try:
+        for role, employee_code, question, expected_authorized, expected_tables in SQL_QUESTIONS:
+            state = {"role": role, "employee_code": employee_code, "question": question, "chat_history": []}
+            table_info = server.get_table_info_for_role(role, question)
+            for _ in range(repeat):
+                output = server.generate_sql_two_pass(state, table_info, "")
+                correct += is_correct(output, expected_authorized, expected_tables)
+                total += 1
+    finally:
+        setattr(server, attribute, original)
+    return correct, total
+
+
+def run(models: list, stages: list, repeat: int):
+    vector_store = server.policy_index.current
+    # The reference model (the configured default) runs first so others are compared against it
+    models = [Config.LLM_MODEL] + [model for model in models if model != Config.LLM_MODEL]
+    reference_queries = {}
+
+    print(f"{'stage':<16} {'model':<28} {'p50 (s)':>8} {'p95 (s)':>8} {'accuracy':>9}  configured")
+    for stage in stages:
+        for model in models:
+            client, timer = make_client(model)
+            if stage == "classify":
+                score, total = bench_classify(client, repeat)
+            elif stage == "rag_rephrase":
+                score, total = bench_rag_rephrase(client, repeat, reference_queries, vector_store)
+            else:
+                score, total = bench_sql(stage, client, repeat)
+
+            latencies = sorted(timer.durations) or [0.0]
+            p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+            configured = "*" if Config.STAGE_MODELS.get(stage) == model else ""
+            print(f"{stage:<16} {model:<28} {statistics.median(latencies):>8.2f} {p95:>8.2f} "
+                  f"{score / total if total else 0:>9.0%}  {configured}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", nargs="+", default=[Config.LLM_FAST_MODEL, Config.LLM_MODEL])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per question, stage and model")
+    args = parser.parse_args()
+    run(args.models, args.stages, args.repeat)
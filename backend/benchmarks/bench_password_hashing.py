@@ -0,0 +1,64 @@
+"""
+Logins per second per core for PBKDF2-SHA256 password verification.
+
+    cd backend
+    python -m benchmarks.bench_password_hashing --iterations 600000 1000000 --workers 2 --clients 8
+
+For each cost it reports verifications per second on the calling thread
+(one core) and through the hashing pool used by `/auth/login` with
+--workers threads and --clients concurrent callers. No database
+or network is needed.
+"""
+import argparse
+import os
+import threading
+import time
+
+
+def measure(verify, password: str, hashed: str, seconds: float, clients: int) -> float:
+    done = [0] * clients
+    stop_at = time.perf_counter() + seconds
+
+    def client(index):
+        while time.perf_counter() < stop_at:
+            verify(password, hashed)
+            done[index] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(done) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", nargs="+", type=int, default=[600000, 1000000])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Hashing threads")
+    parser.add_argument("--clients", type=int, default=None, help="Concurrent callers (default 2 x workers)")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    clients = args.clients or 2 * args.workers
+
+    # auth reads its pool settings from Config at import time
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    os.environ["PASSWORD_HASH_MAX_PENDING"] = str(max(clients, 1))
+    from werkzeug.security import check_password_hash, generate_password_hash
+
+    import auth
+
+    password = "Benchmark#2024"
+    print(f"{'iterations':>11} {'1 core/s':>9} {'ms/login':>9} {'pool/s':>8} {'pool/s/worker':>14}")
+    for iterations in args.iterations:
+        hashed = generate_password_hash(password, method=f"pbkdf2:sha256:{iterations}")
+        inline = measure(lambda p, h: check_password_hash(h, p), password, hashed, args.seconds, 1)
+        auth.verify_password(password, hashed)  # start the pool outside the timed window
+        pooled = measure(auth.verify_password, password, hashed, args.seconds, clients)
+        print(f"{iterations:>11} {inline:>9.1f} {1000 / inline:>9.1f} {pooled:>8.1f} "
+              f"{pooled / args.workers:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
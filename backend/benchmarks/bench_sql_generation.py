@@ -0,0 +1,77 @@
+"""
+Compare one-pass and two-pass SQL generation on a fixed question set.
+
+Runs against the live Groq API and MySQL database configured in `.env`:
+
+    cd backend
+    python -m benchmarks.bench_sql_generation --repeat 3
+
+For every question and mode it records wall-clock latency and whether the
+generated SQL is correct: the access decision matches the expectation, the
+query executes, and it reads from the expected tables. Queries run through
+the app's SQLExecutor, so the read-only guard, row cap and statement
+timeout apply exactly as in production.
+"""
+import argparse
+import statistics
+import time
+
+import flask_server_a as server
+
+# (role, employee_code, question, expected_authorized, expected_tables)
+QUESTIONS = [
+    ("employee", 101, "How many sick leaves do I have?", True, ["leave_balances"]),
+    ("employee", 101, "What is my designation?", True, ["employees"]),
+    ("employee", 101, "Who is my manager?", True, ["employees"]),
+    ("employee", 101, "What is my gross salary?", True, ["salary"]),
+    ("employee", 101, "What is Neha Reddy's salary?", False, []),
+    ("manager", 201, "Who are my direct reports?", True, ["employees"]),
+    ("manager", 201, "Show the leave balances of my team", True, ["leave_balances", "employees"]),
+    ("manager", 201, "What are the phone numbers of my team members?", False, []),
+    ("hr_admin", 301, "List employees hired after 2022 in the engineering department", True, ["employees"]),
+    ("hr_admin", 301, "What is Karan's net salary for last month?", True, ["salary"]),
+]
+
+MODES = {
+    "two_pass": server.generate_sql_two_pass,
+    "single_pass": server.generate_sql_single_pass,
+}
+
+
+def is_correct(output: dict, role: str, expected_authorized: bool, expected_tables: list) -> bool:
+    query = output.get("sql_query", "")
+    if not expected_authorized:
+        return not query or output.get("sql_authorized") is False
+    if not query or output.get("error"):
+        return False
+    if not all(table in query.lower() for table in expected_tables):
+        return False
+    # SQLExecutor refuses non-read-only SQL and reports failures as "Error: ..." instead of raising
+    return not server.sql_executor.run(query, role).startswith("Error")
+
+
+def run(repeat: int):
+    results = {mode: {"latencies": [], "correct": 0, "total": 0} for mode in MODES}
+    for role, employee_code, question, expected_authorized, expected_tables in QUESTIONS:
+        state = {"role": role, "employee_code": employee_code, "question": question, "chat_history": []}
+        table_info = server.get_table_info_for_role(role, question)
+        for mode, generate in MODES.items():
+            for _ in range(repeat):
+                start = time.perf_counter()
+                output = generate(state, table_info, "")
+                results[mode]["latencies"].append(time.perf_counter() - start)
+                results[mode]["total"] += 1
+                results[mode]["correct"] += is_correct(output, role, expected_authorized, expected_tables)
+
+    print(f"{'mode':<12} {'p50 (s)':>8} {'p95 (s)':>8} {'mean (s)':>9} {'correct':>9}")
+    for mode, result in results.items():
+        latencies = sorted(result["latencies"])
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print(f"{mode:<12} {statistics.median(latencies):>8.2f} {p95:>8.2f} "
+              f"{statistics.mean(latencies):>9.2f} {result['correct']:>4}/{result['total']:<4}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per question and mode")
+    run(parser.parse_args().repeat)
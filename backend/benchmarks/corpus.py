@@ -0,0 +1,40 @@
+"""
+Question corpus for the offline benchmarks, spread across the three query types.
+Each conversation runs in its own session; later turns exercise history handling.
+"""
+from benchmarks.sqlite_db import EMPLOYEE_CODE, HR_ADMIN_CODE, MANAGER_CODE
+
+CONVERSATIONS = [
+    # DATABASE
+    {"type": "DATABASE", "role": "employee", "employee_code": EMPLOYEE_CODE,
+     "turns": ["How many casual leaves do I have?", "And how many sick leaves?"]},
+    {"type": "DATABASE", "role": "employee", "employee_code": EMPLOYEE_CODE,
+     "turns": ["Who is my manager?"]},
+    {"type": "DATABASE", "role": "employee", "employee_code": EMPLOYEE_CODE,
+     "turns": ["What is my net salary for the latest month?", "What was my gross salary?"]},
+    {"type": "DATABASE", "role": "employee", "employee_code": EMPLOYEE_CODE,
+     "turns": ["What is my designation and department?"]},
+    {"type": "DATABASE", "role": "manager", "employee_code": MANAGER_CODE,
+     "turns": ["List the employees who report to me.", "Which of my team members are on probation?"]},
+    {"type": "DATABASE", "role": "hr_admin", "employee_code": HR_ADMIN_CODE,
+     "turns": ["What is my hire date?"]},
+    # POLICY
+    {"type": "POLICY", "role": "employee", "employee_code": EMPLOYEE_CODE,
+     "turns": ["What is the company's sick leave policy?", "Does it need a medical certificate?"]},
+    {"type": "POLICY", "role": "employee", "employee_code": EMPLOYEE_CODE,
+     "turns": ["What is the notice period for resignation?"]},
+    {"type": "POLICY", "role": "manager", "employee_code": MANAGER_CODE,
+     "turns": ["What are the rules for work from home?"]},
+    {"type": "POLICY", "role": "employee", "employee_code": EMPLOYEE_CODE,
+     "turns": ["How many public holidays does the company observe?"]},
+    {"type": "POLICY", "role": "hr_admin", "employee_code": HR_ADMIN_CODE,
+     "turns": ["What is the policy on earned leave encashment?"]},
+    # HYBRID
+    {"type": "HYBRID", "role": "employee", "employee_code": EMPLOYEE_CODE,
+     "turns": ["Can I carry forward my remaining casual leaves?"]},
+    {"type": "HYBRID", "role": "employee", "employee_code": EMPLOYEE_CODE,
+     "turns": ["Am I eligible for LTA under the policy given my tenure?"]},
+    {"type": "HYBRID", "role": "manager", "employee_code": MANAGER_CODE,
+     "turns": ["Am I allowed to encash my earned leave balance?", "How many earned leaves do I have left?"]},
+]
+
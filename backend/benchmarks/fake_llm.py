@@ -0,0 +1,205 @@
+"""
+Deterministic stand-in for ChatGroq used by the offline benchmarks.
+
+Responses are replayed from a recordings file keyed by the SHA-256 of the
+prompt, the model name and the structured-output schema name (if any).
+Prompts without a recording get a rule-based answer, so the suite runs
+without any recordings.
+With `upstream` set, misses are forwarded to a real model and recorded.
+Optional simulated latency and jitter make it usable for load testing.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+
+def prompt_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    if hasattr(messages, "to_messages"):
+        messages = messages.to_messages()
+    return "\n".join(f"{m.type}: {m.content}" for m in messages)
+
+
+def prompt_key(text: str, schema_name: str = "", model: str = "") -> str:
+    return hashlib.sha256(f"{model}\n{schema_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+class FakeChatModel(BaseChatModel):
+    """Replaying fake chat model; accepts (and ignores) ChatGroq constructor arguments."""
+
+    model: str = "fake-llama"
+    recordings_path: Optional[str] = None
+    latency: float = 0.0
+    jitter: float = 0.0
+    upstream: Any = None
+    recordings: dict = {}
+    replayed: int = 0
+    synthesized: int = 0
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("recordings_path", os.getenv("FAKE_LLM_RECORDINGS"))
+        kwargs.setdefault("latency", float(os.getenv("FAKE_LLM_LATENCY", 0)))
+        kwargs.setdefault("jitter", float(os.getenv("FAKE_LLM_JITTER", 0)))
+        super().__init__(**kwargs)
+        if self.recordings_path and os.path.exists(self.recordings_path):
+            with open(self.recordings_path) as f:
+                self.recordings = json.load(f)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def save(self) -> None:
+        """Merge the recordings collected from the upstream model into the recordings file."""
+        if not self.recordings_path:
+            return
+        recordings = {}
+        if os.path.exists(self.recordings_path):
+            # Every per-stage model instance saves into the same file
+            with open(self.recordings_path) as f:
+                recordings = json.load(f)
+        with self._lock:
+            recordings.update(self.recordings)
+        with open(self.recordings_path, "w") as f:
+            json.dump(recordings, f, indent=1, sort_keys=True)
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _respond(self, text: str, schema=None) -> str:
+        schema_name = getattr(schema, "__name__", "") if schema else ""
+        key = prompt_key(text, schema_name, self.model)
+        with self._lock:
+            if key in self.recordings:
+                self.replayed += 1
+                return self.recordings[key]
+
+        if self.upstream is not None:
+            if schema:
+                content = json.dumps(self.upstream.with_structured_output(schema).invoke(text))
+            else:
+                content = self.upstream.invoke(text).content
+            with self._lock:
+                self.recordings[key] = content
+            return content
+
+        with self._lock:
+            self.synthesized += 1
+        return synthesize_response(text, schema_name)
+
+    def _result(self, text: str, content: str) -> ChatResult:
+        input_tokens, output_tokens = len(text) // 4, len(content) // 4
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={
+            "token_usage": {"prompt_tokens": input_tokens, "completion_tokens": output_tokens},
+            "model_name": self.model,
+        })
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = prompt_text(messages)
+        content = self._respond(text, kwargs.get("structured_schema"))
+        time.sleep(self._delay())
+        return self._result(text, content)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = prompt_text(messages)
+        content = self._respond(text, kwargs.get("structured_schema"))
+        await asyncio.sleep(self._delay())
+        return self._result(text, content)
+
+    def with_structured_output(self, schema, **kwargs):
+        def parse(prompt):
+            return json.loads(self.invoke(prompt, structured_schema=schema).content)
+
+        async def aparse(prompt):
+            return json.loads((await self.ainvoke(prompt, structured_schema=schema)).content)
+
+        return RunnableLambda(parse, afunc=aparse)
+
+
+# ---------------------------------------------------------------------
+# Rule-based responses for prompts without a recording
+# ---------------------------------------------------------------------
+
+def _last_question(text: str) -> str:
+    matches = re.findall(r"Question:\s*(?:Question:\s*)?(.+)", text)
+    return matches[-1].strip() if matches else text.strip().splitlines()[-1]
+
+
+def _employee_code(text: str) -> str:
+    match = re.search(r"Employee Code:\s*(\d+)", text)
+    return match.group(1) if match else "1001"
+
+
+def classify(question: str) -> str:
+    q = question.lower()
+    personal = re.search(r"\b(i|my|me|am)\b", q) is not None
+    policy = re.search(r"policy|eligible|allowed|rules|can i|carry forward|encash|holiday|notice", q) is not None
+    if personal and policy:
+        return "HYBRID"
+    return "POLICY" if policy or not personal else "DATABASE"
+
+
+def sql_for(question: str, employee_code: str) -> tuple:
+    q = question.lower()
+    if "manager" in q:
+        return ["employees"], (
+            "SELECT m.first_name, m.last_name FROM employees e "
+            f"JOIN employees m ON e.supervisor_id = m.employee_code WHERE e.employee_code = {employee_code}"
+        )
+    if "report" in q or "team" in q:
+        return ["employees"], f"SELECT first_name, last_name FROM employees WHERE supervisor_id = {employee_code}"
+    if "leave" in q:
+        return ["leave_balances"], (
+            f"SELECT leave_type, balance FROM leave_balances WHERE employee_code = {employee_code}"
+        )
+    if "salary" in q or "pay" in q or "bonus" in q:
+        return ["salary_summary"], (
+            "SELECT month, gross_salary, net_salary FROM salary_summary "
+            f"WHERE employee_code = {employee_code} ORDER BY month DESC LIMIT 1"
+        )
+    if "designation" in q or "department" in q:
+        return ["employees", "designations", "departments"], (
+            "SELECT d.title, dp.name FROM employees e JOIN designations d ON e.designation_id = d.id "
+            f"JOIN departments dp ON e.department_id = dp.id WHERE e.employee_code = {employee_code}"
+        )
+    return ["employees"], (
+        f"SELECT first_name, employment_status, hire_date FROM employees WHERE employee_code = {employee_code}"
+    )
+
+
+def synthesize_response(text: str, schema_name: str = "") -> str:
+    question = _last_question(text)
+    if schema_name in ("QueryOutput", "QueryPlanOutput"):
+        tables, query = sql_for(question, _employee_code(text))
+        if schema_name == "QueryOutput":
+            return json.dumps({"query": query})
+        return json.dumps({"authorized": True, "tables": tables, "query": query})
+    if "query classifier" in text:
+        return classify(question)
+    if "Rephrased Search Query" in text:
+        match = re.search(r"Follow-up Question:\s*(.+)", text)
+        return match.group(1).strip() if match else question
+    if "What data needs to be fetched" in text:
+        tables, _ = sql_for(question, _employee_code(text))
+        return f"Fetch the relevant columns from {', '.join(tables)} filtered by the user's employee code."
+    if "running summary" in text:
+        return "The employee asked about their leave balance and HR policies."
+    return f"Here is the information you asked for about: {question}"
@@ -0,0 +1,227 @@
+"""
+Concurrent load test of /chat and /chat/stream under gunicorn, with a simulated Groq.
+
+For each worker configuration the app is started under gunicorn with the
+fake chat model (see `offline_app.py`) against a seeded SQLite database,
+then driven at increasing client concurrency. Every client thread holds a
+JWT minted with `auth.create_tokens` and its own chat sessions. The output
+is a saturation curve per configuration and endpoint: throughput and tail
+latency (to the complete answer) against concurrency.
+
+    cd backend
+    python -m benchmarks.load_test --workers sync:4 gthread:4x8 uvicorn:4 \\
+        --concurrency 1 4 16 64 --latency 0.8 --jitter 0.3 --csv saturation.csv
+
+Worker specs are `<class>:<workers>` or `gthread:<workers>x<threads>`; the
+classes are sync, gthread, gevent (needs gevent installed) and uvicorn,
+which serves `asgi_app.py`.
+"""
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from benchmarks.corpus import CONVERSATIONS
+from benchmarks.run_offline import percentile
+from benchmarks.sqlite_db import HR_ADMIN_CODE, MANAGER_CODE, seed
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# worker spec class -> (gunicorn worker class, app attribute in benchmarks.offline_app)
+WORKER_CLASSES = {
+    "sync": ("sync", "app"),
+    "gthread": ("gthread", "app"),
+    "gevent": ("gevent", "app"),
+    "uvicorn": ("uvicorn.workers.UvicornWorker", "asgi_app"),
+}
+
+
+def parse_worker_spec(spec: str) -> dict:
+    name, _, count = spec.partition(":")
+    if name not in WORKER_CLASSES:
+        raise argparse.ArgumentTypeError(f"Unknown worker class '{name}'")
+    workers, _, threads = (count or "1").partition("x")
+    return {"spec": spec, "name": name, "workers": int(workers), "threads": int(threads or 1)}
+
+
+def start_gunicorn(config: dict, port: int, env: dict) -> subprocess.Popen:
+    worker_class, app_name = WORKER_CLASSES[config["name"]]
+    command = [
+        sys.executable, "-m", "gunicorn", f"benchmarks.offline_app:{app_name}",
+        "--bind", f"127.0.0.1:{port}",
+        "--worker-class", worker_class,
+        "--workers", str(config["workers"]),
+        "--threads", str(config["threads"]),
+        "--timeout", "300",
+        "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/healthz", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"App at {base_url} not ready after {timeout}s")
+
+
+def mint_tokens() -> dict:
+    """Access tokens for every seeded user, keyed by employee code."""
+    from flask import Flask
+    from flask_jwt_extended import JWTManager
+
+    from auth import create_tokens
+    from config import Config
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    JWTManager(app)
+    tokens = {}
+    with app.app_context():
+        for user_id, code in enumerate(range(HR_ADMIN_CODE, HR_ADMIN_CODE + 50), start=1):
+            role = {HR_ADMIN_CODE: "hr_admin", MANAGER_CODE: "manager"}.get(code, "employee")
+            tokens[code], _ = create_tokens(user_id, role, code, f"load{code}@example.com")
+    return tokens
+
+
+def client_identity(client_index: int):
+    """Spread clients over the corpus and over the seeded employees of the matching role."""
+    conversation = CONVERSATIONS[client_index % len(CONVERSATIONS)]
+    code = {"hr_admin": HR_ADMIN_CODE, "manager": MANAGER_CODE}.get(
+        conversation["role"], MANAGER_CODE + 1 + client_index % 48)
+    return conversation, code
+
+
+def post_turn(http: requests.Session, url: str, question: str, session_id: str) -> bool:
+    """Send one chat turn; a streamed turn succeeds once its `done` event has arrived."""
+    payload = {"message": question, "session_id": session_id}
+    if not url.endswith("/chat/stream"):
+        return http.post(url, json=payload, timeout=300).status_code == 200
+    with http.post(url, json=payload, timeout=300, stream=True) as response:
+        if response.status_code != 200:
+            return False
+        return any(line == "event: done" for line in response.iter_lines(decode_unicode=True))
+
+
+def run_client(client_index: int, base_url: str, endpoint: str, tokens: dict, stop_at: float, samples: list,
+               lock):
+    conversation, code = client_identity(client_index)
+    http = requests.Session()
+    http.headers["Authorization"] = f"Bearer {tokens[code]}"
+    conversations_played = 0
+    while time.monotonic() < stop_at:
+        session_id = f"load-{client_index}-{conversations_played}"
+        for question in conversation["turns"]:
+            started = time.perf_counter()
+            try:
+                ok = post_turn(http, f"{base_url}{endpoint}", question, session_id)
+            except requests.RequestException:
+                ok = False
+            finished = time.monotonic()
+            with lock:
+                # Requests still running at the deadline are not counted
+                if finished <= stop_at:
+                    samples.append((time.perf_counter() - started, ok))
+            if finished > stop_at:
+                return
+        conversations_played += 1
+
+
+def measure(base_url: str, endpoint: str, tokens: dict, concurrency: int, duration: float) -> dict:
+    samples, lock = [], threading.Lock()
+    stop_at = time.monotonic() + duration
+    threads = [threading.Thread(target=run_client, args=(i, base_url, endpoint, tokens, stop_at, samples, lock))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies = [latency for latency, ok in samples if ok]
+    result = {"concurrency": concurrency, "requests": len(samples), "errors": len(samples) - len(latencies),
+              "throughput_rps": round(len(latencies) / duration, 2)}
+    for pct in (50, 95, 99):
+        result[f"p{pct}_ms"] = round(percentile(latencies, pct) * 1000, 1) if latencies else None
+    return result
+
+
+def knee(curve: list, min_gain: float = 0.1):
+    """Concurrency after which adding clients gains less than `min_gain` throughput."""
+    for previous, current in zip(curve, curve[1:]):
+        if previous["throughput_rps"] and \
+                current["throughput_rps"] < previous["throughput_rps"] * (1 + min_gain):
+            return previous["concurrency"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", nargs="+", type=parse_worker_spec,
+                        default=[parse_worker_spec("sync:2"), parse_worker_spec("uvicorn:2")])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--duration", type=float, default=30, help="Seconds measured per concurrency level")
+    parser.add_argument("--warmup", type=float, default=5, help="Untimed seconds before each configuration")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per LLM call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Uniform +/- seconds added to each LLM call")
+    parser.add_argument("--no-caches", action="store_true", help="Disable the SQL template and policy caches")
+    parser.add_argument("--endpoints", nargs="+", default=["/chat", "/chat/stream"],
+                        help="Chat endpoints to load, one curve each")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--csv", help="Write the saturation curves as CSV")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="ess-load-"), "ess.db")
+    env = dict(os.environ, DATABASE_URI=seed(db_path), SERVER_MODE="",
+               FAKE_LLM_LATENCY=str(args.latency), FAKE_LLM_JITTER=str(args.jitter))
+    if args.no_caches:
+        env.update(POLICY_CACHE_ENABLED="false", SQL_TEMPLATE_CACHE_ENABLED="false")
+    tokens = mint_tokens()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    rows = []
+    for config in args.workers:
+        print(f"\n== {config['spec']} (LLM latency {args.latency}s +/- {args.jitter}s) ==")
+        process = start_gunicorn(config, args.port, env)
+        try:
+            wait_until_ready(base_url, process)
+            for endpoint in args.endpoints:
+                print(f"-- POST {endpoint}")
+                measure(base_url, endpoint, tokens, max(args.concurrency), args.warmup)
+                print(f"{'clients':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+                curve = []
+                for concurrency in sorted(args.concurrency):
+                    result = measure(base_url, endpoint, tokens, concurrency, args.duration)
+                    curve.append(result)
+                    rows.append(dict(result, config=config["spec"], endpoint=endpoint))
+                    print(f"{concurrency:>8}{result['throughput_rps']:>9}{str(result['p50_ms']):>10}"
+                          f"{str(result['p95_ms']):>10}{str(result['p99_ms']):>10}{result['errors']:>8}")
+                saturation = knee(curve)
+                if saturation:
+                    print(f"Throughput saturates at about {saturation} concurrent clients.")
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["config", "endpoint", "concurrency", "requests", "errors",
+                                                   "throughput_rps", "p50_ms", "p95_ms", "p99_ms"])
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""
+Gunicorn entrypoints serving the app with the fake chat model, for load tests:
+
+    DATABASE_URI=sqlite:////tmp/ess.db gunicorn benchmarks.offline_app:app
+    DATABASE_URI=sqlite:////tmp/ess.db gunicorn -k uvicorn.workers.UvicornWorker benchmarks.offline_app:asgi_app
+
+Simulated model latency comes from FAKE_LLM_LATENCY / FAKE_LLM_JITTER (seconds).
+"""
+from benchmarks.run_offline import install_fake_llm
+
+install_fake_llm()
+
+from flask_server_a import app  # noqa: E402
+from asgi_app import asgi_app  # noqa: E402
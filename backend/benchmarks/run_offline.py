@@ -0,0 +1,210 @@
+"""
+Offline end-to-end benchmark of the chat pipeline.
+
+Runs the real `graph_with_history` and `/chat` route against a seeded SQLite
+database and the replaying `FakeChatModel`, so the numbers measure the
+pipeline's own overhead (prompt building, embeddings, retrieval, SQL
+execution, history handling) without Groq or MySQL:
+
+    cd backend
+    python -m benchmarks.run_offline --iterations 5 --target both --save bench.json
+    python -m benchmarks.run_offline --baseline bench.json --max-regression 0.2
+
+With `--baseline` the run exits non-zero when p95 latency of any target
+regresses by more than `--max-regression`, which makes it usable as a gate
+for changes to `flask_server_a.py` or `rag_graph2.py`.
+
+`--record` forwards prompts without a recording to Groq (needs GROQ_API_KEY)
+and saves the responses, so later runs replay real model output. The
+sentence-transformer model must already be in the local Hugging Face cache.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.corpus import CONVERSATIONS
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.sqlite_db import seed
+
+DEFAULT_RECORDINGS = os.path.join(os.path.dirname(__file__), "recordings.json")
+
+
+def load_server(db_path: str = None, recordings: str = None, latency: float = 0.0, jitter: float = 0.0,
+                caches: bool = True, record: bool = False):
+    """
+    Point the app at a freshly seeded SQLite database and the fake chat model, then import it.
+    Must run before anything else imports `config` or `flask_server_a`.
+    """
+    if "flask_server_a" in sys.modules:
+        raise RuntimeError("flask_server_a was imported before the offline environment was set up")
+
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix="ess-bench-"), "ess.db")
+    os.environ["DATABASE_URI"] = seed(db_path)
+    os.environ["FAKE_LLM_LATENCY"] = str(latency)
+    os.environ["FAKE_LLM_JITTER"] = str(jitter)
+    if recordings:
+        os.environ["FAKE_LLM_RECORDINGS"] = recordings
+    if not caches:
+        os.environ["POLICY_CACHE_ENABLED"] = "false"
+        os.environ["SQL_TEMPLATE_CACHE_ENABLED"] = "false"
+
+    install_fake_llm(record)
+
+    import flask_server_a
+    return flask_server_a
+
+
+def install_fake_llm(record: bool = False):
+    """Make `langchain_groq.ChatGroq` build `FakeChatModel`s; call before importing the app."""
+    import langchain_groq
+    real_chat_groq = langchain_groq.ChatGroq
+    model_class = FakeChatModel
+    if record:
+        # Misses go to the real model and are written back on save()
+        def model_class(**kwargs):
+            return FakeChatModel(upstream=real_chat_groq(**kwargs), **kwargs)
+    langchain_groq.ChatGroq = model_class
+
+
+def percentile(values, pct):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def summarize(latencies: list, wall_seconds: float, errors: int) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+    }
+
+
+def make_graph_runner(server):
+    def run_turn(conversation: dict, question: str, session_id: str) -> bool:
+        answer = server.graph_with_history.invoke(
+            {"question": question, "employee_code": conversation["employee_code"], "role": conversation["role"]},
+            config={"configurable": {"user_id": "bench", "session_id": session_id}},
+        )
+        return bool(answer.get("final_answer"))
+    return run_turn
+
+
+def make_route_runner(server):
+    from auth import create_tokens
+
+    client = server.app.test_client()
+    tokens = {}
+    with server.app.app_context():
+        for user_id, conversation in enumerate(CONVERSATIONS, start=1):
+            key = (conversation["role"], conversation["employee_code"])
+            if key not in tokens:
+                tokens[key], _ = create_tokens(user_id, conversation["role"], conversation["employee_code"],
+                                               f"bench{conversation['employee_code']}@example.com")
+
+    def run_turn(conversation: dict, question: str, session_id: str) -> bool:
+        token = tokens[(conversation["role"], conversation["employee_code"])]
+        response = client.post("/chat", json={"message": question, "session_id": session_id},
+                               headers={"Authorization": f"Bearer {token}"})
+        return response.status_code == 200 and bool(response.get_json().get("response"))
+    return run_turn
+
+
+def run_conversation(run_turn, conversation: dict) -> tuple:
+    """Play one conversation in a fresh session; returns per-turn latencies and the error count."""
+    session_id = f"bench-{uuid.uuid4().hex}"
+    latencies, errors = [], 0
+    for question in conversation["turns"]:
+        started = time.perf_counter()
+        try:
+            ok = run_turn(conversation, question, session_id)
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        errors += 0 if ok else 1
+    return latencies, errors
+
+
+def run_target(run_turn, iterations: int, concurrency: int, query_type: str = None) -> dict:
+    conversations = [c for c in CONVERSATIONS if not query_type or c["type"] == query_type] * iterations
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for turn_latencies, turn_errors in pool.map(lambda c: run_conversation(run_turn, c), conversations):
+            latencies.extend(turn_latencies)
+            errors += turn_errors
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list:
+    regressions = []
+    for name, summary in results.items():
+        before = baseline.get(name)
+        if not before or not before.get("p95_ms"):
+            continue
+        change = (summary["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+        if change > max_regression:
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {summary['p95_ms']}ms (+{change:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["graph", "route", "both"], default="both")
+    parser.add_argument("--iterations", type=int, default=3, help="Times the corpus is replayed per target")
+    parser.add_argument("--concurrency", type=int, default=1, help="Conversations run in parallel")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed corpus passes before measuring")
+    parser.add_argument("--recordings", default=DEFAULT_RECORDINGS)
+    parser.add_argument("--record", action="store_true", help="Record misses from Groq into --recordings")
+    parser.add_argument("--no-caches", action="store_true", help="Disable the SQL template and policy caches")
+    parser.add_argument("--db-path", help="SQLite file to seed (defaults to a temp directory)")
+    parser.add_argument("--save", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON to compare p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = load_server(args.db_path, args.recordings, caches=not args.no_caches, record=args.record)
+    runners = {}
+    if args.target in ("graph", "both"):
+        runners["graph"] = make_graph_runner(server)
+    if args.target in ("route", "both"):
+        runners["route"] = make_route_runner(server)
+
+    results = {}
+    for name, run_turn in runners.items():
+        for _ in range(args.warmup):
+            run_target(run_turn, 1, args.concurrency)
+        results[name] = run_target(run_turn, args.iterations, args.concurrency)
+        for query_type in ("DATABASE", "POLICY", "HYBRID"):
+            results[f"{name}:{query_type}"] = run_target(run_turn, args.iterations, args.concurrency, query_type)
+
+    print(f"{'target':<20}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for name, s in results.items():
+        print(f"{name:<20}{s['requests']:>9}{s['errors']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+              f"{s['p99_ms']:>10}{s['throughput_rps']:>9}")
+
+    if args.record:
+        for client in server.models.clients().values():
+            client.save()
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("p95 regressions over the baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+SQLite stand-in for the ESS MySQL database, seeded deterministically with the
+tables the SQL generation prompts reference.
+"""
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+
+SCHEMA = """
+CREATE TABLE departments (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    head_employee_code INTEGER
+);
+CREATE TABLE designations (
+    id INTEGER PRIMARY KEY,
+    title VARCHAR(100) NOT NULL,
+    grade VARCHAR(10)
+);
+CREATE TABLE employees (
+    employee_code INTEGER PRIMARY KEY,
+    first_name VARCHAR(50) NOT NULL,
+    last_name VARCHAR(50) NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    phone VARCHAR(20),
+    gender VARCHAR(10),
+    date_of_birth DATE,
+    hire_date DATE NOT NULL,
+    tenure_years INTEGER,
+    employment_status VARCHAR(20) NOT NULL,
+    role VARCHAR(20) NOT NULL,
+    department_id INTEGER REFERENCES departments(id),
+    designation_id INTEGER REFERENCES designations(id),
+    supervisor_id INTEGER REFERENCES employees(employee_code)
+);
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    employee_code INTEGER REFERENCES employees(employee_code),
+    role VARCHAR(20) NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT 1
+);
+CREATE TABLE leave_balances (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_code INTEGER NOT NULL REFERENCES employees(employee_code),
+    leave_type VARCHAR(20) NOT NULL,
+    balance DECIMAL(5, 1) NOT NULL
+);
+CREATE TABLE leave_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_code INTEGER NOT NULL REFERENCES employees(employee_code),
+    leave_type VARCHAR(20) NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    status VARCHAR(20) NOT NULL
+);
+CREATE TABLE salary_summary (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_code INTEGER NOT NULL REFERENCES employees(employee_code),
+    month VARCHAR(7) NOT NULL,
+    gross_salary DECIMAL(12, 2) NOT NULL,
+    deductions DECIMAL(12, 2) NOT NULL,
+    net_salary DECIMAL(12, 2) NOT NULL
+);
+CREATE TABLE salary_components (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    employee_code INTEGER NOT NULL REFERENCES employees(employee_code),
+    component VARCHAR(30) NOT NULL,
+    amount DECIMAL(12, 2) NOT NULL
+);
+"""
+
+DEPARTMENTS = ["Engineering", "Human Resources", "Finance", "Sales", "Operations"]
+DESIGNATIONS = [("Software Engineer", "L2"), ("Senior Software Engineer", "L3"), ("Engineering Manager", "M1"),
+                ("HR Generalist", "L2"), ("HR Director", "M2"), ("Accountant", "L2"), ("Sales Executive", "L1")]
+FIRST_NAMES = ["Aarav", "Neha", "Karan", "Priya", "Rohan", "Ananya", "Vikram", "Sneha", "Arjun", "Meera"]
+LAST_NAMES = ["Sharma", "Patel", "Iyer", "Reddy", "Gupta", "Nair", "Singh", "Das"]
+LEAVE_TYPES = [("casual", 12), ("sick", 10), ("earned", 18)]
+COMPONENTS = [("basic", 0.5), ("hra", 0.2), ("lta", 0.1), ("special_allowance", 0.2)]
+
+# Employee codes the benchmark corpus logs in as
+HR_ADMIN_CODE = 1001
+MANAGER_CODE = 1002
+EMPLOYEE_CODE = 1010
+
+
+def seed(path: str, employees: int = 50, seed_value: int = 7) -> str:
+    """
+    (Re)create the SQLite database at `path` and return its SQLAlchemy URI.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed_value)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+
+    conn.executemany("INSERT INTO departments (id, name, head_employee_code) VALUES (?, ?, ?)",
+                     [(i + 1, name, HR_ADMIN_CODE if name == "Human Resources" else MANAGER_CODE)
+                      for i, name in enumerate(DEPARTMENTS)])
+    conn.executemany("INSERT INTO designations (id, title, grade) VALUES (?, ?, ?)",
+                     [(i + 1, title, grade) for i, (title, grade) in enumerate(DESIGNATIONS)])
+
+    today = date(2025, 6, 30)
+    for offset in range(employees):
+        code = HR_ADMIN_CODE + offset
+        if code == HR_ADMIN_CODE:
+            role, supervisor, department, designation = "hr_admin", None, 2, 5
+        elif code == MANAGER_CODE:
+            role, supervisor, department, designation = "manager", HR_ADMIN_CODE, 1, 3
+        else:
+            role, supervisor = "employee", MANAGER_CODE if offset < 20 else HR_ADMIN_CODE
+            department, designation = rng.randint(1, len(DEPARTMENTS)), rng.choice([1, 2, 4, 6, 7])
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        email = f"{first.lower()}.{last.lower()}{code}@example.com"
+        hire_date = today - timedelta(days=rng.randint(90, 3650))
+        conn.execute(
+            "INSERT INTO employees VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (code, first, last, email, f"+91-98{rng.randint(10000000, 99999999)}", rng.choice(["F", "M"]),
+             date(rng.randint(1970, 2000), rng.randint(1, 12), rng.randint(1, 28)).isoformat(),
+             hire_date.isoformat(), (today - hire_date).days // 365,
+             rng.choice(["active"] * 9 + ["probation"]), role, department, designation, supervisor),
+        )
+        conn.execute("INSERT INTO users (email, password_hash, employee_code, role, is_active) VALUES (?, ?, ?, ?, 1)",
+                     (email, "pbkdf2:sha256:benchmark", code, role))
+
+        for leave_type, quota in LEAVE_TYPES:
+            conn.execute("INSERT INTO leave_balances (employee_code, leave_type, balance) VALUES (?, ?, ?)",
+                         (code, leave_type, rng.randint(0, quota * 2) / 2))
+        for _ in range(rng.randint(0, 3)):
+            start = today - timedelta(days=rng.randint(1, 180))
+            conn.execute("INSERT INTO leave_requests (employee_code, leave_type, start_date, end_date, status) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (code, rng.choice(LEAVE_TYPES)[0], start.isoformat(),
+                          (start + timedelta(days=rng.randint(0, 4))).isoformat(),
+                          rng.choice(["approved", "pending", "rejected"])))
+
+        gross = rng.randrange(40000, 250000, 500)
+        for month in range(1, 7):
+            deductions = round(gross * 0.12, 2)
+            conn.execute("INSERT INTO salary_summary (employee_code, month, gross_salary, deductions, net_salary) "
+                         "VALUES (?, ?, ?, ?, ?)", (code, f"2025-{month:02d}", gross, deductions, gross - deductions))
+        for component, share in COMPONENTS:
+            conn.execute("INSERT INTO salary_components (employee_code, component, amount) VALUES (?, ?, ?)",
+                         (code, component, round(gross * share, 2)))
+
+    conn.commit()
+    conn.close()
+    return f"sqlite:///{os.path.abspath(path)}"
@@ -0,0 +1,170 @@
+import logging
+import threading
+from typing import List
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Chat history rendering for LLM prompts.
+# The history is formatted once per request and the same string is shared
+# by every prompt in the pipeline. The last HISTORY_VERBATIM_TURNS turns are
+# kept word for word; older turns are folded (after the response has been
+# sent) into a running summary stored as a SystemMessage at the start of the
+# session history. The rendered string is kept within HISTORY_TOKEN_BUDGET
+# tokens, counted with a local tokenizer.
+# ---------------------------------------------------------------------
+
+SUMMARY_PREFIX = "Summary of earlier conversation"
+
+summary_prompt = """You maintain a running summary of a conversation between an employee and an HR chatbot.
+Update the summary with the new messages below. Keep every fact that later questions may refer to:
+people and employee names mentioned, leave types, dates, amounts, policies discussed and answers given.
+Write at most 120 words of plain text.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+def format_chat_history_for_llm(chat_history: List[BaseMessage]) -> str:
+    """
+    Convert list of LangChain messages to readable plain-text format for prompts.
+    Differentiates between user and assistant messages; a leading SystemMessage
+    holds the summary of older turns.
+    """
+    formatted_history = []
+    for message in chat_history:
+        # Now accessing .type and .content attributes directly from BaseMessage objects
+        if isinstance(message, HumanMessage):
+            role = "User"
+        elif isinstance(message, AIMessage):
+            role = "Assistant"
+        elif isinstance(message, SystemMessage):
+            role = SUMMARY_PREFIX
+        else:
+            role = message.type  # Fallback for other message types if they appear
+
+        formatted_history.append(f"{role}: {message.content}")
+    return "\n".join(formatted_history)
+
+
+class ChatHistoryManager:
+    """
+    Renders session history within a token budget and folds older turns into a summary.
+    """
+
+    def __init__(self, llm=None, token_budget: int = None, verbatim_turns: int = None, fold_batch_turns: int = None):
+        """
+        Args:
+            llm: Chat model used to update the running summary. Folding is disabled without one.
+            token_budget (int): Maximum tokens of rendered history per prompt.
+            verbatim_turns (int): Number of most recent user/assistant turns kept word for word.
+            fold_batch_turns (int): Number of older turns that must accumulate before they are folded.
+        """
+        self.llm = llm
+        self.token_budget = Config.HISTORY_TOKEN_BUDGET if token_budget is None else token_budget
+        self.verbatim_turns = Config.HISTORY_VERBATIM_TURNS if verbatim_turns is None else verbatim_turns
+        self.fold_batch_turns = Config.HISTORY_FOLD_BATCH_TURNS if fold_batch_turns is None else fold_batch_turns
+
+        self._tokenizer = None
+        self._tokenizer_loaded = False
+        self._folding = set()
+        self._lock = threading.Lock()
+
+    def count_tokens(self, text: str) -> int:
+        tokenizer = self._get_tokenizer()
+        if tokenizer is None:
+            return len(text) // 4 + 1
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def render(self, chat_history: List[BaseMessage]) -> str:
+        """
+        Format the history for prompts, keeping the summary and the most recent turns.
+        Oldest verbatim messages are dropped first, then the summary is truncated,
+        until the text fits the token budget.
+        """
+        summary = [m for m in chat_history[:1] if isinstance(m, SystemMessage)]
+        recent = [m for m in chat_history if not isinstance(m, SystemMessage)][-2 * self.verbatim_turns:]
+
+        while recent and self.count_tokens(format_chat_history_for_llm(summary + recent)) > self.token_budget:
+            recent = recent[1:]
+
+        formatted = format_chat_history_for_llm(summary + recent)
+        if summary and self.count_tokens(formatted) > self.token_budget:
+            formatted = self._truncate(formatted, self.token_budget)
+        return formatted
+
+    def fold_in_background(self, history: BaseChatMessageHistory, key: str) -> None:
+        """Fold older turns of a session into its summary on a background thread."""
+        if not self.llm or not self._needs_fold(history.messages):
+            return
+        with self._lock:
+            if key in self._folding:
+                return
+            self._folding.add(key)
+
+        def run():
+            try:
+                self.fold(history)
+            except Exception as e:
+                logger.error(f"Failed to summarise chat history for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._folding.discard(key)
+
+        threading.Thread(target=run, name="history-fold", daemon=True).start()
+
+    def fold(self, history: BaseChatMessageHistory) -> None:
+        """
+        Replace the turns before the verbatim window with an updated summary.
+        Messages appended while the summary is generated are left untouched.
+        """
+        messages = list(history.messages)
+        if not self._needs_fold(messages):
+            return
+
+        has_summary = bool(messages) and isinstance(messages[0], SystemMessage)
+        summary = messages[0].content if has_summary else ""
+        turns = messages[1:] if has_summary else messages
+        to_fold = turns[:len(turns) - 2 * self.verbatim_turns]
+
+        response = self.llm.invoke(summary_prompt.format(
+            summary=summary or "(none)",
+            messages=format_chat_history_for_llm(to_fold),
+        ), config={"metadata": {"stage": "summarize_history"}})
+
+        folded_count = len(to_fold) + (1 if has_summary else 0)
+        current = list(history.messages)
+        history.clear()
+        history.add_messages([SystemMessage(content=response.content.strip())] + current[folded_count:])
+        logger.info(f"Folded {len(to_fold)} messages into the conversation summary.")
+
+    def _needs_fold(self, messages: List[BaseMessage]) -> bool:
+        turns = [m for m in messages if not isinstance(m, SystemMessage)]
+        return len(turns) - 2 * self.verbatim_turns >= 2 * self.fold_batch_turns
+
+    def _truncate(self, text: str, budget: int) -> str:
+        tokenizer = self._get_tokenizer()
+        if tokenizer is None:
+            return text[-budget * 4:]
+        ids = tokenizer.encode(text, add_special_tokens=False)
+        return tokenizer.decode(ids[-budget:])
+
+    def _get_tokenizer(self):
+        if not self._tokenizer_loaded:
+            self._tokenizer_loaded = True
+            try:
+                from transformers import AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(Config.HISTORY_TOKENIZER)
+            except Exception as e:
+                logger.warning(f"Could not load tokenizer {Config.HISTORY_TOKENIZER}: {e}. Estimating tokens.")
+        return self._tokenizer
@@ -12,18 +12,150 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
 
+    # PBKDF2-SHA256 cost for password hashes. Stored hashes with a different cost are
+    # rehashed on the next successful login.
+    PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", 1000000))
+    # Threads per app worker that hash passwords (0 hashes on the request thread); one per core,
+    # since hashlib releases the GIL while hashing
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+    PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_TIMEOUT_SECONDS", 10))
+    # Hashes that may be queued or running before logins are turned away with a 503. One core
+    # does about 1.75M PBKDF2-SHA256 iterations a second (~0.57 s per hash at 1M iterations, so
+    # ~1.75 logins/s per core), so the default admits what the pool can finish within the
+    # timeout: e.g. 8 cores take ~14 logins/s and a burst of ~140 before answering 503.
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv(
+        "PASSWORD_HASH_MAX_PENDING",
+        max(16, int(max(PASSWORD_HASH_WORKERS, 1) * PASSWORD_HASH_TIMEOUT_SECONDS * 1750000
+                    / PASSWORD_HASH_ITERATIONS)),
+    ))
+
     #DB credentials
     MYSQL_USER = os.getenv("MYSQL_USER")
     MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
     MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
     MYSQL_PORT = os.getenv("MYSQL_PORT", 3306)
     MYSQL_DB_NAME = os.getenv("MYSQL_DB_NAME")
+    # Full SQLAlchemy URI overriding the MySQL settings, e.g. sqlite:///bench.db for offline benchmarks
+    DATABASE_URI = os.getenv("DATABASE_URI")
+
+    # SQLAlchemy connection pools. Chat SQL and the auth routes use separate engines so a
+    # login spike can't starve chat queries of connections (or the other way round).
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    AUTH_DB_POOL_SIZE = int(os.getenv("AUTH_DB_POOL_SIZE", 3))
+    AUTH_DB_MAX_OVERFLOW = int(os.getenv("AUTH_DB_MAX_OVERFLOW", 5))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # Recycle connections before MySQL's wait_timeout closes them server-side
+    DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800))
+    DB_POOL_TIMEOUT_SECONDS = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", 10))
 
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+    # Groq model per pipeline stage; override a stage with LLM_MODEL_<STAGE>, e.g. LLM_MODEL_CLASSIFY.
+    # One-word classification and query rephrasing default to the small, fast model.
+    LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+    LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "llama-3.1-8b-instant")
+    STAGE_MODELS = {
+        stage: os.getenv(f"LLM_MODEL_{stage.upper()}", default)
+        for stage, default in {
+            "classify": LLM_FAST_MODEL,
+            "rag_rephrase": LLM_FAST_MODEL,
+            "sql_reasoning": LLM_MODEL,
+            "sql_generation": LLM_MODEL,
+            "sql_answer": LLM_MODEL,
+            "rag_generate": LLM_MODEL,
+            "answer": LLM_MODEL,
+            "history_summary": LLM_MODEL,
+        }.items()
+    }
+
+    # Local embedding classifier in front of the classify_query LLM call
+    QUERY_CLASSIFIER_ENABLED = os.getenv("QUERY_CLASSIFIER_ENABLED", "true").lower() == "true"
+    QUERY_CLASSIFIER_MIN_MARGIN = float(os.getenv("QUERY_CLASSIFIER_MIN_MARGIN", 0.04))
+
+    # Schema snapshot served to the SQL generation prompts
+    SCHEMA_CACHE_TTL_SECONDS = int(os.getenv("SCHEMA_CACHE_TTL_SECONDS", 3600))
+    SCHEMA_SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", 3))
+
+    # Question-relevant schema pruning for the SQL generation prompts
+    SCHEMA_PRUNING_ENABLED = os.getenv("SCHEMA_PRUNING_ENABLED", "true").lower() == "true"
+    SCHEMA_TOP_K_TABLES = int(os.getenv("SCHEMA_TOP_K_TABLES", 3))
+    SCHEMA_COMPACT_SAMPLE_ROWS = os.getenv("SCHEMA_COMPACT_SAMPLE_ROWS", "false").lower() == "true"
+
+    # "two_pass" (reasoning call + structured SQL call) or "single_pass" (one structured call)
+    SQL_GENERATION_MODE = os.getenv("SQL_GENERATION_MODE", "two_pass")
+
+    # Execution limits for generated SQL: rows fetched, server-side statement timeout, and
+    # the token budget of the result text passed to the answer prompt
+    SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", 50))
+    SQL_STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", 5000))
+    SQL_RESULT_TOKEN_BUDGET = int(os.getenv("SQL_RESULT_TOKEN_BUDGET", 1500))
+
+    # Pre-execution guard: single read-only SELECT only, and a ceiling on MySQL's EXPLAIN
+    # estimate of rows examined (0 disables the cost check)
+    SQL_GUARD_ENABLED = os.getenv("SQL_GUARD_ENABLED", "true").lower() == "true"
+    SQL_MAX_ROWS_EXAMINED = int(os.getenv("SQL_MAX_ROWS_EXAMINED", 200000))
+
+    # Parameterized intent-to-SQL template cache
+    SQL_TEMPLATE_CACHE_ENABLED = os.getenv("SQL_TEMPLATE_CACHE_ENABLED", "true").lower() == "true"
+    SQL_TEMPLATE_CACHE_SIZE = int(os.getenv("SQL_TEMPLATE_CACHE_SIZE", 256))
+    SQL_TEMPLATE_CACHE_TTL_SECONDS = int(os.getenv("SQL_TEMPLATE_CACHE_TTL_SECONDS", 86400))
+    SQL_TEMPLATE_CACHE_THRESHOLD = float(os.getenv("SQL_TEMPLATE_CACHE_THRESHOLD", 0.93))
+
+    # Sentence-transformer shared by policy indexing, retrieval and the local classifiers.
+    # Changing it makes rag_index.py re-embed every chunk.
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    # "torch", "onnx" or "onnx-int8" (quantized ONNX export; needs optimum[onnxruntime])
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+    # Bulk embedding when indexing: texts per batch and encoding processes (0 = all cores)
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+    EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", 1))
+
+    # Policy documents indexed by rag_index.py, and how they are chunked
+    POLICY_DOCS_DIR = os.getenv("POLICY_DOCS_DIR", os.path.join(os.path.dirname(__file__), "policy_docs"))
+    POLICY_CHUNK_SIZE = int(os.getenv("POLICY_CHUNK_SIZE", 800))
+    POLICY_CHUNK_OVERLAP = int(os.getenv("POLICY_CHUNK_OVERLAP", 100))
+
+    # Policy search index: "auto" picks exact flat search for small corpora, HNSW from
+    # POLICY_HNSW_MIN_VECTORS and IVF-PQ from POLICY_IVFPQ_MIN_VECTORS; or force one type.
+    # POLICY_INDEX_MMAP maps the inverted lists of an IVF-PQ index instead of reading them
+    # into memory (faiss 1.7 can't map flat or HNSW indexes, which are always loaded).
+    POLICY_INDEX_TYPE = os.getenv("POLICY_INDEX_TYPE", "auto")
+    POLICY_HNSW_MIN_VECTORS = int(os.getenv("POLICY_HNSW_MIN_VECTORS", 20000))
+    POLICY_IVFPQ_MIN_VECTORS = int(os.getenv("POLICY_IVFPQ_MIN_VECTORS", 1000000))
+    POLICY_HNSW_M = int(os.getenv("POLICY_HNSW_M", 32))
+    POLICY_HNSW_EF_CONSTRUCTION = int(os.getenv("POLICY_HNSW_EF_CONSTRUCTION", 200))
+    POLICY_HNSW_EF_SEARCH = int(os.getenv("POLICY_HNSW_EF_SEARCH", 64))
+    POLICY_IVF_NPROBE = int(os.getenv("POLICY_IVF_NPROBE", 16))
+    POLICY_PQ_SUBQUANTIZERS = int(os.getenv("POLICY_PQ_SUBQUANTIZERS", 48))
+    POLICY_INDEX_MMAP = os.getenv("POLICY_INDEX_MMAP", "true").lower() == "true"
+    # Seconds between checks for an index rebuilt by rag_index.py (0: reload only via /admin)
+    POLICY_INDEX_POLL_SECONDS = float(os.getenv("POLICY_INDEX_POLL_SECONDS", 30))
 
+    # LRU cache of query embeddings shared by retrieval, the classifier and the other caches
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 4096))
 
+    # Semantic answer cache in front of the policy RAG graph
+    POLICY_CACHE_ENABLED = os.getenv("POLICY_CACHE_ENABLED", "true").lower() == "true"
+    POLICY_CACHE_SIZE = int(os.getenv("POLICY_CACHE_SIZE", 512))
+    POLICY_CACHE_THRESHOLD = float(os.getenv("POLICY_CACHE_THRESHOLD", 0.92))
 
+    # In-memory session store: LRU session cap, per-session message cap, idle eviction
+    # and a ceiling on the estimated bytes of all histories (0 disables the last two)
+    SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", 5000))
+    SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", 100))
+    SESSION_IDLE_TTL_SECONDS = int(os.getenv("SESSION_IDLE_TTL_SECONDS", 7200))
+    SESSION_STORE_MAX_BYTES = int(os.getenv("SESSION_STORE_MAX_BYTES", 256 * 1024 * 1024))
 
+    # Shared session history so any worker can serve the next turn: "memory" (per process)
+    # or "sql" (chat_sessions/chat_messages tables on the app database, written behind)
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+    SESSION_FLUSH_INTERVAL_MS = int(os.getenv("SESSION_FLUSH_INTERVAL_MS", 200))
 
+    # Chat history rendered into prompts
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 800))
+    HISTORY_VERBATIM_TURNS = int(os.getenv("HISTORY_VERBATIM_TURNS", 4))
+    HISTORY_FOLD_BATCH_TURNS = int(os.getenv("HISTORY_FOLD_BATCH_TURNS", 4))
+    HISTORY_TOKENIZER = os.getenv("HISTORY_TOKENIZER", "sentence-transformers/all-MiniLM-L6-v2")
@@ -1,30 +1,61 @@
 from langchain_community.utilities import SQLDatabase
+from sqlalchemy import create_engine
 from config import Config
+from metrics import instrument_pool
 import logging
 
 
 logger = logging.getLogger(__name__)
 db = None
 
-def init_db():
 
-    try:
-        mysql_user = Config.MYSQL_USER
-        mysql_password = Config.MYSQL_PASSWORD
-        mysql_host = Config.MYSQL_HOST
-        mysql_port = Config.MYSQL_PORT
-        mysql_db_name = Config.MYSQL_DB_NAME
+def database_uri():
+    if Config.DATABASE_URI:
+        return Config.DATABASE_URI
 
+    mysql_user = Config.MYSQL_USER
+    mysql_password = Config.MYSQL_PASSWORD
+    mysql_host = Config.MYSQL_HOST
+    mysql_port = Config.MYSQL_PORT
+    mysql_db_name = Config.MYSQL_DB_NAME
 
+    if not all([mysql_user, mysql_password, mysql_host, mysql_port, mysql_db_name]):
+        logger.error("One or more MySQL environment variables are missing.")
+        return None
 
-        if not all([mysql_user, mysql_password, mysql_host, mysql_port, mysql_db_name]):
-            logger.error("One or more MySQL environment variables are missing.")
-            return None
+    return f"mysql+mysqlconnector://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_db_name}"
+    # return f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_db_name}"
 
-        mysql_uri = f"mysql+mysqlconnector://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_db_name}"
-        # mysql_uri = f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_db_name}"
 
-        db = SQLDatabase.from_uri(mysql_uri)
+def create_pooled_engine(name: str, pool_size: int, max_overflow: int):
+    """
+    Create an engine with its own connection pool, configured from Config and reported
+    to /metrics under `name`. Returns None when the database settings are missing.
+    """
+    uri = database_uri()
+    if not uri:
+        return None
+    engine = create_engine(
+        uri,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=Config.DB_POOL_PRE_PING,
+        pool_recycle=Config.DB_POOL_RECYCLE_SECONDS,
+        pool_timeout=Config.DB_POOL_TIMEOUT_SECONDS,
+    )
+    instrument_pool(name, engine)
+    logger.info(f"Database pool '{name}' created (size={pool_size}, max_overflow={max_overflow})")
+    return engine
+
+
+def init_db():
+    """SQLDatabase for the chat pipeline, on its own pool."""
+    try:
+        engine = create_pooled_engine("chat", Config.DB_POOL_SIZE, Config.DB_MAX_OVERFLOW)
+        if engine is None:
+            return None
+
+        db = SQLDatabase(engine)
         logger.info("Database connected successfully.")
         return db
 
@@ -33,4 +64,10 @@ def init_db():
         return None
 
 
-
+def init_auth_engine():
+    """Engine for the login/signup routes, on a pool separate from chat SQL."""
+    try:
+        return create_pooled_engine("auth", Config.AUTH_DB_POOL_SIZE, Config.AUTH_DB_MAX_OVERFLOW)
+    except Exception as e:
+        logger.error(f"Error initializing auth database engine: {e}")
+        return None
@@ -0,0 +1,83 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from config import Config
+from metrics import record_cache_event
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# LRU cache of query embeddings.
+# Every request embeds its question several times over (query classifier,
+# SQL template cache, schema pruning, policy answer cache, FAISS search),
+# and popular rephrased policy queries repeat across users. Wrapping the
+# shared sentence-transformer here encodes each distinct query text once.
+# Keys are case-folded with whitespace collapsed; MiniLM's tokenizer is
+# uncased, so this doesn't change the vectors.
+# ---------------------------------------------------------------------
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that memoizes `embed_query` in a bounded LRU map.
+    `embed_documents` (bulk indexing) is passed through uncached.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_size: int = None):
+        """
+        Args:
+            embeddings: The underlying embeddings, e.g. HuggingFaceEmbeddings.
+            max_size (int): Maximum number of cached query vectors.
+        """
+        self.embeddings = embeddings
+        self.max_size = Config.QUERY_EMBEDDING_CACHE_SIZE if max_size is None else max_size
+
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                record_cache_event("query_embedding", True)
+                return list(vector)
+            self.misses += 1
+        record_cache_event("query_embedding", False)
+
+        # Encode outside the lock; a concurrent miss on the same text just encodes it twice
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return list(vector)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,137 @@
+import logging
+import os
+import time
+from typing import Callable, List, Sequence
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Sentence-transformer backends and bulk embedding for the policy index.
+# EMBEDDING_BACKEND selects how all-MiniLM-L6-v2 runs: "torch" (default),
+# "onnx" (ONNX Runtime) or "onnx-int8" (the dynamically quantized ONNX
+# export). The ONNX backends need `optimum[onnxruntime]` and fall back to
+# torch without it. Indexing and query-time embeddings must use the same
+# backend; rag_index.py records it in the index manifest.
+# ---------------------------------------------------------------------
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def backend_model_kwargs(backend: str) -> dict:
+    """SentenceTransformer constructor arguments for an embedding backend."""
+    if backend == "torch":
+        return {}
+    if backend == "onnx":
+        return {"backend": "onnx"}
+    if backend == "onnx-int8":
+        return {"backend": "onnx", "model_kwargs": {"file_name": Config.EMBEDDING_ONNX_INT8_FILE}}
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+
+
+def resolve_backend(backend: str = None) -> str:
+    """The configured backend, or "torch" when ONNX Runtime isn't installed."""
+    backend = (backend or Config.EMBEDDING_BACKEND).lower()
+    backend_model_kwargs(backend)
+    if backend != "torch":
+        try:
+            import onnxruntime  # noqa: F401
+            import optimum  # noqa: F401
+        except ImportError:
+            logger.warning(f"Embedding backend '{backend}' needs optimum[onnxruntime]; using torch.")
+            return "torch"
+    return backend
+
+
+def create_embeddings(backend: str = None) -> HuggingFaceEmbeddings:
+    """LangChain embeddings for queries, on the configured backend."""
+    return HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL,
+                                 model_kwargs=backend_model_kwargs(resolve_backend(backend)))
+
+
+class EmbeddingPipeline:
+    """
+    Embeds large lists of texts in batches, optionally across several processes,
+    logging progress and throughput (chunks per second).
+    """
+
+    def __init__(self, backend: str = None, batch_size: int = None, processes: int = None,
+                 progress: Callable[[int, int, float], None] = None):
+        """
+        Args:
+            backend (str): "torch", "onnx" or "onnx-int8". Defaults to Config.EMBEDDING_BACKEND.
+            batch_size (int): Texts per forward pass.
+            processes (int): Encoding processes; 1 encodes in this process, 0 uses every CPU core.
+            progress: Called with (texts done, total texts, elapsed seconds) after every step.
+                Defaults to logging.
+        """
+        self.backend = resolve_backend(backend)
+        self.batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+        processes = Config.EMBEDDING_PROCESSES if processes is None else processes
+        self.processes = processes or os.cpu_count() or 1
+        self.progress = progress or self._log_progress
+        self._model = None
+
+    @property
+    def model(self):
+        # Loaded on first use: an up-to-date index needs no embedding at all
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(Config.EMBEDDING_MODEL, **backend_model_kwargs(self.backend))
+        return self._model
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed `texts`, in order. Vectors match `create_embeddings().embed_documents`."""
+        texts = list(texts)
+        if not texts:
+            return []
+        started = time.perf_counter()
+        if self.processes > 1 and len(texts) > self.batch_size:
+            vectors = self._embed_multi_process(texts, started)
+        else:
+            vectors = []
+            # A few batches per step keeps the progress reports frequent but cheap
+            step = self.batch_size * 8
+            for start in range(0, len(texts), step):
+                vectors.extend(self.model.encode(texts[start:start + step], batch_size=self.batch_size))
+                self.progress(len(vectors), len(texts), time.perf_counter() - started)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Embedded {len(texts)} chunks in {elapsed:.1f}s ({len(texts) / elapsed:.1f} chunks/s, "
+                    f"backend={self.backend}, batch_size={self.batch_size}, processes={self.processes}).")
+        return [vector.tolist() for vector in vectors]
+
+    def _embed_multi_process(self, texts: List[str], started: float) -> list:
+        # One intra-op thread group per process instead of every process claiming every core
+        threads = str(max((os.cpu_count() or 1) // self.processes, 1))
+        saved = {name: os.environ.get(name) for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS")}
+        os.environ.update({name: threads for name in saved})
+        try:
+            pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+        try:
+            vectors = []
+            step = self.batch_size * self.processes * 4
+            for start in range(0, len(texts), step):
+                vectors.extend(self.model.encode_multi_process(
+                    texts[start:start + step], pool, batch_size=self.batch_size,
+                    chunk_size=self.batch_size * 2,
+                ))
+                self.progress(len(vectors), len(texts), time.perf_counter() - started)
+            return vectors
+        finally:
+            self.model.stop_multi_process_pool(pool)
+
+    @staticmethod
+    def _log_progress(done: int, total: int, elapsed: float) -> None:
+        rate = done / elapsed if elapsed else 0.0
+        logger.info(f"Embedding: {done}/{total} chunks ({rate:.1f} chunks/s)")
@@ -1,28 +1,48 @@
 from dotenv import load_dotenv
 load_dotenv()
 from config import Config
-from db import init_db
+from db import init_db, init_auth_engine
 from flask_jwt_extended import jwt_required, get_jwt_identity
+import asyncio
+import json
 import logging
-from flask import Flask, request, jsonify
-from langchain_core.chat_history import InMemoryChatMessageHistory, BaseChatMessageHistory
+import time
+from flask import Flask, Response, request, jsonify, stream_with_context
+from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from typing_extensions import TypedDict, List, Annotated
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.prompts import PromptTemplate
-from langchain_community.tools.sql_database.tool import QuerySQLDatabaseTool
-from langgraph.graph import StateGraph
+from langgraph.graph import StateGraph, END
 from langchain_core.documents import Document
 # from langchain.chat_models import init_chat_model
-from langchain_groq import ChatGroq
 
+from langchain_core.runnables import ConfigurableFieldSpec, RunnableLambda
 from langchain_core.runnables.history import RunnableWithMessageHistory  # For memory management
 from typing import Literal
-from collections import defaultdict
-from mem_store import get_session_history  # Import get_session_history from your new memory_store.py file
-from rag_graph2 import build_rag_graph
+from mem_store import SessionStore, get_session_history
+from session_backend import SQLChatHistoryBackend
+from rag_graph2 import POLICY_INDEX_FOLDER, build_rag_graph
+from vector_index import VectorStoreHandle
+from policy_cache import SemanticAnswerCache
+from embedding_pipeline import create_embeddings
+from embedding_cache import CachedQueryEmbeddings
+from query_classifier import EmbeddingQueryClassifier
+from chat_history import ChatHistoryManager
+from llm_registry import ModelRegistry
+from metrics import (
+    LLMMetricsCallback,
+    REQUEST_DURATION,
+    instrument_node,
+    record_cache_event,
+    render_metrics,
+)
 from auth_routes import create_auth_blueprint
-from auth import get_current_user
+from auth import get_current_user, role_required
+from schema_cache import SchemaSnapshot, SchemaSelector
+from sql_template_cache import SQLTemplateCache
+from sql_executor import SQLExecutor
+from sql_guard import SQLGuard
 # from typing import Union
 # from pydantic import BaseModel
 # from flask_limiter import Limiter
@@ -65,31 +85,58 @@ llama3_api_key = app.config["GROQ_API_KEY"]
 if not llama3_api_key:
     logger.error("GROQ_API_KEY environment variable not set. LLM initialization might fail.")
 
-# LLM
+# LLM: each pipeline stage gets the model configured for it in Config.STAGE_MODELS
 try:
     # llm = init_chat_model("llama-3.3-70b-versatile", model_provider="groq", groq_api_key=llama3_api_key)
-    llm = ChatGroq(model="llama-3.3-70b-versatile", api_key=llama3_api_key)
-    logger.info("LLM initialized successfully")
+    models = ModelRegistry(llama3_api_key, callbacks=[LLMMetricsCallback()])
+    llm = models.for_stage("answer")
+    classify_llm = models.for_stage("classify")
+    sql_reasoning_llm = models.for_stage("sql_reasoning")
+    sql_llm = models.for_stage("sql_generation")
+    sql_answer_llm = models.for_stage("sql_answer")
+    logger.info(f"LLM initialized successfully: {models.stage_models}")
 
 except Exception as e:
     logger.error(f"Failed to initialize LLM: {e}")
-    llm = None
+    models = None
+    llm = classify_llm = sql_reasoning_llm = sql_llm = sql_answer_llm = None
+
+# Renders chat history within a token budget and folds older turns into a running summary
+history_manager = ChatHistoryManager(models.for_stage("history_summary") if models else None)
+
+# Shared sentence-transformer, used by both the policy retriever and the local query classifier.
+# Query vectors are cached so a question (or a repeated search query) is encoded once.
+embedding_model = create_embeddings()
+if Config.QUERY_EMBEDDING_CACHE_SIZE > 0:
+    embedding_model = CachedQueryEmbeddings(embedding_model)
+
+# Policy vector store, swapped in place when rag_index.py publishes a new index generation
+policy_index = VectorStoreHandle(POLICY_INDEX_FOLDER, embedding_model)
+
+# Policy answers don't depend on the asker; cache them until a new index generation is loaded
+policy_cache = (SemanticAnswerCache(index_version=lambda: policy_index.version)
+                if Config.POLICY_CACHE_ENABLED else None)
 
 # Build the RAG chain once
 try:
-    rag_chain = build_rag_graph(llm)
+    rag_chain = build_rag_graph(models.for_stage("rag_generate") if models else None, embedding_model,
+                                answer_cache=policy_cache,
+                                rephrase_llm=models.for_stage("rag_rephrase") if models else None,
+                                index_handle=policy_index)
     logger.info("RAG chain built successfully.")
 except Exception as e:
     logger.error(f"Failed to build RAG graph: {e}. Policy queries might not work.")
     rag_chain = None  # Set to None if it fails to initialize
 
+# Embed the classifier exemplars once; classify_query falls back to the LLM if this fails
+query_classifier = None
+if Config.QUERY_CLASSIFIER_ENABLED:
+    try:
+        query_classifier = EmbeddingQueryClassifier(embedding_model)
+    except Exception as e:
+        logger.error(f"Failed to build local query classifier: {e}. Falling back to LLM classification.")
 
 
-# NEW: Initialize session_histories directly on the Flask app object
-# This ensures the dictionary persists across requests for the life of the app instance.
-
-app.session_histories = defaultdict(InMemoryChatMessageHistory)
-
 
 # Connecting to MySQL DB
 db = init_db()
@@ -98,6 +145,39 @@ if not db:
     exit(1)
 
 
+# NEW: Initialize session_histories directly on the Flask app object
+# This ensures the dictionary persists across requests for the life of the app instance.
+
+# Bounded: LRU and idle-TTL eviction, per-session message cap, memory accounting (see mem_store).
+# With SESSION_BACKEND=sql it caches histories shared by all workers through the database.
+session_backend = SQLChatHistoryBackend(db._engine) if Config.SESSION_BACKEND == "sql" else None
+app.session_histories = SessionStore(backend=session_backend)
+
+# Generated SQL runs with a statement timeout, a row cap and a token-budgeted result
+sql_executor = SQLExecutor(db, count_tokens=history_manager.count_tokens)
+
+# Generated SQL must be a single read-only SELECT under the EXPLAIN cost ceiling
+sql_guard = SQLGuard(db) if Config.SQL_GUARD_ENABLED else None
+
+# Reflect the schema once; write_query serves role-scoped table info from memory
+try:
+    schema_snapshot = SchemaSnapshot(db)
+except Exception as e:
+    logger.error(f"Failed to build schema snapshot: {e}. Falling back to live table info.")
+    schema_snapshot = None
+
+schema_selector = None
+if schema_snapshot and Config.SCHEMA_PRUNING_ENABLED:
+    schema_selector = SchemaSelector(schema_snapshot, embedding_model)
+
+# Reuse SQL for recurring intents; templates are dropped whenever the schema snapshot changes
+sql_template_cache = None
+if Config.SQL_TEMPLATE_CACHE_ENABLED:
+    sql_template_cache = SQLTemplateCache(
+        embedding_model, schema_version=lambda: schema_snapshot.version if schema_snapshot else 0
+    )
+
+
 
 # Define supported query categories
 QueryType = Literal["DATABASE", "POLICY", "HYBRID"]
@@ -105,23 +185,16 @@ QueryType = Literal["DATABASE", "POLICY", "HYBRID"]
 
 
 
-def format_chat_history_for_llm(chat_history: List[BaseMessage]) -> str:
+def merge_errors(left: str, right: str) -> str:
     """
-    Convert list of LangChain messages to readable plain-text format for prompts.
-    Differentiates between user and assistant messages.
+    Reducer for the `error` channel. The SQL and policy branches run in parallel
+    for HYBRID questions, so both may report an error in the same step.
     """
-    formatted_history = []
-    for message in chat_history:
-        # Now accessing .type and .content attributes directly from BaseMessage objects
-        if isinstance(message, HumanMessage):
-            role = "User"
-        elif isinstance(message, AIMessage):
-            role = "Assistant"
-        else:
-            role = message.type  # Fallback for other message types if they appear
-
-        formatted_history.append(f"{role}: {message.content}")
-    return "\n".join(formatted_history)
+    if not left:
+        return right
+    if not right or right == left:
+        return left
+    return f"{left}; {right}"
 
 
 class State(TypedDict):
@@ -129,64 +202,22 @@ class State(TypedDict):
     role: str
     question: str
     chat_history: List[BaseMessage]
+    formatted_history: str
     query_type: QueryType
+    classification_source: str
     sql_query: str
+    sql_authorized: bool
+    sql_cache_hit: bool
     sql_result: str
     retrieved_docs: List[Document]
     rag_result: str
+    policy_cache_hit: bool
+    answer_prompt: str
     final_answer: str
-    error: str
-
-
-# def validate_sql_query(query_result: Union[dict, BaseModel]) -> bool:
-#     """Basic SQL query validation for security."""
-#     # Extract SQL query string from result object
-#     if isinstance(query_result, dict):
-#         query = query_result.get("query", "")
-#     elif hasattr(query_result, 'query'):
-#         query = query_result.query
-#     else:
-#         query = str(query_result)
-#     if not query or not query.strip():
-#         return False
-#
-#     # Convert to lowercase for checking
-#     query_lower = query.lower().strip()
-#
-#     # Block potentially dangerous operations
-#     dangerous_keywords = [
-#         'drop', 'delete', 'insert', 'update', 'alter', 'create',
-#         'truncate', 'replace', 'grant', 'revoke'
-#     ]
-#
-#     for keyword in dangerous_keywords:
-#         if keyword in query_lower:
-#             logger.warning(f"Blocked potentially dangerous SQL keyword: {keyword}")
-#             return False
-#
-#     # # Must start with SELECT
-#     # if not query_lower.startswith('select'):
-#     #     logger.warning("SQL query must start with SELECT")
-#     #     return False
-#
-#     return True
+    error: Annotated[str, merge_errors]
 
 
-def classify_query(state: State):
-    """
-    Determine if query is about database data, policies, or both.
-    Uses chat_history for context-aware classification.
-    """
-
-    try:
-        if not llm:
-            logger.error("LLM not available for classification.")
-            return {"error": "LLM not available", "query_type": "DATABASE"}
-
-        formatted_chat_history = format_chat_history_for_llm(state["chat_history"])
-        # logger.info(f"Classify Query - Formatted Chat History:\n{formatted_chat_history}")
-
-        classification_template = PromptTemplate.from_template("""
+classification_template = PromptTemplate.from_template("""
          You are a query classifier for an HR chatbot. Classify the user's question into one of these categories:
          1. DATABASE – Ask for employee-specific data only.
             Examples:
@@ -217,20 +248,83 @@ def classify_query(state: State):
          Question: {question}
          """)
 
-        prompt = classification_template.invoke({"question": state["question"], "chat_history": formatted_chat_history})
-        response = llm.invoke(prompt)
-        query_type = response.content.strip().upper()
 
-        if query_type not in ["DATABASE", "POLICY", "HYBRID"]:
-            logger.warning(f"Invalid query type returned: {query_type}, defaulting to DATABASE")
-            query_type = "DATABASE"
+def classify_locally(state: State):
+    """
+    Classify with the local embedding classifier.
+    Returns the node update on a confident decision, or None to fall back to the LLM.
+    A follow-up ("and for last year?") is only classified locally when the question on its
+    own and the question together with the previous user turn get the same confident type.
+    """
+    if not query_classifier:
+        return None
+    try:
+        query_type, margin = query_classifier.classify(state["question"])
+        previous_questions = [m.content for m in state["chat_history"] if isinstance(m, HumanMessage)][-1:]
+        if query_type and previous_questions:
+            in_context, context_margin = query_classifier.classify("\n".join(previous_questions + [state["question"]]))
+            if in_context != query_type:
+                query_type, margin = None, min(margin, context_margin)
+        record_cache_event("query_classifier", bool(query_type))
+        if query_type:
+            logger.info(f"Query classified locally as: {query_type} (margin={margin:.3f})")
+            return {"query_type": query_type, "classification_source": "embedding"}
+        logger.info(f"Local classifier not confident (margin={margin:.3f}) or disagrees with the chat context, "
+                    f"falling back to LLM.")
+    except Exception as e:
+        logger.error(f"Local query classification failed: {e}. Falling back to LLM.")
+    return None
+
+
+def get_formatted_history(state: State) -> str:
+    """
+    Chat history string shared by every prompt of a request. classify_query renders it
+    once (within the token budget) and stores it in the state for the other nodes.
+    """
+    if state.get("formatted_history") is not None:
+        return state["formatted_history"]
+    return history_manager.render(state["chat_history"])
+
+
+def build_classification_prompt(state: State, formatted_chat_history: str):
+    # logger.info(f"Classify Query - Formatted Chat History:\n{formatted_chat_history}")
+    return classification_template.invoke({"question": state["question"], "chat_history": formatted_chat_history})
+
 
-        logger.info(f"Query classified as: {query_type}")
-        return {"query_type": query_type}
+def parse_classification(content: str) -> dict:
+    query_type = content.strip().upper()
+
+    if query_type not in ["DATABASE", "POLICY", "HYBRID"]:
+        logger.warning(f"Invalid query type returned: {query_type}, defaulting to DATABASE")
+        query_type = "DATABASE"
+
+    logger.info(f"Query classified as: {query_type}")
+    return {"query_type": query_type, "classification_source": "llm"}
+
+
+def classify_query(state: State):
+    """
+    Determine if query is about database data, policies, or both.
+    Tries the local embedding classifier first and only calls the LLM (with
+    chat_history for context-aware classification) when it is not confident.
+    """
+    formatted_history = get_formatted_history(state)
+    local_result = classify_locally(state)
+    if local_result:
+        return {**local_result, "formatted_history": formatted_history}
+
+    try:
+        if not classify_llm:
+            logger.error("LLM not available for classification.")
+            return {"error": "LLM not available", "query_type": "DATABASE", "formatted_history": formatted_history}
+
+        response = classify_llm.invoke(build_classification_prompt(state, formatted_history))
+        return {**parse_classification(response.content), "formatted_history": formatted_history}
 
     except Exception as e:
         logger.error(f"Error in query classification: {e}")
-        return {"error": f"Classification failed: {str(e)}", "query_type": "DATABASE"}
+        return {"error": f"Classification failed: {str(e)}", "query_type": "DATABASE",
+                "formatted_history": formatted_history}
 
 
 # System Prompt + User Prompt for SQL Query generation
@@ -360,145 +454,288 @@ class QueryOutput(TypedDict):
     query: Annotated[str, ..., "Syntactically valid SQL query."]
 
 
+class QueryPlanOutput(TypedDict):
+    """Access decision, tables and SQL query produced in a single pass."""
+
+    authorized: Annotated[bool, ..., "Whether the user's role may access the requested data."]
+    tables: Annotated[List[str], ..., "Tables the query reads from."]
+    query: Annotated[str, ..., "Syntactically valid SQL query, empty if not authorized."]
+
+
+def get_table_info_for_role(role: str, question: str = "") -> str:
+    """
+    Schema text for the SQL prompts, served from the snapshot when available.
+    With pruning enabled only the tables relevant to the question are rendered.
+    """
+    if schema_selector and question:
+        try:
+            table_info = schema_selector.get_table_info(question, role)
+            if table_info:
+                return table_info
+        except Exception as e:
+            logger.error(f"Schema selection failed: {e}. Using the full schema.")
+    if schema_snapshot:
+        return schema_snapshot.get_table_info(role)
+    return db.get_table_info()
+
+
 # Writing the SQL Query
-def write_query(state: State):
+def prepare_sql_generation(state: State):
     """
-    Generate SQL query with explicit reasoning about required data.
-    Uses chat_history for context-aware query generation.
+    Checks and context shared by the sync and async SQL generation paths.
+
+    Returns:
+        (result, table_info, formatted_chat_history): `result` is the node update when no
+        LLM call is needed (missing DB/LLM or a template cache hit), otherwise None.
     """
-    if state["query_type"] in ["DATABASE", "HYBRID"]:
-        if not db:
-            logger.error("Database connection not available for writing query.")
-            return {"sql_query": "", "error": "Database not connected. Cannot generate SQL query."}
-        if not llm:
-            logger.error("LLM not available for writing query.")
-            return {"sql_query": "", "error": "LLM not available for SQL generation."}
+    if not db:
+        logger.error("Database connection not available for writing query.")
+        return {"sql_query": "", "error": "Database not connected. Cannot generate SQL query."}, "", ""
+    if not sql_llm or not sql_reasoning_llm:
+        logger.error("LLM not available for writing query.")
+        return {"sql_query": "", "error": "LLM not available for SQL generation."}, "", ""
+
+    # Follow-ups are resolved against the chat history, which the template key doesn't capture
+    if sql_template_cache and not state["chat_history"]:
+        try:
+            cached_query = sql_template_cache.lookup(state["question"], state["role"], state["employee_code"])
+            if cached_query:
+                return {"sql_query": cached_query, "sql_cache_hit": True}, "", ""
+        except Exception as e:
+            logger.error(f"SQL template cache lookup failed: {e}")
 
-        # FIX: Use formatted_chat_history in the reasoning prompt
-        formatted_chat_history = format_chat_history_for_llm(state["chat_history"])
-        # logger.info(f"Classify Query - Formatted Chat History:\n{formatted_chat_history}")
+    # FIX: Use formatted_chat_history in the reasoning prompt
+    formatted_chat_history = get_formatted_history(state)
+    # Score tables against the question plus the previous user turn, so follow-ups keep their tables
+    previous_questions = [m.content for m in state["chat_history"] if isinstance(m, HumanMessage)][-1:]
+    table_info = get_table_info_for_role(state["role"], "\n".join(previous_questions + [state["question"]]))
+    # logger.info(f"Classify Query - Formatted Chat History:\n{formatted_chat_history}")
+    return None, table_info, formatted_chat_history
 
-        # Reasoning prompt
-        reasoning_prompt = PromptTemplate.from_template("""
-        You are a helpful assistant for an HR chatbot.
 
-        Analyze the user's HR-related question and explain **what specific data** needs to be fetched from the SQL database to answer it.
-        Consider the chat history for context to resolve ambiguities like pronouns
-         
+def write_query(state: State):
+    """
+    Generate SQL query with explicit reasoning about required data.
+    Uses chat_history for context-aware query generation.
+    """
+    result, table_info, formatted_chat_history = prepare_sql_generation(state)
+    if result is not None:
+        return result
+
+    output = generate_sql(state, table_info, formatted_chat_history)
+    reason = review_sql(output, state["role"])
+    if reason:
+        # One regeneration attempt, told why the first query was rejected
+        logger.warning(f"Generated SQL rejected ({reason}), regenerating: {output['sql_query']}")
+        output = generate_sql(state, table_info, formatted_chat_history,
+                              rejection_feedback(output["sql_query"], reason))
+        reason = review_sql(output, state["role"])
+    if reason:
+        return rejected_sql(output, reason)
+    return output
+
+
+def generate_sql(state: State, table_info: str, formatted_chat_history: str, feedback: str = "") -> dict:
+    if Config.SQL_GENERATION_MODE == "single_pass":
+        return generate_sql_single_pass(state, table_info, formatted_chat_history, feedback)
+    return generate_sql_two_pass(state, table_info, formatted_chat_history, feedback)
+
+
+def review_sql(output: dict, role: str):
+    """Run the pre-execution guard on a generated query. Returns the rejection reason, or None."""
+    if not sql_guard or not output.get("sql_query"):
+        return None
+    return sql_guard.check(output["sql_query"], role)
+
+
+def rejection_feedback(query: str, reason: str) -> str:
+    return (f"\n\nA previous query for this question was rejected before execution because {reason}.\n"
+            f"Rejected query: {query}\n"
+            f"Write a different query that avoids this problem.")
+
+
+def rejected_sql(output: dict, reason: str) -> dict:
+    logger.error(f"Generated SQL rejected again ({reason}): {output['sql_query']}")
+    return {"sql_query": "", "error": f"The generated SQL query was rejected: {reason}"}
+
+
+# Reasoning prompt
+reasoning_prompt = PromptTemplate.from_template("""
+    You are a helpful assistant for an HR chatbot.
+
+    Analyze the user's HR-related question and explain **what specific data** needs to be fetched from the SQL database to answer it.
+    Consider the chat history for context to resolve ambiguities like pronouns
+     
+    
+    THINK STEP BY STEP:
+    1. Identify the **intent** of the question: 
+        - Eligibility check, leave balance, personal info, salary details, reporting manager lookup, etc.
+        
+    2. **User Role & Access Rules**:
+       - Role: {role}
+       - Employee Code: {employee_code}
+       
+       Apply these rules:
+       - `employee`: can access only their own data
+       - `manager`: can access their own data and these **ONLY** for direct reportees:
+         - leave balances, leave requests, basic employee info (name, department, designation)
+         - No access to salary, contact details, personal identifiers
+       - `hr_admin`: can access all employee data
+       
+    3. **Authorization Check**:
+       - Is the user allowed to access the requested info?
+       - If not, clearly state: "Unauthorized access – user is not allowed to view this data."
+
+    4. List the **required tables and columns** (only use actual tables/columns from schema).
+
+    5. **Filter Conditions**:
+       - Self lookup → filter with employee_code = {employee_code}
+       - Manager view → filter with supervisor_id = {employee_code} + role-based column restriction
+       - Name-based queries → if name ≠ self, check if manager/admin or deny access
+
+    6. Specify any **joins** needed (e.g., employee with leave_balances or manager name from employees table).
+
+
+    **Important Examples** to guide your thinking:
+    
+      - POSITIVE EXAMPLES:
+      
+        - "How many sick leaves do I have?" (Employee asking for self)  
+          → Use `leave_balances`, filter by `employee_code` and `leave_type`
         
-        THINK STEP BY STEP:
-        1. Identify the **intent** of the question: 
-            - Eligibility check, leave balance, personal info, salary details, reporting manager lookup, etc.
-            
-        2. **User Role & Access Rules**:
-           - Role: {role}
-           - Employee Code: {employee_code}
-           
-           Apply these rules:
-           - `employee`: can access only their own data
-           - `manager`: can access their own data and these **ONLY** for direct reportees:
-             - leave balances, leave requests, basic employee info (name, department, designation)
-             - No access to salary, contact details, personal identifiers
-           - `hr_admin`: can access all employee data
-           
-        3. **Authorization Check**:
-           - Is the user allowed to access the requested info?
-           - If not, clearly state: "Unauthorized access – user is not allowed to view this data."
-
-        4. List the **required tables and columns** (only use actual tables/columns from schema).
-
-        5. **Filter Conditions**:
-           - Self lookup → filter with employee_code = {employee_code}
-           - Manager view → filter with supervisor_id = {employee_code} + role-based column restriction
-           - Name-based queries → if name ≠ self, check if manager/admin or deny access
-
-        6. Specify any **joins** needed (e.g., employee with leave_balances or manager name from employees table).
-
-
-        **Important Examples** to guide your thinking:
+        - "Who are my direct reports?" (Manager)  
+          → Use `employees`, filter `supervisor_id = {employee_code}`
         
-          - POSITIVE EXAMPLES:
+        - "What is Karan’s department and designation?" (Manager)  
+          → Allowed if Karan reports to the manager
           
-            - "How many sick leaves do I have?" (Employee asking for self)  
-              → Use `leave_balances`, filter by `employee_code` and `leave_type`
-            
-            - "Who are my direct reports?" (Manager)  
-              → Use `employees`, filter `supervisor_id = {employee_code}`
-            
-            - "What is Karan’s department and designation?" (Manager)  
-              → Allowed if Karan reports to the manager
-              
-            ---   
-            
-          - NEGATIVE EXAMPLES (Reject These):
-
-            - "Show me Neha’s salary" (Manager or Employee)  
-              → Reject: Not authorized
-            
-            - "What is someone’s phone number or email?"  
-              → Reject: Not accessible unless HR Admin
-            
-            - "What is the company policy on sabbaticals?"  
-              → Reject: Policy questions are not in database
-
-            - "How many employees are in marketing with DOB after 1990?" (Manager)  
-              → Reject: Date of birth is not accessible to managers
+        ---   
         
-        ---
+      - NEGATIVE EXAMPLES (Reject These):
 
-        Use only these available tables and columns:
-        {table_info}
+        - "Show me Neha’s salary" (Manager or Employee)  
+          → Reject: Not authorized
+        
+        - "What is someone’s phone number or email?"  
+          → Reject: Not accessible unless HR Admin
+        
+        - "What is the company policy on sabbaticals?"  
+          → Reject: Policy questions are not in database
+
+        - "How many employees are in marketing with DOB after 1990?" (Manager)  
+          → Reject: Date of birth is not accessible to managers
+    
+    ---
+
+    Use only these available tables and columns:
+    {table_info}
+
+    Chat History: {chat_history}
+
+    Now answer:
+    What data needs to be fetched to answer this question?
+
+    Question: {question}
+""")
+
+def build_reasoning_prompt(state: State, table_info: str, formatted_chat_history: str):
+    return reasoning_prompt.invoke({
+        "question": state["question"],
+        "chat_history": formatted_chat_history,  # FIX: Pass formatted_chat_history here
+        "table_info": table_info,  # Also pass table info for reasoning
+        "employee_code": state["employee_code"],  # ✅ Add this
+        "role": state["role"],
+    })
+
+
+def build_sql_prompt(state: State, table_info: str, formatted_chat_history: str, reasoning: str,
+                     feedback: str = ""):
+    return query_prompt_template.invoke(
+        {
+            "dialect": db.dialect,
+            "top_k": 10,
+            "table_info": table_info,
+            "input": f"Question: {state['question']}\n\nReasoning:\n{reasoning}{feedback}",
+            "chat_history": formatted_chat_history,  # FIX: Pass formatted_chat_history here
+            "employee_code": state["employee_code"],
+            "role": state["role"]
 
-        Chat History: {chat_history}
+        }
+    )
 
-        Now answer:
-        What data needs to be fetched to answer this question?
 
-        Question: {question}
-        """)
+def generate_sql_two_pass(state: State, table_info: str, formatted_chat_history: str, feedback: str = "") -> dict:
+    """
+    Free-text reasoning call about the data needed, followed by a structured SQL call
+    that receives the reasoning as extra input.
+    """
+    reasoning_response = sql_reasoning_llm.invoke(build_reasoning_prompt(state, table_info, formatted_chat_history))
+    logger.info(f"SQL Reasoning:\n{reasoning_response.content}")
 
-        reasoning_response = llm.invoke(
-            reasoning_prompt.invoke({
-                "question": state["question"],
-                "chat_history": formatted_chat_history,  # FIX: Pass formatted_chat_history here
-                "table_info": db.get_table_info(),  # Also pass table info for reasoning
-                "employee_code": state["employee_code"],  # ✅ Add this
-                "role": state["role"],
-            })
-        )
-        logger.info(f"SQL Reasoning:\n{reasoning_response.content}")
+    prompt = build_sql_prompt(state, table_info, formatted_chat_history, reasoning_response.content, feedback)
+    try:
+        structured_llm = sql_llm.with_structured_output(QueryOutput)
+        result = structured_llm.invoke(prompt)
+        return {"sql_query": result["query"]}
+    except Exception as e:
+        logger.error(f"Failed to parse SQL output: {e}")
+        return {"sql_query": "", "error": "SQL generation failed."}
 
-        prompt = query_prompt_template.invoke(
-            {
-                "dialect": db.dialect,
-                "top_k": 10,
-                "table_info": db.get_table_info(),
-                "input": f"Question: {state['question']}\n\nReasoning:\n{reasoning_response.content}",
-                "chat_history": formatted_chat_history,  # FIX: Pass formatted_chat_history here
-                "employee_code": state["employee_code"],
-                "role": state["role"]
-
-            }
-        )
-        try:
-            structured_llm = llm.with_structured_output(QueryOutput)
-            result = structured_llm.invoke(prompt)
 
-            # if not validate_sql_query(result):
-            #     logger.error(f"Invalid or dangerous SQL query generated: {result}")
-            #     return {"error": "Generated query failed security validation", "query": ""}
+single_pass_user_prompt = """Chat History: {chat_history}
+Question: {input}
 
-            return {"sql_query": result["query"]}
-        except Exception as e:
-            logger.error(f"Failed to parse SQL output: {e}")
-            return {"sql_query": "", "error": "SQL generation failed."}
-    else:
-        return {"sql_query": ""}
+Work through the step-by-step reasoning above silently, then respond with:
+- authorized: false if the role-based access rules forbid answering this question, true otherwise
+- tables: the tables the query reads from
+- query: the SQL query, or an empty string when not authorized"""
+
+single_pass_prompt_template = ChatPromptTemplate(
+    [("system", system_message), ("user", single_pass_user_prompt)]
+)
+
+
+def build_single_pass_prompt(state: State, table_info: str, formatted_chat_history: str, feedback: str = ""):
+    return single_pass_prompt_template.invoke(
+        {
+            "dialect": db.dialect,
+            "table_info": table_info,
+            "input": state["question"] + feedback,
+            "chat_history": formatted_chat_history,
+            "employee_code": state["employee_code"],
+            "role": state["role"]
+        }
+    )
+
+
+def parse_query_plan(result: QueryPlanOutput) -> dict:
+    logger.info(f"SQL plan: authorized={result.get('authorized')}, tables={result.get('tables')}")
+
+    if not result.get("authorized", True):
+        return {"sql_query": "", "sql_authorized": False}
+    return {"sql_query": result.get("query", ""), "sql_authorized": True}
+
+
+def generate_sql_single_pass(state: State, table_info: str, formatted_chat_history: str,
+                             feedback: str = "") -> dict:
+    """
+    Produce the access decision, the tables to read and the SQL in a single structured call.
+    """
+    prompt = build_single_pass_prompt(state, table_info, formatted_chat_history, feedback)
+    try:
+        structured_llm = sql_llm.with_structured_output(QueryPlanOutput)
+        return parse_query_plan(structured_llm.invoke(prompt))
+    except Exception as e:
+        logger.error(f"Failed to parse single-pass SQL output: {e}")
+        return {"sql_query": "", "error": "SQL generation failed."}
 
 
 # Executing the SQL Query on the DB
 def execute_query(state: State):
     """Execute SQL query."""
+    if state.get("sql_authorized") is False:
+        logger.info("SQL generation denied access for this role.")
+        return {"sql_result": "You are not authorized to access this information."}
     if not state.get("sql_query"):
         logger.info("No SQL query to execute.")
         return {"sql_result": "No SQL query generated."}
@@ -506,9 +743,13 @@ def execute_query(state: State):
         logger.error("Database connection not available for execution.")
         return {"sql_result": "", "error": "Database not connected. Cannot execute SQL query."}
     try:
-        execute_query_tool = QuerySQLDatabaseTool(db=db)
-        result = execute_query_tool.invoke(state["sql_query"])
+        result = sql_executor.run(state["sql_query"], state["role"])
         logger.info(f"SQL Execution Result: {result}")
+
+        # SQL errors are reported in the result string instead of raising
+        if (sql_template_cache and not state.get("sql_cache_hit") and not state["chat_history"]
+                and not str(result).startswith("Error")):
+            sql_template_cache.store(state["question"], state["role"], state["employee_code"], state["sql_query"])
         return {"sql_result": result}
     except Exception as e:
         logger.error(f"Error executing SQL query '{state['sql_query']}': {e}")
@@ -521,27 +762,17 @@ def handle_policy_query(state: State):
     Passes chat_history to the RAG chain for better contextual retrieval/generation.
     """
     try:
-        if state["query_type"] in ["POLICY", "HYBRID"]:
-            if not rag_chain:
-                logger.warning("RAG chain not initialized. Cannot handle policy queries.")
-                return {"retrieved_docs": [], "rag_result": "", "error": "Policy RAG system not available."}
-
-            # FIX: Use formatted_chat_history in the RAG chain invoke
-            formatted_chat_history = format_chat_history_for_llm(state["chat_history"])
-            # logger.info(f"Classify Query - Formatted Chat History:\n{formatted_chat_history}")
-
-            rag_output = rag_chain.invoke({"question": state["question"], "chat_history": state["chat_history"]})
-            logger.info(f"RAG Result: {rag_output.get('answer', 'No RAG answer.')}")
-            return {
-                "retrieved_docs": rag_output.get("context", []),
-                "rag_result": rag_output.get("answer", "")
-            }
-        else:
-            # No need to run RAG for DATABASE queries
-            return {
-                "retrieved_docs": [],
-                "rag_result": ""
-            }
+        if not rag_chain:
+            logger.warning("RAG chain not initialized. Cannot handle policy queries.")
+            return {"retrieved_docs": [], "rag_result": "", "error": "Policy RAG system not available."}
+
+        rag_output = rag_chain.invoke({
+            "question": state["question"],
+            "chat_history": state["chat_history"],
+            "formatted_history": get_formatted_history(state),
+            "query_type": state["query_type"]
+        })
+        return parse_rag_output(rag_output)
 
     except Exception as e:
         logger.error(f"Error in handle_policy_query: {e}")
@@ -552,8 +783,17 @@ def handle_policy_query(state: State):
         }
 
 
+def parse_rag_output(rag_output: dict) -> dict:
+    logger.info(f"RAG Result: {rag_output.get('answer', 'No RAG answer.')}")
+    return {
+        "retrieved_docs": rag_output.get("context", []),
+        "rag_result": rag_output.get("answer", ""),
+        "policy_cache_hit": bool(rag_output.get("cache_hit"))
+    }
+
+
 # sql to natural language for hybrid queries
-def format_sql_result(llm, question: str, sql_query: str, sql_result: str, chat_history: List[BaseMessage]) -> str:
+def format_sql_result(llm, question: str, sql_query: str, sql_result: str, formatted_chat_history: str) -> str:
     """
     Use the LLM to convert SQL query result into human-readable natural language for hybrid queries
     Includes chat_history for better context.
@@ -564,10 +804,15 @@ def format_sql_result(llm, question: str, sql_query: str, sql_result: str, chat_
         logger.error("LLM not available for formatting SQL result.")
         return "LLM not available to format SQL result."
 
-    # FIX: Use formatted_chat_history in the prompt
-    formatted_chat_history = format_chat_history_for_llm(chat_history)
+    try:
+        response = llm.invoke(build_sql_result_prompt(question, sql_query, sql_result, formatted_chat_history))
+        return response.content.strip()
+    except Exception as e:
+        return f"Error formatting SQL result: {str(e)}"
+
 
-    prompt = (
+def build_sql_result_prompt(question: str, sql_query: str, sql_result: str, formatted_chat_history: str) -> str:
+    return (
         "You are Employee Self Service Bot, a helpful and professional HR assistant.\n"
         "The user has asked a question that may involve both database information and company policy.\n"
         "You are now only provided with the database SQL result — your job is to explain what this part of the data tells us in natural language.\n\n"
@@ -580,16 +825,15 @@ def format_sql_result(llm, question: str, sql_query: str, sql_result: str, chat_
         f"SQL Result: {sql_result}"
     )
 
-    try:
-        response = llm.invoke(prompt)
-        return response.content.strip()
-    except Exception as e:
-        return f"Error formatting SQL result: {str(e)}"
 
-
-# generating the natural langauge answer
-def generate_answer(state: State):
-    """Generate the final answer based on DB and/or policy RAG results, considering chat history."""
+def build_answer_prompt(state: State, sql_natural: str = None) -> dict:
+    """
+    Build the final-answer prompt from DB and/or policy RAG results, considering chat history.
+    Returns {"prompt": ...} when an LLM call is needed, or {"final_answer": ...} when the
+    answer is already known (errors, empty results, cached policy answers).
+    For HYBRID queries `sql_natural` may be passed in already formatted; otherwise
+    the SQL result is formatted here.
+    """
     try:
         if state.get("error"):
             return {"final_answer": f"I encountered an issue: {state['error']}. Please try rephrasing your question."}
@@ -599,7 +843,7 @@ def generate_answer(state: State):
 
         query_type = state["query_type"]
         # FIX: Use formatted_chat_history for the final answer generation
-        formatted_chat_history = format_chat_history_for_llm(state["chat_history"])
+        formatted_chat_history = get_formatted_history(state)
 
         if query_type == "DATABASE":
             if not state.get("sql_result"):
@@ -622,6 +866,10 @@ def generate_answer(state: State):
             if not state.get("rag_result"):
                 return {"final_answer": "I couldn't find any relevant policy documents to answer your question."}
 
+            # A cached policy answer for a standalone question needs no further rewording
+            if state.get("policy_cache_hit") and not state["chat_history"]:
+                return {"final_answer": state["rag_result"]}
+
             prompt = (
                 "You are Employee Self Service Bot, a helpful and professional HR assistant. "
                 "Based on the following chat history and HR policy context, answer the user's question clearly and professionally.\n\n"
@@ -636,14 +884,15 @@ def generate_answer(state: State):
                     "final_answer": "I couldn't find any relevant database or policy information to answer your question."}
 
                 # Format SQL result into natural language for better context
-            sql_natural = format_sql_result(
-                llm,
-                state["question"],
-                state["sql_query"],
-                state["sql_result"],
-                state["chat_history"]
+            if sql_natural is None:
+                sql_natural = format_sql_result(
+                    sql_answer_llm,
+                    state["question"],
+                    state["sql_query"],
+                    state["sql_result"],
+                    formatted_chat_history
 
-            )
+                )
 
             logger.info(f"Formatted SQL Result (natural language):\n{sql_natural}")
 
@@ -660,37 +909,232 @@ def generate_answer(state: State):
         else:
             return {"final_answer": "Unsupported query type."}
 
+        return {"prompt": prompt}
+
+    except Exception as e:
+        logger.error(f"Error in generate_answer: {e}")
+        return {"final_answer": ANSWER_ERROR_MESSAGE}
+
+
+ANSWER_ERROR_MESSAGE = "Sorry, an error occurred while generating your answer. Please try again."
+
+
+# generating the natural langauge answer
+def generate_answer(state: State):
+    """Generate the final answer based on DB and/or policy RAG results, considering chat history."""
+    prepared = build_answer_prompt(state)
+    if "prompt" not in prepared:
+        return prepared
+    try:
         # Generate final answer
-        response = llm.invoke(prompt)
+        response = llm.invoke(prepared["prompt"])
         return {"final_answer": response.content}
+    except Exception as e:
+        logger.error(f"Error in generate_answer: {e}")
+        return {"final_answer": ANSWER_ERROR_MESSAGE}
+
+
+def route_query(state: State) -> List[str]:
+    """Select the branch(es) to run for the classified query type."""
+    if state["query_type"] == "POLICY":
+        return ["handle_policy_query"]
+    if state["query_type"] == "HYBRID":
+        return ["write_query", "handle_policy_query"]
+    return ["write_query"]
 
 
+def route_single_branch(state: State) -> str:
+    """
+    Continue to generate_answer after a branch finishes, unless the query is HYBRID.
+    HYBRID answers are triggered by the join edge once both branches have finished.
+    """
+    if state["query_type"] == "HYBRID":
+        return END
+    return "generate_answer"
+
+
+# ---------------------------------------------------------------------
+# Async node variants, used when the graph is run with `ainvoke` (SERVER_MODE=async).
+# LLM calls go through `ainvoke`; CPU-bound embedding work and the blocking DB
+# driver are offloaded to threads so the event loop can serve other chats.
+# ---------------------------------------------------------------------
+
+async def aclassify_query(state: State):
+    formatted_history = await asyncio.to_thread(get_formatted_history, state)
+    local_result = await asyncio.to_thread(classify_locally, state)
+    if local_result:
+        return {**local_result, "formatted_history": formatted_history}
+
+    try:
+        if not classify_llm:
+            logger.error("LLM not available for classification.")
+            return {"error": "LLM not available", "query_type": "DATABASE", "formatted_history": formatted_history}
+
+        response = await classify_llm.ainvoke(build_classification_prompt(state, formatted_history))
+        return {**parse_classification(response.content), "formatted_history": formatted_history}
+
+    except Exception as e:
+        logger.error(f"Error in query classification: {e}")
+        return {"error": f"Classification failed: {str(e)}", "query_type": "DATABASE",
+                "formatted_history": formatted_history}
+
+
+async def awrite_query(state: State):
+    # Template cache lookup and schema selection embed the question on the CPU
+    result, table_info, formatted_chat_history = await asyncio.to_thread(prepare_sql_generation, state)
+    if result is not None:
+        return result
+
+    output = await agenerate_sql(state, table_info, formatted_chat_history)
+    # EXPLAIN goes through the blocking DB driver
+    reason = await asyncio.to_thread(review_sql, output, state["role"])
+    if reason:
+        logger.warning(f"Generated SQL rejected ({reason}), regenerating: {output['sql_query']}")
+        output = await agenerate_sql(state, table_info, formatted_chat_history,
+                                     rejection_feedback(output["sql_query"], reason))
+        reason = await asyncio.to_thread(review_sql, output, state["role"])
+    if reason:
+        return rejected_sql(output, reason)
+    return output
+
+
+async def agenerate_sql(state: State, table_info: str, formatted_chat_history: str, feedback: str = "") -> dict:
+    if Config.SQL_GENERATION_MODE == "single_pass":
+        prompt = build_single_pass_prompt(state, table_info, formatted_chat_history, feedback)
+        try:
+            structured_llm = sql_llm.with_structured_output(QueryPlanOutput)
+            return parse_query_plan(await structured_llm.ainvoke(prompt))
+        except Exception as e:
+            logger.error(f"Failed to parse single-pass SQL output: {e}")
+            return {"sql_query": "", "error": "SQL generation failed."}
+
+    reasoning_response = await sql_reasoning_llm.ainvoke(build_reasoning_prompt(state, table_info, formatted_chat_history))
+    logger.info(f"SQL Reasoning:\n{reasoning_response.content}")
+
+    prompt = build_sql_prompt(state, table_info, formatted_chat_history, reasoning_response.content, feedback)
+    try:
+        structured_llm = sql_llm.with_structured_output(QueryOutput)
+        result = await structured_llm.ainvoke(prompt)
+        return {"sql_query": result["query"]}
+    except Exception as e:
+        logger.error(f"Failed to parse SQL output: {e}")
+        return {"sql_query": "", "error": "SQL generation failed."}
+
+
+async def aexecute_query(state: State):
+    # The MySQL driver is blocking
+    return await asyncio.to_thread(execute_query, state)
+
+
+async def ahandle_policy_query(state: State):
+    try:
+        if not rag_chain:
+            logger.warning("RAG chain not initialized. Cannot handle policy queries.")
+            return {"retrieved_docs": [], "rag_result": "", "error": "Policy RAG system not available."}
+
+        rag_output = await rag_chain.ainvoke({
+            "question": state["question"],
+            "chat_history": state["chat_history"],
+            "formatted_history": get_formatted_history(state),
+            "query_type": state["query_type"]
+        })
+        return parse_rag_output(rag_output)
+
+    except Exception as e:
+        logger.error(f"Error in handle_policy_query: {e}")
+        return {
+            "retrieved_docs": [],
+            "rag_result": "",
+            "error": f"Policy query handling failed: {str(e)}"
+        }
+
+
+async def aformat_sql_result(question: str, sql_query: str, sql_result: str, formatted_chat_history: str) -> str:
+    if not sql_result:
+        return "No relevant employee data was found in the database."
+    try:
+        response = await sql_answer_llm.ainvoke(build_sql_result_prompt(question, sql_query, sql_result, formatted_chat_history))
+        return response.content.strip()
+    except Exception as e:
+        return f"Error formatting SQL result: {str(e)}"
+
+
+async def agenerate_answer(state: State):
+    sql_natural = None
+    if (state.get("query_type") == "HYBRID" and sql_answer_llm and not state.get("error")
+            and (state.get("sql_result") or state.get("rag_result"))):
+        sql_natural = await aformat_sql_result(
+            state["question"], state["sql_query"], state["sql_result"], get_formatted_history(state)
+        )
+
+    prepared = build_answer_prompt(state, sql_natural)
+    if "prompt" not in prepared:
+        return prepared
+    try:
+        response = await llm.ainvoke(prepared["prompt"])
+        return {"final_answer": response.content}
     except Exception as e:
         logger.error(f"Error in generate_answer: {e}")
-        return {"final_answer": "Sorry, an error occurred while generating your answer. Please try again."}
+        return {"final_answer": ANSWER_ERROR_MESSAGE}
+
+
+def prepare_answer(state: State):
+    """
+    Final node of the streaming graph: builds the answer prompt but leaves the LLM call
+    to the /chat/stream endpoint, which streams its tokens to the client.
+    """
+    prepared = build_answer_prompt(state)
+    if "prompt" in prepared:
+        return {"answer_prompt": prepared["prompt"]}
+    return prepared
+
+
+def instrumented_node(name: str, func, afunc=None) -> RunnableLambda:
+    """Graph node with latency/error metrics around both its sync and async variants."""
+    if afunc is None:
+        return RunnableLambda(instrument_node(name, func))
+    return RunnableLambda(instrument_node(name, func), afunc=instrument_node(name, afunc))
 
 
 # connecting all steps in a graph using Langgraph
-graph_builder = StateGraph(State)
+def build_chat_graph(answer_node):
+    """Compile the chat graph with the given final answer node."""
+    graph_builder = StateGraph(State)
+
+    # Each node runs its sync function under `invoke` and its async twin under `ainvoke`
+    graph_builder.add_node("classify_query", instrumented_node("classify_query", classify_query, aclassify_query))
+    graph_builder.add_node("write_query", instrumented_node("write_query", write_query, awrite_query))
+    graph_builder.add_node("execute_query", instrumented_node("execute_query", execute_query, aexecute_query))
+    graph_builder.add_node("handle_policy_query",
+                           instrumented_node("handle_policy_query", handle_policy_query, ahandle_policy_query))
+    graph_builder.add_node("generate_answer", answer_node)
+
+    graph_builder.set_entry_point("classify_query")
+
+    # Fan out after classification: DATABASE runs only the SQL branch, POLICY only the
+    # RAG branch, and HYBRID runs both concurrently before joining at generate_answer.
+    graph_builder.add_conditional_edges(
+        "classify_query", route_query, ["write_query", "handle_policy_query"]
+    )
+    graph_builder.add_edge("write_query", "execute_query")
+
+    # HYBRID waits on both branches; single-branch queries go straight to the answer.
+    graph_builder.add_edge(["execute_query", "handle_policy_query"], "generate_answer")
+    graph_builder.add_conditional_edges("execute_query", route_single_branch, ["generate_answer", END])
+    graph_builder.add_conditional_edges("handle_policy_query", route_single_branch, ["generate_answer", END])
+    graph_builder.set_finish_point("generate_answer")
 
-graph_builder.add_node("classify_query", classify_query)
-graph_builder.add_node("write_query", write_query)
-graph_builder.add_node("execute_query", execute_query)
-graph_builder.add_node("handle_policy_query", handle_policy_query)
-graph_builder.add_node("generate_answer", generate_answer)
+    return graph_builder.compile()
 
-graph_builder.set_entry_point("classify_query")
-graph_builder.add_edge("classify_query", "write_query")
-graph_builder.add_edge("write_query", "execute_query")
-graph_builder.add_edge("execute_query", "handle_policy_query")
-graph_builder.add_edge("handle_policy_query", "generate_answer")
 
-graph = graph_builder.compile()
+graph = build_chat_graph(instrumented_node("generate_answer", generate_answer, agenerate_answer))
+streaming_graph = build_chat_graph(instrumented_node("generate_answer", prepare_answer))
 
 
-# Wrapper to integrate session-based memory into LangGraph pipeline
-def get_session_history_wrapper(session_id: str) -> BaseChatMessageHistory:
-    return get_session_history(session_id, app.session_histories)
+# Wrapper to integrate session-based memory into LangGraph pipeline.
+# Histories are keyed per user so one user can't read another's session by its id.
+def get_session_history_wrapper(user_id: str, session_id: str) -> BaseChatMessageHistory:
+    return get_session_history((str(user_id), session_id), app.session_histories)
 
 
 # Wrap LangGraph pipeline with memory for contextual multi-turn conversations
@@ -699,7 +1143,13 @@ graph_with_history = RunnableWithMessageHistory(
     get_session_history_wrapper,  # Use the wrapper function
     input_messages_key="question",
     history_messages_key="chat_history",
-    output_messages_key="final_answer"
+    output_messages_key="final_answer",
+    history_factory_config=[
+        ConfigurableFieldSpec(id="user_id", annotation=str, name="User ID",
+                              description="Authenticated user the session belongs to.", default="", is_shared=True),
+        ConfigurableFieldSpec(id="session_id", annotation=str, name="Session ID",
+                              description="Unique identifier of the conversation.", default="", is_shared=True),
+    ],
 )
 
 
@@ -736,6 +1186,7 @@ def chat():
     if not user_query:
         return jsonify({"response": "No message provided."}), 400
 
+    started = time.perf_counter()
     try:
 
         # Run memory-aware LangGraph pipeline
@@ -746,16 +1197,22 @@ def chat():
                 "role": role
             },
 
-            config={"configurable": {"session_id": session_id}}
+            config={"configurable": {"user_id": str(user_id), "session_id": session_id}}
         )
 
-        logger.info(f"Query Type: {ans.get('query_type')}")
+        logger.info(f"Query Type: {ans.get('query_type')} (via {ans.get('classification_source')})")
         logger.info(f"SQL Query generated: {ans.get('sql_query')}")
         logger.info(f"SQL result found in DB: {ans.get('sql_result')}")
         logger.info(f"Policy RAG Result: {ans.get('rag_result')}")
         logger.info(f"Final Answer: {ans.get('final_answer')}")
         logger.info(f"Error: {ans.get('error')}")
 
+        # Summarise older turns off the request path so the next prompt stays within budget
+        history_manager.fold_in_background(get_session_history_wrapper(user_id, session_id),
+                                           f"{user_id}:{session_id}")
+        REQUEST_DURATION.labels(endpoint="chat", query_type=ans.get("query_type") or "unknown").observe(
+            time.perf_counter() - started)
+
         # Send only the final natural language answer to frontend
         return jsonify({"response": ans["final_answer"]})
 
@@ -764,13 +1221,136 @@ def chat():
         return jsonify({"response": "Sorry, something went wrong on the server. Please try again later."}), 500
 
 
-auth_bp = create_auth_blueprint(db)
+# Stage events emitted by /chat/stream as graph nodes finish
+STREAM_STAGES = {
+    "classify_query": "classified",
+    "execute_query": "sql_executed",
+    "handle_policy_query": "policy_retrieved",
+}
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/chat/stream', methods=['POST'])
+@jwt_required()
+def chat_stream():
+    """
+    Streaming variant of /chat. Sends Server-Sent Events as the pipeline runs:
+    `stage` when a node finishes, `token` for each chunk of the final answer,
+    then `done` with the complete answer once it has been saved to session history.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Invalid or expired token"}), 401
+
+    data = request.get_json()
+    user_query = data.get("message")
+    session_id = data.get("session_id", "default_session")
+
+    if not user_query:
+        return jsonify({"response": "No message provided."}), 400
+
+    history = get_session_history_wrapper(user["user_id"], session_id)
+    inputs = {
+        "question": user_query,
+        "employee_code": user["employee_code"],
+        "role": user["role"],
+        "chat_history": list(history.messages),
+    }
+
+    def generate():
+        started = time.perf_counter()
+        try:
+            state = {}
+            for update in streaming_graph.stream(inputs, stream_mode="updates"):
+                for node, output in update.items():
+                    state.update(output or {})
+                    if node in STREAM_STAGES:
+                        payload = {"stage": STREAM_STAGES[node]}
+                        if node == "classify_query":
+                            payload["query_type"] = state.get("query_type")
+                        yield sse_event("stage", payload)
+
+            answer = state.get("final_answer")
+            if answer is None:
+                chunks = []
+                try:
+                    for chunk in llm.stream(state["answer_prompt"], config={"metadata": {
+                            "stage": "generate_answer", "query_type": state.get("query_type")}}):
+                        if chunk.content:
+                            chunks.append(chunk.content)
+                            yield sse_event("token", {"text": chunk.content})
+                    answer = "".join(chunks)
+                except Exception as e:
+                    logger.error(f"Error streaming final answer: {e}")
+                    answer = ANSWER_ERROR_MESSAGE
+                    yield sse_event("token", {"text": answer})
+            else:
+                yield sse_event("token", {"text": answer})
+
+            # Commit the turn to memory only once the full answer is known
+            history.add_messages([HumanMessage(content=user_query), AIMessage(content=answer)])
+            history_manager.fold_in_background(history, f"{user['user_id']}:{session_id}")
+            REQUEST_DURATION.labels(endpoint="chat_stream", query_type=state.get("query_type") or "unknown").observe(
+                time.perf_counter() - started)
+            logger.info(f"Streamed answer for session {session_id} ({state.get('query_type')}).")
+            yield sse_event("done", {"response": answer})
+
+        except Exception as e:
+            logger.error(f"Error during streaming: {e}")
+            yield sse_event("error", {"response": "Sorry, something went wrong on the server. Please try again later."})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Logins and signups get their own pool so they don't compete with chat SQL for connections
+auth_engine = init_auth_engine()
+auth_bp = create_auth_blueprint(auth_engine)
 app.register_blueprint(auth_bp, url_prefix="/auth")
 
+@app.route('/admin/schema/refresh', methods=['POST'])
+@role_required('hr_admin')
+def refresh_schema():
+    """Rebuild the schema snapshot after a migration without restarting the app."""
+    if not schema_snapshot:
+        return jsonify({"error": "Schema snapshot not available"}), 503
+    try:
+        changed = schema_snapshot.refresh()
+        return jsonify({"changed": changed, "version": schema_snapshot.version}), 200
+    except Exception as e:
+        logger.error(f"Schema refresh failed: {e}")
+        return jsonify({"error": "Schema refresh failed"}), 500
+
+@app.route('/admin/policy-index/reload', methods=['POST'])
+@role_required('hr_admin')
+def reload_policy_index():
+    """
+    Load a rebuilt policy index now instead of waiting for the next poll. Only this worker
+    reloads here; the others pick the new generation up on their own poll.
+    """
+    try:
+        reloaded = policy_index.reload(force=request.args.get("force", "false").lower() == "true")
+        return jsonify({"reloaded": reloaded, "generation": policy_index.generation}), 200
+    except Exception as e:
+        logger.error(f"Policy index reload failed: {e}")
+        return jsonify({"error": "Policy index reload failed"}), 500
+
 @app.route('/healthz')
 def healthz():
     return "ok", 200
 
+@app.route('/metrics')
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, mimetype=content_type)
+
 if __name__ == '__main__':
     # app.run(port=5000, debug=False)
     import os
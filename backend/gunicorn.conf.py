@@ -0,0 +1,23 @@
+# Gunicorn settings for the Procfile.
+# SERVER_MODE=sync (default) serves the Flask app with sync workers.
+# SERVER_MODE=async serves asgi_app.py with uvicorn workers, where /chat runs on the event loop.
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERVER_MODE = os.getenv("SERVER_MODE", "sync").lower()
+
+if SERVER_MODE == "async":
+    wsgi_app = "asgi_app:asgi_app"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "flask_server_a:app"
+
+
+def child_exit(server, worker):
+    # Drop a dead worker's live gauges when metrics are aggregated across workers
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,46 @@
+import logging
+import threading
+from typing import Dict
+
+from langchain_groq import ChatGroq
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Hands every pipeline stage the Groq chat model configured for it in
+    `Config.STAGE_MODELS`. Stages configured with the same model share one client.
+    """
+
+    def __init__(self, api_key: str, stage_models: Dict[str, str] = None, callbacks: list = None):
+        """
+        Args:
+            api_key (str): Groq API key.
+            stage_models (dict): Stage name -> model name. Defaults to `Config.STAGE_MODELS`.
+            callbacks (list): Callback handlers attached to every client.
+        """
+        self.api_key = api_key
+        self.stage_models = dict(Config.STAGE_MODELS if stage_models is None else stage_models)
+        self.callbacks = callbacks or []
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, stage: str) -> str:
+        return self.stage_models.get(stage, Config.LLM_MODEL)
+
+    def for_stage(self, stage: str):
+        """Return the chat model client for `stage`, creating it on first use."""
+        model = self.model_for(stage)
+        with self._lock:
+            if model not in self._clients:
+                self._clients[model] = ChatGroq(model=model, api_key=self.api_key, callbacks=self.callbacks)
+                logger.info(f"LLM client for {model} initialized")
+            return self._clients[model]
+
+    def clients(self) -> dict:
+        """Model name -> client, for every client created so far."""
+        with self._lock:
+            return dict(self._clients)
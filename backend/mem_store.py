@@ -1,54 +1,235 @@
 import logging
-from typing import Dict
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional, Sequence
 
 from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
+from langchain_core.messages import BaseMessage, SystemMessage
+from pydantic import PrivateAttr
+
+from config import Config
+from metrics import SESSION_EVICTIONS, SESSION_STORE_BYTES, SESSION_STORE_SESSIONS
+from session_backend import ChatHistoryBackend, WriteBehindWriter
 
 
-# Set up logging for debugging and tracking memory behavior
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO) # Ensure logging is configured for this module too
 
 # ---------------------------------------------------------------------
 # This module handles session-specific chat memory for your chatbot.
-# It provides a function `get_session_history` to return or create
-# memory for a unique session_id. This memory helps your LangChain
-# chatbot maintain contextual conversation for each user.
+# `SessionStore` returns or creates the memory for a unique session_id and
+# keeps the process bounded: at most SESSION_MAX_SESSIONS sessions in LRU
+# order, SESSION_MAX_MESSAGES messages per session, eviction of sessions idle
+# for SESSION_IDLE_TTL_SECONDS, and an estimate of the bytes held, capped at
+# SESSION_STORE_MAX_BYTES.
 #
-# NOTE: Memory is currently in-memory (RAM only), which means all
-# chat history will be lost when the server restarts. In production,
-# this should be replaced with persistent memory (e.g. Redis, Firestore).
+# With a `ChatHistoryBackend` (SESSION_BACKEND=sql) the in-memory histories
+# are only a local read cache: writes go to the backend through a
+# write-behind buffer, and a cached history is reloaded whenever the
+# backend's revision shows another worker wrote to the session. Without
+# one, chat history is lost when the process restarts.
 # ---------------------------------------------------------------------
 
-def get_session_history(session_id: str, app_session_histories: Dict[str, InMemoryChatMessageHistory]) -> BaseChatMessageHistory:
+# Rough per-message cost of the LangChain message object on top of its text
+MESSAGE_OVERHEAD_BYTES = 600
+
+
+def message_bytes(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return len(content.encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+
+
+def cap_messages(messages: List[BaseMessage], max_messages: int) -> List[BaseMessage]:
+    """Keep the conversation summary (a leading SystemMessage) and the newest messages."""
+    if not max_messages or len(messages) <= max_messages:
+        return messages
+    summary = messages[:1] if isinstance(messages[0], SystemMessage) else []
+    keep = max(max_messages - len(summary), 0)
+    return summary + (messages[len(summary):][-keep:] if keep else [])
+
+
+class BoundedChatMessageHistory(InMemoryChatMessageHistory):
+    """
+    In-memory history that keeps only the most recent `max_messages` messages, plus the
+    conversation summary, and reports every change to its store.
     """
-     Retrieve or create a chat message history object for a specific session.
 
-    Args:
-        session_id (str): A unique identifier for the user's session.
-        app_session_histories (Dict[str, InMemoryChatMessageHistory]):
-            A global dictionary storing session-wise memory objects.
+    max_messages: int = 0
+    # Called with (history, "append" | "replace", messages)
+    _on_change: Optional[Callable[["BoundedChatMessageHistory", str, List[BaseMessage]], None]] = \
+        PrivateAttr(default=None)
 
-    Returns:
-        BaseChatMessageHistory: The memory object storing chat history for this session.
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        messages = list(messages)
+        self.messages = cap_messages(self.messages + messages, self.max_messages)
+        self._changed("append", messages)
+
+    def clear(self) -> None:
+        super().clear()
+        self._changed("replace", [])
+
+    def approx_bytes(self) -> int:
+        return sum(message_bytes(m) for m in self.messages)
+
+    def _changed(self, kind: str, messages: List[BaseMessage]) -> None:
+        if self._on_change:
+            self._on_change(self, kind, messages)
+
+
+class SessionStore:
     """
+    LRU map of session key -> chat history with size, idle-time and memory limits,
+    optionally backed by a shared `ChatHistoryBackend`.
+    """
+
+    def __init__(self, max_sessions: int = None, max_messages: int = None, idle_ttl_seconds: int = None,
+                 max_bytes: int = None, backend: ChatHistoryBackend = None, flush_interval_ms: int = None):
+        """
+        Args:
+            max_sessions (int): Sessions kept before the least recently used one is evicted.
+            max_messages (int): Messages kept per session (0 keeps all).
+            idle_ttl_seconds (int): Sessions unused for this long are evicted (0 disables).
+            max_bytes (int): Estimated bytes of all histories before LRU sessions are evicted (0 disables).
+            backend: Shared storage of the histories. The store then acts as a local read cache.
+            flush_interval_ms (int): Delay of the write-behind buffer in front of `backend`.
+        """
+        self.max_sessions = Config.SESSION_MAX_SESSIONS if max_sessions is None else max_sessions
+        self.max_messages = Config.SESSION_MAX_MESSAGES if max_messages is None else max_messages
+        self.idle_ttl_seconds = Config.SESSION_IDLE_TTL_SECONDS if idle_ttl_seconds is None else idle_ttl_seconds
+        self.max_bytes = Config.SESSION_STORE_MAX_BYTES if max_bytes is None else max_bytes
 
-    # If no history exists for this session, initialize a new memory object
-    if session_id not in app_session_histories:
-        app_session_histories[session_id] = InMemoryChatMessageHistory()
-        logger.info(f"Creating new session history for session_id: {session_id}")
-    else:
-        logger.info(f"Retrieving existing session history for session_id: {session_id}")
+        self.backend = backend
+        self._writer = None
+        if backend is not None:
+            self._writer = WriteBehindWriter(
+                backend, Config.SESSION_FLUSH_INTERVAL_MS if flush_interval_ms is None else flush_interval_ms,
+                on_flushed=self._flushed,
+            )
 
-    # Fetch the memory object for this session
-    history = app_session_histories[session_id]
+        # key -> [history, last access time, estimated bytes, backend revision], least recently used first
+        self._sessions: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.RLock()
 
-    # --- NEW DEBUG LOGS ---
-    logger.info(f"DEBUG: mem_store - History for session '{session_id}' contains {len(history.messages)} messages:")
-    # for i, msg in enumerate(history.messages):
-    #     logger.info(f"  [{i}] {msg.type}: {msg.content}")
-    # --- END NEW DEBUG LOGS ---
+    def get(self, session_id: Hashable) -> BoundedChatMessageHistory:
+        """Return the history of a session, creating it if needed, and mark it as recently used."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry:
+                entry[1] = now
+                self._sessions.move_to_end(session_id)
+                if not self.backend or self._writer.has_pending(session_id):
+                    return entry[0]
+                cached_revision = entry[3]
 
-    return history
+        # Backend reads happen outside the lock so a slow database doesn't serialize every request
+        if entry and self.backend.revision(session_id) == cached_revision:
+            return entry[0]
+        messages, revision = self.backend.load(session_id) if self.backend else ([], 0)
 
-# You could add functions here for clearing history, loading/saving from disk/DB, etc.
-# For now, this is all you need for in-memory session management.
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if not entry:
+                history = BoundedChatMessageHistory(max_messages=self.max_messages)
+                history._on_change = lambda h, kind, changed: self._changed(session_id, h, kind, changed)
+                entry = self._sessions[session_id] = [history, now, 0, 0]
+                logger.debug(f"Creating new session history for session_id: {session_id}")
+                while len(self._sessions) > self.max_sessions:
+                    self._evict(next(iter(self._sessions)), "capacity")
+            if self.backend and not self._writer.has_pending(session_id):
+                # Set directly: these messages are already stored and must not be written again
+                entry[0].messages = cap_messages(messages, self.max_messages)
+                entry[3] = revision
+                self._resize(session_id, entry[0])
+            self._update_gauges()
+            return entry[0]
+
+    def flush(self) -> None:
+        """Write buffered history changes to the backend now."""
+        if self._writer:
+            self._writer.flush()
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "messages": sum(len(entry[0].messages) for entry in self._sessions.values()),
+                "approx_bytes": self._total_bytes,
+            }
+
+    def _changed(self, session_id: Hashable, history: BoundedChatMessageHistory, kind: str,
+                 messages: List[BaseMessage]) -> None:
+        if self._writer:
+            self._writer.submit(session_id, kind, messages)
+        self._resize(session_id, history)
+
+    def _flushed(self, session_id: Hashable, revision: int) -> None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            # Only our own write happened since the cached revision; otherwise stay stale and reload
+            if entry and entry[3] == revision - 1:
+                entry[3] = revision
+
+    def _resize(self, session_id: Hashable, history: BoundedChatMessageHistory) -> None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            # A history that was already evicted (but is still used by a request) no longer counts
+            if not entry or entry[0] is not history:
+                return
+            size = history.approx_bytes()
+            self._total_bytes += size - entry[2]
+            entry[2] = size
+            while self.max_bytes and self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+                oldest = next(iter(self._sessions))
+                if oldest == session_id:
+                    break
+                self._evict(oldest, "memory")
+            self._update_gauges()
+
+    def _evict_idle(self, now: float) -> None:
+        if not self.idle_ttl_seconds:
+            return
+        # LRU order: the first entry is the one idle the longest
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if now - entry[1] < self.idle_ttl_seconds:
+                break
+            self._evict(session_id, "idle")
+        self._update_gauges()
+
+    def _evict(self, session_id: Hashable, reason: str) -> None:
+        entry = self._sessions.pop(session_id)
+        self._total_bytes -= entry[2]
+        SESSION_EVICTIONS.labels(reason=reason).inc()
+        logger.debug(f"Evicted session {session_id} ({reason})")
+
+    def _update_gauges(self) -> None:
+        SESSION_STORE_SESSIONS.set(len(self._sessions))
+        SESSION_STORE_BYTES.set(self._total_bytes)
+
+
+def get_session_history(session_id: Hashable, app_session_histories: SessionStore) -> BaseChatMessageHistory:
+    """
+     Retrieve or create a chat message history object for a specific session.
+
+    Args:
+        session_id: A unique identifier for the user's session, e.g. (user_id, session_id).
+        app_session_histories (SessionStore): The app-wide store of session-wise memory objects.
+
+    Returns:
+        BaseChatMessageHistory: The memory object storing chat history for this session.
+    """
+    return app_session_histories.get(session_id)
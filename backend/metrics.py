@@ -0,0 +1,259 @@
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    REGISTRY,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Prometheus metrics for the chat pipeline.
+# Graph nodes are wrapped with `instrument_node`, ChatGroq calls report through
+# `LLMMetricsCallback` (labelled with the query type of the node making the
+# call), and the caches count hits and misses. Everything is
+# exposed in Prometheus text format by the /metrics route. When gunicorn runs
+# several workers, set PROMETHEUS_MULTIPROC_DIR so the route aggregates them.
+# ---------------------------------------------------------------------
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+NODE_DURATION = Histogram(
+    "chat_node_duration_seconds", "Wall time of a LangGraph node",
+    ["node", "query_type"], buckets=LATENCY_BUCKETS,
+)
+NODE_ERRORS = Counter(
+    "chat_node_errors_total", "Graph node runs that raised or reported an error",
+    ["node", "query_type"],
+)
+REQUEST_DURATION = Histogram(
+    "chat_request_duration_seconds", "Wall time of a chat request",
+    ["endpoint", "query_type"], buckets=LATENCY_BUCKETS,
+)
+LLM_DURATION = Histogram(
+    "llm_call_duration_seconds", "Wall time of a chat model call",
+    ["node", "model", "query_type"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported by the chat model",
+    ["node", "model", "query_type", "kind"],
+)
+LLM_ERRORS = Counter(
+    "llm_call_errors_total", "Chat model calls that failed",
+    ["node", "model", "query_type"],
+)
+CACHE_EVENTS = Counter(
+    "cache_events_total", "Cache lookups by result",
+    ["cache", "result"],
+)
+
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Connections of a SQLAlchemy pool by state",
+    ["pool", "state"], multiprocess_mode="livesum",
+)
+DB_POOL_EVENTS = Counter(
+    "db_pool_events_total", "SQLAlchemy pool events (new connections, checkouts, invalidations)",
+    ["pool", "event"],
+)
+
+
+POLICY_INDEX_RELOADS = Counter(
+    "policy_index_reloads_total", "Policy vector store generations loaded", ["result"],
+)
+
+
+SESSION_STORE_SESSIONS = Gauge(
+    "session_store_sessions", "Chat sessions held in memory", multiprocess_mode="livesum",
+)
+SESSION_STORE_BYTES = Gauge(
+    "session_store_bytes", "Estimated bytes of chat history held in memory", multiprocess_mode="livesum",
+)
+SESSION_EVICTIONS = Counter(
+    "session_evictions_total", "Chat sessions evicted from memory", ["reason"],
+)
+SESSION_WRITE_BEHIND_FLUSHES = Counter(
+    "session_write_behind_flushes_total", "Buffered chat history writes applied to the session backend",
+    ["result"],
+)
+
+
+# Query type of the graph node running in this context, for the LLM calls it makes. Nested
+# graphs (the RAG subgraph) whose state has no query type keep the enclosing node's value.
+_node_query_type: ContextVar[str] = ContextVar("node_query_type", default="unknown")
+
+
+def record_cache_event(cache: str, hit: bool) -> None:
+    CACHE_EVENTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def _query_type(state: dict, result: Any = None) -> str:
+    if isinstance(result, dict) and result.get("query_type"):
+        return result["query_type"]
+    return state.get("query_type") or "unknown"
+
+
+def _record_node(node: str, state: dict, result: Any, started: float) -> None:
+    query_type = _query_type(state, result)
+    NODE_DURATION.labels(node=node, query_type=query_type).observe(time.perf_counter() - started)
+    if isinstance(result, dict) and result.get("error"):
+        NODE_ERRORS.labels(node=node, query_type=query_type).inc()
+
+
+def _enter_node(state: dict):
+    query_type = state.get("query_type")
+    return _node_query_type.set(query_type) if query_type else None
+
+
+def _exit_node(token) -> None:
+    if token is not None:
+        _node_query_type.reset(token)
+
+
+def instrument_node(node: str, func):
+    """
+    Wrap a sync or async graph node to record its wall time and errors, and to label the
+    chat model calls it makes with the query type from its state.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(state, *args, **kwargs):
+            started = time.perf_counter()
+            token = _enter_node(state)
+            try:
+                result = await func(state, *args, **kwargs)
+            except Exception:
+                NODE_ERRORS.labels(node=node, query_type=_query_type(state)).inc()
+                raise
+            finally:
+                _exit_node(token)
+            _record_node(node, state, result, started)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state, *args, **kwargs):
+        started = time.perf_counter()
+        token = _enter_node(state)
+        try:
+            result = func(state, *args, **kwargs)
+        except Exception:
+            NODE_ERRORS.labels(node=node, query_type=_query_type(state)).inc()
+            raise
+        finally:
+            _exit_node(token)
+        _record_node(node, state, result, started)
+        return result
+    return wrapper
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Records latency, token usage and errors of every chat model call, labelled
+    with the LangGraph node the call was made from and the query type of the request.
+    """
+
+    def __init__(self):
+        self._runs: Dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, invocation_params=None, **kwargs):
+        metadata = metadata or {}
+        model = (invocation_params or {}).get("model") or (invocation_params or {}).get("model_name") or "unknown"
+        # Calls made outside the graph can label themselves with a "stage" metadata key
+        node = metadata.get("langgraph_node") or metadata.get("stage", "none")
+        # ... and with a "query_type" key; inside the graph it comes from the node's state
+        query_type = metadata.get("query_type") or _node_query_type.get()
+        with self._lock:
+            self._runs[run_id] = (node, model, query_type, time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if not run:
+            return
+        node, model, query_type, started = run
+        LLM_DURATION.labels(node=node, model=model, query_type=query_type).observe(time.perf_counter() - started)
+
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens:
+            LLM_TOKENS.labels(node=node, model=model, query_type=query_type, kind="prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels(node=node, model=model, query_type=query_type,
+                              kind="completion").inc(completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run:
+            LLM_ERRORS.labels(node=run[0], model=run[1], query_type=run[2]).inc()
+
+
+def _token_usage(response: LLMResult):
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    # Streaming responses carry usage on the message instead
+    for generations in response.generations:
+        for generation in generations:
+            usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage_metadata:
+                return usage_metadata.get("input_tokens", 0), usage_metadata.get("output_tokens", 0)
+    return 0, 0
+
+
+def pool_stats(engine) -> Dict[str, int]:
+    pool = engine.pool
+    stats = {}
+    for state, getter in (("checked_out", "checkedout"), ("idle", "checkedin"), ("overflow", "overflow")):
+        if hasattr(pool, getter):
+            stats[state] = getattr(pool, getter)()
+    return stats
+
+
+def instrument_pool(name: str, engine) -> None:
+    """Keep the pool gauges of `engine` current and count its connection events."""
+
+    def update(*args):
+        for state, value in pool_stats(engine).items():
+            DB_POOL_CONNECTIONS.labels(pool=name, state=state).set(max(value, 0))
+
+    def counter(event_name):
+        def listener(*args):
+            DB_POOL_EVENTS.labels(pool=name, event=event_name).inc()
+            update()
+        return listener
+
+    event.listen(engine, "connect", counter("connect"))
+    event.listen(engine, "checkout", counter("checkout"))
+    # Pre-ping failures and errors on stale connections show up as invalidations
+    event.listen(engine, "invalidate", counter("invalidate"))
+    event.listen(engine, "checkin", update)
+    update()
+
+
+def render_metrics():
+    """Return the Prometheus exposition body and content type."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,144 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+from metrics import record_cache_event
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Semantic answer cache for policy questions.
+# Policy answers do not depend on who is asking, so the RAG graph stores each
+# generated answer together with its retrieved chunks, keyed by the embedding
+# of the standalone search query. A later query whose embedding is similar
+# enough is answered from memory without FAISS search or LLM generation.
+# Embeddings of "paternity leave" and "maternity leave" questions are nearly
+# identical, so a hit also needs the same topic words as a cached query.
+# The cache is cleared whenever the policy index version changes.
+# ---------------------------------------------------------------------
+
+# Question phrasing and terms shared by most policy questions; the remaining words name the topic
+_GENERIC_WORDS = frozenset("""
+    a an the and or of to in on for at by with about from into is are was were be been do does did
+    can could should would will may might must i my me we our us you your it its this that these those
+    what which who whom when where why how many much long there any get got have has had tell explain
+    know please allow allowed entitled eligible apply take need want policy policies rule rules
+    company leave leaves day days
+""".split())
+
+
+class SemanticAnswerCache:
+    """
+    Bounded LRU cache of policy answers keyed by normalized query embeddings.
+    """
+
+    def __init__(self, index_version: Callable[[], object] = None, max_size: int = None,
+                 similarity_threshold: float = None):
+        """
+        Args:
+            index_version (Callable[[], object]): Returns the current FAISS index version;
+                the cache is cleared whenever it changes.
+            max_size (int): Maximum number of cached answers.
+            similarity_threshold (float): Minimum cosine similarity for a hit.
+        """
+        self.index_version = index_version or (lambda: None)
+        self.max_size = Config.POLICY_CACHE_SIZE if max_size is None else max_size
+        self.similarity_threshold = (Config.POLICY_CACHE_THRESHOLD
+                                     if similarity_threshold is None else similarity_threshold)
+
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._next_id = 0
+        self._version = self.index_version()
+        self._lock = threading.Lock()
+
+    def lookup(self, query: str, query_vector) -> Optional[dict]:
+        """
+        Return the cached entry (`answer`, `context`, `chunk_ids`) closest to the query vector
+        among those cached under a query with the same topic words, or None when nothing is
+        above the similarity threshold.
+        """
+        vector = _normalize(query_vector)
+        topics = topic_words(query)
+        with self._lock:
+            self._check_version()
+            best_id, best_similarity = None, -1.0
+            for entry_id, entry in self._entries.items():
+                if topics not in entry["topics"]:
+                    continue
+                similarity = float(np.max(entry["vectors"] @ vector))
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None or best_similarity < self.similarity_threshold:
+                self.misses += 1
+                record_cache_event("policy_answer", False)
+                return None
+
+            self.hits += 1
+            record_cache_event("policy_answer", True)
+            self._entries.move_to_end(best_id)
+            entry = self._entries[best_id]
+
+        logger.info(f"Policy answer cache hit (similarity={best_similarity:.3f}).")
+        return {"answer": entry["answer"], "context": entry["context"], "chunk_ids": entry["chunk_ids"]}
+
+    def store(self, queries: List[Tuple[str, object]], answer: str, context: list) -> None:
+        """
+        Cache an answer under one or more (query, vector) pairs (e.g. the rephrased query and,
+        for a first turn, the original question).
+        """
+        vectors = np.stack([_normalize(vector) for _, vector in queries])
+        with self._lock:
+            self._check_version()
+            self._entries[self._next_id] = {
+                "vectors": vectors,
+                "topics": {topic_words(query) for query, _ in queries},
+                "answer": answer,
+                "context": context,
+                "chunk_ids": [getattr(doc, "id", None) for doc in context],
+                "created_at": time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _check_version(self) -> None:
+        """Drop every entry when the policy index has been rebuilt. Caller holds the lock."""
+        version = self.index_version()
+        if version != self._version:
+            logger.info("Policy index changed; clearing policy answer cache.")
+            self._entries.clear()
+            self._version = version
+
+
+def topic_words(text: str) -> frozenset:
+    """Lower-cased words of a query other than generic ones, with a plural "s" stripped."""
+    words = (word for word in re.findall(r"[a-z0-9]+", text.lower())
+             if len(word) > 2 and word not in _GENERIC_WORDS)
+    return frozenset(word[:-1] if word.endswith("s") and len(word) > 3 else word for word in words)
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
@@ -0,0 +1,137 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Local query classifier for the chat graph.
+# Labelled DATABASE / POLICY / HYBRID exemplars are embedded once at startup
+# with the same MiniLM model used for policy retrieval. A question is scored
+# against every exemplar and every label centroid; when the best label does
+# not beat the runner-up by the configured margin, the caller falls back to
+# the LLM classifier.
+# ---------------------------------------------------------------------
+
+QUERY_EXEMPLARS: Dict[str, List[str]] = {
+    "DATABASE": [
+        "How many earned leaves do I have?",
+        "What is my designation?",
+        "Show Neha Reddy's salary slip for June",
+        "How many sick leaves do I have left?",
+        "What is my leave balance?",
+        "Who is my manager?",
+        "Who are my direct reports?",
+        "What is my gross salary?",
+        "What department am I in?",
+        "When did I join the company?",
+        "Show my pending leave requests",
+        "What is Karan's department and designation?",
+        "How many casual leaves has my team taken this year?",
+        "What is my employee code?",
+        "Show my salary breakup for last month",
+    ],
+    "POLICY": [
+        "What is the paternity leave policy?",
+        "Can interns get LTA?",
+        "What are the conditions for getting a bonus?",
+        "What are the working hours?",
+        "How many days of maternity leave does the company give?",
+        "What is the work from home policy?",
+        "How do I apply for reimbursement of travel expenses?",
+        "What is the notice period for resignation?",
+        "What holidays does the company observe?",
+        "What is the dress code?",
+        "How does the performance appraisal process work?",
+        "Is sick leave carried forward to next year?",
+        "What is the policy on overtime pay?",
+    ],
+    "HYBRID": [
+        "Am I eligible for maternity leave?",
+        "Can I take sick leave tomorrow?",
+        "Why didn't Neha Reddy get a bonus this year?",
+        "Can I claim LTA this year?",
+        "Is Neha eligible for paid leaves?",
+        "Am I eligible for a bonus this year?",
+        "Can I carry forward my remaining earned leaves?",
+        "Do I have enough leave to take two weeks off as per policy?",
+        "Am I eligible for work from home given my employment status?",
+        "Can I encash my unused leaves?",
+        "Is my team member eligible for paternity leave?",
+        "Have I completed the probation period required for LTA?",
+    ],
+}
+
+
+class EmbeddingQueryClassifier:
+    """
+    Nearest-neighbour / centroid classifier over embedded exemplar questions.
+    """
+
+    def __init__(self, embedding_model, exemplars: Dict[str, List[str]] = None,
+                 min_margin: float = None, top_k: int = 3):
+        """
+        Args:
+            embedding_model: A LangChain embeddings instance (e.g. HuggingFaceEmbeddings).
+            exemplars (Dict[str, List[str]]): Labelled example questions per query type.
+            min_margin (float): Minimum score gap between the best and second-best label
+                required to trust the local decision.
+            top_k (int): Number of nearest exemplars per label averaged into its score.
+        """
+        self.embedding_model = embedding_model
+        self.exemplars = exemplars or QUERY_EXEMPLARS
+        self.min_margin = Config.QUERY_CLASSIFIER_MIN_MARGIN if min_margin is None else min_margin
+        self.top_k = top_k
+
+        self.labels = list(self.exemplars.keys())
+        texts, label_ids = [], []
+        for label_id, label in enumerate(self.labels):
+            texts.extend(self.exemplars[label])
+            label_ids.extend([label_id] * len(self.exemplars[label]))
+
+        self.exemplar_vectors = _normalize(np.asarray(embedding_model.embed_documents(texts), dtype=np.float32))
+        self.exemplar_labels = np.asarray(label_ids)
+        self.centroids = _normalize(np.stack([
+            self.exemplar_vectors[self.exemplar_labels == label_id].mean(axis=0)
+            for label_id in range(len(self.labels))
+        ]))
+        logger.info(f"Query classifier embedded {len(texts)} exemplars across {len(self.labels)} labels.")
+
+    def score(self, question: str) -> Dict[str, float]:
+        """Return a similarity score per label for the given question."""
+        query_vector = _normalize(np.asarray(self.embedding_model.embed_query(question), dtype=np.float32)[None, :])[0]
+
+        exemplar_sims = self.exemplar_vectors @ query_vector
+        centroid_sims = self.centroids @ query_vector
+
+        scores = {}
+        for label_id, label in enumerate(self.labels):
+            label_sims = exemplar_sims[self.exemplar_labels == label_id]
+            k = min(self.top_k, label_sims.shape[0])
+            nearest = np.partition(label_sims, -k)[-k:].mean()
+            scores[label] = float(0.5 * nearest + 0.5 * centroid_sims[label_id])
+        return scores
+
+    def classify(self, question: str) -> Tuple[Optional[str], float]:
+        """
+        Classify a question locally.
+
+        Returns:
+            Tuple[Optional[str], float]: The predicted label (or None when the margin is
+            below the configured threshold) and the margin between the top two labels.
+        """
+        scores = self.score(question)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        margin = ranked[0][1] - ranked[1][1] if len(ranked) > 1 else ranked[0][1]
+        if margin < self.min_margin:
+            return None, margin
+        return ranked[0][0], margin
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -1,14 +1,19 @@
+import asyncio
 import os
 from dotenv import load_dotenv
 import logging
-from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import PromptTemplate
-from langchain_huggingface import HuggingFaceEmbeddings
 from typing_extensions import TypedDict, List
 from langchain_core.documents import Document
-from langgraph.graph import StateGraph, START
+from langgraph.graph import StateGraph, START, END
 from langchain.chat_models import init_chat_model
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
+from chat_history import format_chat_history_for_llm
+from embedding_cache import CachedQueryEmbeddings
+from embedding_pipeline import create_embeddings
+from vector_index import VectorStoreHandle
+from metrics import instrument_node
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,47 +21,51 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 
-def format_chat_history_for_llm(chat_history: List[BaseMessage]) -> str: # Changed type hint
-    """
-    Converts a list of Langchain BaseMessage objects into a single, readable string for LLM prompts.
-    """
-    formatted_history = []
-    for message in chat_history:
-        # Now accessing .type and .content attributes directly from BaseMessage objects
-        if isinstance(message, HumanMessage):
-            role = "User"
-        elif isinstance(message, AIMessage):
-            role = "Assistant"
-        else:
-            role = message.type # Fallback for other message types if they appear
-
-        formatted_history.append(f"{role}: {message.content}")
-    return "\n".join(formatted_history)
+# Robust path: always relative to this script's location
+POLICY_INDEX_FOLDER = os.path.join(os.path.dirname(__file__), "index_folder")
 
 
+rephrase_prompt = PromptTemplate.from_template("""
+        Given the following conversation history and a follow-up question, rephrase the follow-up question
+        to be a standalone, clear search query for a policy document.
+        Focus on extracting the core subject of the query.
+        
+        Conversation History:
+        {chat_history}
+        
+        Follow-up Question:
+        {question}
+        
+        Rephrased Search Query:
+        """)
 
 
-def build_rag_graph(rag_llm):
+def build_rag_graph(rag_llm, embedding_model=None, answer_cache=None, rephrase_llm=None, index_handle=None):
     """
     Builds and compiles the RAG LangGraph.
     Args:
         rag_llm: The LLM instance to be used for RAG operations (e.g., LLaMA 3.3 70B).
+        embedding_model: Optional shared embeddings instance, ideally a `CachedQueryEmbeddings`.
+            A MiniLM model with a query embedding cache is loaded when omitted.
+        answer_cache: Optional `SemanticAnswerCache`. Cached answers skip search and generation.
+        rephrase_llm: Optional (typically smaller) LLM for rewriting follow-ups into search queries.
+            Defaults to `rag_llm`.
+        index_handle: Optional `VectorStoreHandle` shared with the caller, e.g. to read its version.
+            One watching POLICY_INDEX_FOLDER is created when omitted.
     """
     if not rag_llm:
         logger.error("No LLM instance provided to build_rag_graph. RAG functionality will be limited.")
         return None  # Return None if LLM is not available
     # embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    try:
-        # vector_store = FAISS.load_local("synthetic_hr_policy", embedding_model, allow_dangerous_deserialization=True)
-        # logger.info("FAISS vector store loaded successfully.")
-        # Robust path: always relative to this script's location
-        policy_folder = os.path.join(os.path.dirname(__file__), "index_folder")
-        vector_store = FAISS.load_local(policy_folder, embedding_model, allow_dangerous_deserialization=True)
-        logger.info("FAISS vector store loaded successfully.")
-    except Exception as e:
-        logger.error(f"Failed to load FAISS vector store: {e}. RAG retrieval will not work.")
-        vector_store = None
+    rephrase_llm = rephrase_llm or rag_llm
+    if embedding_model is None:
+        embedding_model = CachedQueryEmbeddings(create_embeddings())
+    # Flat, HNSW or IVF-PQ as built by rag_index.py, swapped for a new generation
+    # when the index is rebuilt
+    if index_handle is None:
+        index_handle = VectorStoreHandle(POLICY_INDEX_FOLDER, embedding_model)
+    if index_handle.current is None:
+        logger.error("FAISS vector store not loaded. RAG retrieval will not work until an index is built.")
 
     rag_prompt = PromptTemplate.from_template("""
     You are an HR assistant. Use the following policy documents and the conversation history to answer the question.
@@ -75,39 +84,81 @@ def build_rag_graph(rag_llm):
     class RAGState(TypedDict):
         question: str
         chat_history: List[BaseMessage]
+        formatted_history: str
+        search_query: str
+        cache_keys: list
         context: List[Document]
         answer: str
+        cache_hit: bool
         error: str
 
-    def retrieve(state: RAGState):
-        if not vector_store:
+    def rendered_history(state: RAGState) -> str:
+        # Callers may pass the history already rendered within the prompt token budget
+        if state.get("formatted_history") is not None:
+            return state["formatted_history"]
+        return format_chat_history_for_llm(state["chat_history"])
+
+    def check_retrieval_ready():
+        if not index_handle.current:
             logger.error("Vector store not available for retrieval.")
             return {"context": [], "error": "RAG retrieval system not available."}
         if not rag_llm:
             logger.error("LLM not available for query rephrasing in retrieval.")
             return {"context": [], "error": "LLM not available for RAG query rephrasing."}
-
+        return None
+
+    def lookup_first_turn(state: RAGState):
+        """
+        A first-turn question is already standalone: try the answer cache before rephrasing.
+        Returns the (query, vector) pairs computed so far and the cached node update on a hit.
+        """
+        cache_keys = []
+        if answer_cache and not state["chat_history"]:
+            question_vector = embedding_model.embed_query(state["question"])
+            cache_keys.append((state["question"], question_vector))
+            cached = answer_cache.lookup(state["question"], question_vector)
+            if cached:
+                return cache_keys, {"context": cached["context"], "answer": cached["answer"], "cache_hit": True}
+        return cache_keys, None
+
+    def build_rephrase_prompt(state: RAGState):
         # FIX: Format the chat_history for the rephrasing LLM prompt
-        formatted_chat_history = format_chat_history_for_llm(state["chat_history"])
+        formatted_chat_history = rendered_history(state)
+        return rephrase_prompt.invoke({"question": state["question"], "chat_history": formatted_chat_history})
 
-        rephrase_prompt = PromptTemplate.from_template("""
-        Given the following conversation history and a follow-up question, rephrase the follow-up question
-        to be a standalone, clear search query for a policy document.
-        Focus on extracting the core subject of the query.
-        
-        Conversation History:
-        {chat_history}
-        
-        Follow-up Question:
-        {question}
-        
-        Rephrased Search Query:
-        """)
+    def search(search_query: str, cache_keys: list):
+        try:
+            # Embed once (repeated queries hit the query embedding cache) and reuse the vector
+            # for both the answer cache lookup and the FAISS search
+            search_vector = embedding_model.embed_query(search_query)
+            if answer_cache:
+                cached = answer_cache.lookup(search_query, search_vector)
+                if cached:
+                    return {"context": cached["context"], "answer": cached["answer"], "cache_hit": True}
+            # Read the handle once: a reload swapping stores mid-search doesn't affect this call
+            vector_store = index_handle.current
+            retrieved_docs = vector_store.similarity_search_by_vector(search_vector, k=5)
+            return {
+                "context": retrieved_docs,
+                "search_query": search_query,
+                "cache_keys": cache_keys + [(search_query, search_vector)],
+                "cache_hit": False,
+            }
+        except Exception as e:
+            logger.error(f"Error during vector store similarity search: {e}")
+            return {"context": [], "error": f"RAG retrieval failed: {str(e)}"}
+
+    def retrieve(state: RAGState):
+        not_ready = check_retrieval_ready()
+        if not_ready:
+            return not_ready
+
+        cache_keys, cached = lookup_first_turn(state)
+        if cached:
+            return cached
 
         try:
-            rephrased_query_response = rag_llm.invoke(
-                rephrase_prompt.invoke({"question": state["question"], "chat_history": formatted_chat_history})
-            )
+            rephrased_query_response = rephrase_llm.invoke(build_rephrase_prompt(state))
             search_query = rephrased_query_response.content.strip()
             logger.info(f"Original RAG question: '{state['question']}'")
             logger.info(f"Rephrased RAG search query: '{search_query}'")
@@ -115,50 +166,94 @@ def build_rag_graph(rag_llm):
             logger.error(f"Error rephrasing RAG query: {e}. Using original question for search.")
             search_query = state["question"]  # Fallback to original question
 
-        try:
-            retrieved_docs = vector_store.similarity_search(search_query, k=5)
-            return {"context": retrieved_docs}
-        except Exception as e:
-            logger.error(f"Error during vector store similarity search: {e}")
-            return {"context": [], "error": f"RAG retrieval failed: {str(e)}"}
+        return search(search_query, cache_keys)
+
+    async def aretrieve(state: RAGState):
+        not_ready = check_retrieval_ready()
+        if not_ready:
+            return not_ready
 
+        # Embedding and FAISS search are CPU-bound; keep them off the event loop
+        cache_keys, cached = await asyncio.to_thread(lookup_first_turn, state)
+        if cached:
+            return cached
 
+        try:
+            rephrased_query_response = await rephrase_llm.ainvoke(build_rephrase_prompt(state))
+            search_query = rephrased_query_response.content.strip()
+            logger.info(f"Original RAG question: '{state['question']}'")
+            logger.info(f"Rephrased RAG search query: '{search_query}'")
+        except Exception as e:
+            logger.error(f"Error rephrasing RAG query: {e}. Using original question for search.")
+            search_query = state["question"]  # Fallback to original question
 
+        return await asyncio.to_thread(search, search_query, cache_keys)
 
-    def generate(state: RAGState):
+    def build_generate_prompt(state: RAGState):
+        """Returns ({"answer": ...}, None) when generation can't run, otherwise (None, prompt)."""
         if not rag_llm:
             logger.error("LLM not available for RAG answer generation.")
-            return {"answer": "", "error": "LLM not available for RAG answer generation."}
+            return {"answer": "", "error": "LLM not available for RAG answer generation."}, None
 
         if not state["context"]:
             logger.warning("No context retrieved for RAG generation.")
             return {"answer": "I couldn't find relevant policy information for your question.",
-                    "error": "No context for RAG."}
+                    "error": "No context for RAG."}, None
 
         context = "\n\n".join(doc.page_content for doc in state["context"])
 
         # FIX: Format the chat_history for the final RAG answer generation prompt
-        formatted_chat_history = format_chat_history_for_llm(state["chat_history"])
+        formatted_chat_history = rendered_history(state)
 
-        prompt = rag_prompt.invoke({
+        return None, rag_prompt.invoke({
             "context": context,
             "question": state["question"],
             "chat_history": formatted_chat_history  # Pass chat_history here
         })
 
+    def store_answer(state: RAGState, answer: str):
+        # Only first-turn answers are cached: follow-up answers may lean on the conversation
+        if answer_cache and state.get("cache_keys") and not state["chat_history"]:
+            answer_cache.store(state["cache_keys"], answer, state["context"])
+        return {"answer": answer}
+
+    def generate(state: RAGState):
+        result, prompt = build_generate_prompt(state)
+        if result:
+            return result
+
         try:
             response = rag_llm.invoke(prompt)
-            return {"answer": response.content}
+            return store_answer(state, response.content)
+        except Exception as e:
+            logger.error(f"Error generating RAG answer: {e}")
+            return {"answer": "", "error": f"RAG answer generation failed: {str(e)}"}
+
+    async def agenerate(state: RAGState):
+        result, prompt = build_generate_prompt(state)
+        if result:
+            return result
+
+        try:
+            response = await rag_llm.ainvoke(prompt)
+            return store_answer(state, response.content)
         except Exception as e:
             logger.error(f"Error generating RAG answer: {e}")
             return {"answer": "", "error": f"RAG answer generation failed: {str(e)}"}
 
     graph = StateGraph(RAGState)
-    graph.add_node("retrieve", retrieve)
-    graph.add_node("generate", generate)
+    # Sync functions serve `invoke`, async twins serve `ainvoke`
+    graph.add_node("retrieve", RunnableLambda(instrument_node("rag_retrieve", retrieve),
+                                              afunc=instrument_node("rag_retrieve", aretrieve)))
+    graph.add_node("generate", RunnableLambda(instrument_node("rag_generate", generate),
+                                              afunc=instrument_node("rag_generate", agenerate)))
+
+    def route_after_retrieve(state: RAGState) -> str:
+        # Cache hits already carry the answer
+        return END if state.get("cache_hit") else "generate"
 
     graph.add_edge(START, "retrieve")
-    graph.add_edge("retrieve", "generate")
+    graph.add_conditional_edges("retrieve", route_after_retrieve, ["generate", END])
     return graph.compile()
 
 
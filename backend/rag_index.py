@@ -1,30 +1,221 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Dict, List
+
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import TextLoader
+from langchain_core.documents import Document
 
+from config import Config
+from embedding_pipeline import EmbeddingPipeline, create_embeddings
+from vector_index import choose_index_type, write_search_index
 
-def build_vectorstore():
-    # 1. loading the document
-    loader = TextLoader("backend/synthetic_hr_policy.txt")
-    docs = loader.load()
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-    #2. splitting the text into chunks
-    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
-    chunks = splitter.split_documents(docs)
+# ---------------------------------------------------------------------
+# Incremental builder of the policy FAISS index.
+# Every document under POLICY_DOCS_DIR is split into chunks and each chunk
+# is identified by the hash of its source path and text. The manifest saved
+# next to the index maps chunk hash -> vector id, so a rebuild only embeds
+# chunks that are new or changed and deletes the vectors of chunks that no
+# longer exist. Changing the embedding model, its backend or the chunking
+# settings invalidates every vector and triggers a full rebuild.
+# The flat index is exact and supports deletes; the HNSW/IVF-PQ search index
+# served to the app is rebuilt from its vectors on every save (vector_index).
+# ---------------------------------------------------------------------
 
-    # 3. Embed and store in FAISS
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vectorstore = FAISS.from_documents(chunks, embedding_model)
-    print("Vector store created successfully!")
+INDEX_FOLDER = os.path.join(os.path.dirname(__file__), "index_folder")
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
 
-    #5. saving the vector store locally
-    vectorstore.save_local("index_folder")
-    print("✅ Vector store saved!")
+TEXT_EXTENSIONS = (".txt", ".md")
+
+
+def load_documents(docs_dir: str) -> List[Document]:
+    """
+    Load every policy document under `docs_dir`. Text and Markdown are always supported;
+    PDFs are loaded when `pypdf` is installed.
+    """
+    documents = []
+    for root, dirs, files in os.walk(docs_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            source = os.path.relpath(path, docs_dir).replace(os.sep, "/")
+            extension = os.path.splitext(name)[1].lower()
+            if extension in TEXT_EXTENSIONS:
+                loaded = TextLoader(path, encoding="utf-8").load()
+            elif extension == ".pdf":
+                try:
+                    from langchain_community.document_loaders import PyPDFLoader
+                    loaded = PyPDFLoader(path).load()
+                except ImportError:
+                    logger.warning(f"Skipping {source}: install pypdf to index PDF documents.")
+                    continue
+            else:
+                continue
+            for document in loaded:
+                document.metadata["source"] = source
+            documents.extend(loaded)
+    return documents
+
+
+def chunk_hash(chunk: Document) -> str:
+    content = f"{chunk.metadata.get('source', '')}\0{chunk.page_content}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def split_documents(documents: List[Document], chunk_size: int, chunk_overlap: int) -> Dict[str, Document]:
+    """Split documents into chunks keyed by chunk hash. Repeated chunks of one document are kept once."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = {}
+    for chunk in splitter.split_documents(documents):
+        key = chunk_hash(chunk)
+        chunk.metadata["chunk_hash"] = key
+        chunks.setdefault(key, chunk)
+    return chunks
+
+
+def index_settings(backend: str, chunk_size: int, chunk_overlap: int) -> dict:
+    return {
+        "version": MANIFEST_VERSION,
+        "embedding_model": Config.EMBEDDING_MODEL,
+        "embedding_backend": backend,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+    }
+
+
+def load_manifest(index_folder: str) -> dict:
+    try:
+        with open(os.path.join(index_folder, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_generation(manifest: dict) -> str:
+    """Build id of an index: its UTC build time plus a hash of its settings and chunks."""
+    content = json.dumps({key: value for key, value in manifest.items() if key != "generation"}, sort_keys=True)
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+    return f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{digest}"
 
-if __name__ == "__main__":
-    build_vectorstore()
 
+def save_index(vectorstore: FAISS, manifest: dict, index_folder: str, index_type: str = None) -> None:
+    """
+    Write the index, its search index and its manifest to a sibling folder and swap it in,
+    so a reader never sees an index from one build next to a manifest from another.
+    """
+    staging = f"{index_folder}.tmp"
+    previous = f"{index_folder}.old"
+    shutil.rmtree(staging, ignore_errors=True)
+    vectorstore.save_local(staging)
+    manifest["generation"] = build_generation(manifest)
+    manifest["index_type"] = write_search_index(vectorstore, staging, index_type, manifest["generation"])
+    with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
 
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(index_folder):
+        os.rename(index_folder, previous)
+    os.rename(staging, index_folder)
+    shutil.rmtree(previous, ignore_errors=True)
 
 
+def build_vectorstore(docs_dir: str = None, index_folder: str = INDEX_FOLDER, full: bool = False,
+                      pipeline: EmbeddingPipeline = None, index_type: str = None) -> dict:
+    """
+    Bring the FAISS index in `index_folder` up to date with the documents in `docs_dir`.
+
+    Args:
+        docs_dir (str): Directory of policy documents. Defaults to Config.POLICY_DOCS_DIR.
+        index_folder (str): Where the index and its manifest are stored.
+        full (bool): Ignore the existing index and embed every chunk again.
+        pipeline (EmbeddingPipeline): Bulk embedder of the changed chunks. Configured from Config when omitted.
+        index_type (str): "auto", "flat", "hnsw" or "ivfpq". Defaults to Config.POLICY_INDEX_TYPE.
+
+    Returns:
+        dict: Counts of chunks added, removed and unchanged.
+    """
+    docs_dir = docs_dir or Config.POLICY_DOCS_DIR
+    chunk_size, chunk_overlap = Config.POLICY_CHUNK_SIZE, Config.POLICY_CHUNK_OVERLAP
+    pipeline = pipeline or EmbeddingPipeline()
+    settings = index_settings(pipeline.backend, chunk_size, chunk_overlap)
+
+    # 1. loading and splitting the documents
+    documents = load_documents(docs_dir)
+    if not documents:
+        raise ValueError(f"No policy documents found in {docs_dir}")
+    chunks = split_documents(documents, chunk_size, chunk_overlap)
+    logger.info(f"Loaded {len(documents)} documents from {docs_dir} into {len(chunks)} chunks.")
+
+    # Query-time embeddings stored with the index; bulk embedding goes through the pipeline
+    embedding_model = create_embeddings(pipeline.backend)
+
+    # 2. comparing against the previous build
+    manifest = {} if full else load_manifest(index_folder)
+    vectorstore = None
+    known: Dict[str, dict] = {}
+    if manifest and all(manifest.get(key) == value for key, value in settings.items()):
+        try:
+            vectorstore = FAISS.load_local(index_folder, embedding_model, allow_dangerous_deserialization=True)
+            known = manifest.get("chunks", {})
+        except Exception as e:
+            logger.warning(f"Could not load the existing index ({e}); rebuilding from scratch.")
+    elif manifest:
+        logger.info("Embedding model, backend or chunking settings changed; rebuilding from scratch.")
+
+    added = [key for key in chunks if key not in known]
+    removed = [key for key in known if key not in chunks]
+
+    # 3. deleting stale vectors and embedding only new chunks
+    if vectorstore is not None and removed:
+        vectorstore.delete([known[key]["id"] for key in removed])
+    if added:
+        texts = [chunks[key].page_content for key in added]
+        text_embeddings = list(zip(texts, pipeline.embed(texts)))
+        metadatas = [chunks[key].metadata for key in added]
+        if vectorstore is None:
+            vectorstore = FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas, ids=added)
+        else:
+            vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=added)
+
+    stats = {"added": len(added), "removed": len(removed), "unchanged": len(chunks) - len(added)}
+    index_type = choose_index_type(len(chunks), index_type)
+    if not added and not removed and manifest.get("index_type") == index_type:
+        logger.info(f"Policy index is up to date ({len(chunks)} chunks).")
+        return stats
+
+    # 4. saving the vector store and manifest locally
+    manifest = dict(settings, chunks={
+        key: {"id": key, "source": chunk.metadata["source"]} for key, chunk in chunks.items()
+    })
+    save_index(vectorstore, manifest, index_folder, index_type)
+    logger.info(f"Policy index saved to {index_folder}: {stats['added']} chunks embedded, "
+                f"{stats['removed']} removed, {stats['unchanged']} unchanged.")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or incrementally update the policy FAISS index.")
+    parser.add_argument("--docs", default=None, help="Directory of policy documents (default: POLICY_DOCS_DIR)")
+    parser.add_argument("--index", default=INDEX_FOLDER, help="Index folder to update")
+    parser.add_argument("--full", action="store_true", help="Re-embed every chunk instead of updating")
+    parser.add_argument("--backend", default=None, help="torch, onnx or onnx-int8 (default: EMBEDDING_BACKEND)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Texts per batch (default: EMBEDDING_BATCH_SIZE)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Encoding processes, 0 for all cores (default: EMBEDDING_PROCESSES)")
+    parser.add_argument("--index-type", default=None,
+                        help="auto, flat, hnsw or ivfpq (default: POLICY_INDEX_TYPE)")
+    args = parser.parse_args()
+
+    embedder = EmbeddingPipeline(args.backend, batch_size=args.batch_size, processes=args.processes)
+    result = build_vectorstore(args.docs, args.index, full=args.full, pipeline=embedder, index_type=args.index_type)
+    print(f"✅ Vector store updated: {result}")
@@ -0,0 +1,312 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import Column, MetaData, Table, select
+from sqlalchemy.schema import CreateTable
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# In-memory schema snapshot for the SQL generation prompts.
+# The snapshot is reflected from MySQL once at startup, refreshed in the
+# background after SCHEMA_CACHE_TTL_SECONDS or on an explicit admin trigger,
+# and pre-rendered per role so prompts never mention tables or columns the
+# role may never query.
+# ---------------------------------------------------------------------
+
+# Tables/columns a role may never see in a prompt, regardless of whose data is requested.
+# "*" hides the whole table.
+ROLE_HIDDEN_SCHEMA: Dict[str, Dict[str, object]] = {
+    "employee": {"users": "*", "chat_sessions": "*", "chat_messages": "*"},
+    "manager": {"users": "*", "chat_sessions": "*", "chat_messages": "*"},
+    "hr_admin": {"users": ["password_hash"], "chat_sessions": "*", "chat_messages": "*"},
+}
+
+DEFAULT_ROLE = "employee"
+
+# Short descriptions embedded alongside column names when scoring tables against a question.
+TABLE_DESCRIPTIONS: Dict[str, str] = {
+    "employees": "employee personal and job details, name, manager, supervisor, reporting structure, "
+                 "hire date, tenure, employment status, gender, contact information",
+    "departments": "department names and department heads",
+    "designations": "job titles, designations and grades",
+    "leave_balances": "remaining leave balance per leave type such as sick, casual, earned, maternity",
+    "leave_requests": "leave applications, requested dates, approval status of time off",
+    "salary_summary": "monthly salary slip, gross pay, net pay, deductions, bonus",
+    "salary_components": "salary breakup components such as basic, HRA, allowances, LTA",
+    "users": "login accounts of chatbot users",
+}
+
+
+class SchemaSnapshot:
+    """
+    Role-scoped, TTL-refreshed copy of the database schema and sample rows.
+    """
+
+    def __init__(self, db, ttl_seconds: int = None, sample_rows: int = None):
+        """
+        Args:
+            db: The LangChain SQLDatabase returned by `db.init_db`.
+            ttl_seconds (int): Age after which the snapshot is refreshed in the background.
+            sample_rows (int): Number of sample rows rendered per table.
+        """
+        self.db = db
+        self.ttl_seconds = Config.SCHEMA_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.sample_rows = Config.SCHEMA_SAMPLE_ROWS if sample_rows is None else sample_rows
+
+        self.version = 0
+        self.fingerprint = ""
+        self.built_at = 0.0
+        self.tables: Dict[str, dict] = {}
+        self._table_info: Dict[str, str] = {}
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """
+        Reflect the schema and rebuild every role variant.
+
+        Returns:
+            bool: True if the schema changed since the previous snapshot.
+        """
+        tables = self._reflect()
+        table_info = {role: self._render(tables, role) for role in ROLE_HIDDEN_SCHEMA}
+        fingerprint = hashlib.sha256(table_info["hr_admin"].encode("utf-8")).hexdigest()
+
+        with self._lock:
+            changed = fingerprint != self.fingerprint
+            self.tables = tables
+            self._table_info = table_info
+            self.built_at = time.monotonic()
+            if changed:
+                self.fingerprint = fingerprint
+                self.version += 1
+        logger.info(f"Schema snapshot refreshed: {len(tables)} tables, version {self.version}.")
+        return changed
+
+    def get_table_info(self, role: str) -> str:
+        """Return the pre-rendered schema for a role, scheduling a refresh when the TTL has expired."""
+        self.refresh_if_stale()
+        return self._table_info.get(role, self._table_info[DEFAULT_ROLE])
+
+    def visible_columns(self, table_name: str, role: str) -> List[str]:
+        """Return the columns of a table the role may see (empty if the table is hidden)."""
+        table = self.tables.get(table_name)
+        if not table:
+            return []
+        hidden = ROLE_HIDDEN_SCHEMA.get(role, ROLE_HIDDEN_SCHEMA[DEFAULT_ROLE]).get(table_name)
+        if hidden == "*":
+            return []
+        return [c.name for c in table["table"].columns if not hidden or c.name not in hidden]
+
+    def refresh_if_stale(self) -> None:
+        """Start a background refresh when the TTL has expired; the current snapshot keeps being served."""
+        if not self.ttl_seconds or time.monotonic() - self.built_at < self.ttl_seconds:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Background schema refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="schema-refresh", daemon=True).start()
+
+    def _reflect(self) -> Dict[str, dict]:
+        metadata = MetaData()
+        names = list(self.db.get_usable_table_names())
+        metadata.reflect(bind=self.db._engine, only=names, schema=self.db._schema)
+
+        tables = {}
+        with self.db._engine.connect() as connection:
+            for table in metadata.sorted_tables:
+                rows = []
+                if self.sample_rows:
+                    try:
+                        rows = [tuple(row) for row in connection.execute(select(table).limit(self.sample_rows))]
+                    except Exception as e:
+                        logger.warning(f"Could not fetch sample rows for {table.name}: {e}")
+                tables[table.name] = {"table": table, "sample_rows": rows}
+        return tables
+
+    def _render(self, tables: Dict[str, dict], role: str) -> str:
+        hidden_schema = ROLE_HIDDEN_SCHEMA.get(role, ROLE_HIDDEN_SCHEMA[DEFAULT_ROLE])
+        return "\n\n".join(
+            render_table(entry["table"], entry["sample_rows"], self.db._engine, hidden_schema.get(name))
+            for name, entry in tables.items()
+            if hidden_schema.get(name) != "*"
+        )
+
+
+def render_table(table: Table, sample_rows: list, engine, hidden_columns: Optional[List[str]] = None) -> str:
+    """
+    Render a table in the same CREATE TABLE + sample rows layout as `SQLDatabase.get_table_info`,
+    leaving out hidden columns. Foreign keys are listed in a trailing comment so the copy
+    does not need the referenced tables.
+    """
+    hidden_columns = set(hidden_columns or [])
+    visible = [c for c in table.columns if c.name not in hidden_columns]
+
+    copy = Table(table.name, MetaData(), *[
+        Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in visible
+    ])
+    create_table = str(CreateTable(copy).compile(engine)).rstrip()
+
+    foreign_keys = [
+        f"{c.name} -> {fk.target_fullname}" for c in visible for fk in c.foreign_keys
+    ]
+    if foreign_keys:
+        create_table += "\n/* Foreign keys: " + ", ".join(foreign_keys) + " */"
+
+    if not sample_rows:
+        return create_table
+
+    indexes = [i for i, c in enumerate(table.columns) if c.name not in hidden_columns]
+    rows = "\n".join(
+        "\t".join(str(row[i])[:100] for i in indexes) for row in sample_rows
+    )
+    return (
+        f"{create_table}\n\n/*\n{len(sample_rows)} rows from {table.name} table:\n"
+        + "\t".join(c.name for c in visible) + f"\n{rows}\n*/"
+    )
+
+
+class SchemaSelector:
+    """
+    Picks the tables relevant to a question and renders them compactly.
+    Tables are scored by cosine similarity between the question and an embedded
+    table description, plus a lexical bonus for table/column names mentioned in
+    the question. The top tables are kept together with the tables their foreign
+    keys point to, so the model can still write the joins.
+    """
+
+    def __init__(self, snapshot: SchemaSnapshot, embedding_model, top_k: int = None,
+                 include_sample_rows: bool = None, lexical_weight: float = 0.1):
+        """
+        Args:
+            snapshot (SchemaSnapshot): The schema snapshot to select from.
+            embedding_model: A LangChain embeddings instance (e.g. HuggingFaceEmbeddings).
+            top_k (int): Number of best-scoring tables to keep before adding join partners.
+            include_sample_rows (bool): Whether to append sample rows to the compact rendering.
+            lexical_weight (float): Bonus per table/column name token found in the question.
+        """
+        self.snapshot = snapshot
+        self.embedding_model = embedding_model
+        self.top_k = Config.SCHEMA_TOP_K_TABLES if top_k is None else top_k
+        self.include_sample_rows = Config.SCHEMA_COMPACT_SAMPLE_ROWS if include_sample_rows is None else include_sample_rows
+        self.lexical_weight = lexical_weight
+
+        self._version = None
+        self._names: List[str] = []
+        self._vectors = None
+        self._lock = threading.Lock()
+
+    def get_table_info(self, question: str, role: str) -> str:
+        """Return the compact schema for the tables relevant to the question."""
+        names = self.select_tables(question, role)
+        return "\n".join(self._render_compact(name, role) for name in names)
+
+    def select_tables(self, question: str, role: str) -> List[str]:
+        """Return the names of the selected tables, best match first, followed by join partners."""
+        self.snapshot.refresh_if_stale()
+        names, vectors = self._embedded_tables()
+        visible = [i for i, name in enumerate(names) if self.snapshot.visible_columns(name, role)]
+        if not visible:
+            return []
+
+        query_vector = np.asarray(self.embedding_model.embed_query(question), dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        question_tokens = _tokens(question)
+
+        scores = {}
+        for i in visible:
+            name = names[i]
+            lexical = len(question_tokens & _tokens(name)) * 2
+            lexical += len(question_tokens & set().union(
+                *(_tokens(c) for c in self.snapshot.visible_columns(name, role))))
+            scores[name] = float(vectors[i] @ query_vector) + self.lexical_weight * lexical
+
+        selected = sorted(scores, key=scores.get, reverse=True)[:self.top_k]
+        for name in list(selected):
+            for partner in self._join_partners(name, role):
+                if partner in scores and partner not in selected:
+                    selected.append(partner)
+        logger.info(f"Schema selection kept tables: {selected}")
+        return selected
+
+    def _embedded_tables(self):
+        with self._lock:
+            if self._version != self.snapshot.version:
+                names = list(self.snapshot.tables.keys())
+                descriptions = [self._describe(name) for name in names]
+                vectors = np.asarray(self.embedding_model.embed_documents(descriptions), dtype=np.float32)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                self._names, self._vectors = names, vectors / norms
+                self._version = self.snapshot.version
+            return self._names, self._vectors
+
+    def _describe(self, name: str) -> str:
+        table = self.snapshot.tables[name]["table"]
+        columns = ", ".join(c.name.replace("_", " ") for c in table.columns)
+        description = TABLE_DESCRIPTIONS.get(name, name.replace("_", " "))
+        return f"{name.replace('_', ' ')}: {description}. Columns: {columns}"
+
+    def _join_partners(self, name: str, role: str) -> List[str]:
+        table = self.snapshot.tables[name]["table"]
+        visible = set(self.snapshot.visible_columns(name, role))
+        return [
+            fk.column.table.name for c in table.columns if c.name in visible for fk in c.foreign_keys
+            if fk.column.table.name != name
+        ]
+
+    def _render_compact(self, name: str, role: str) -> str:
+        entry = self.snapshot.tables[name]
+        table = entry["table"]
+        engine = self.snapshot.db._engine
+        visible = self.snapshot.visible_columns(name, role)
+
+        columns = []
+        for c in table.columns:
+            if c.name not in visible:
+                continue
+            try:
+                column_type = c.type.compile(dialect=engine.dialect)
+            except Exception:
+                column_type = type(c.type).__name__
+            column = f"{c.name} {column_type}"
+            if c.primary_key:
+                column += " PK"
+            for fk in c.foreign_keys:
+                column += f" FK->{fk.target_fullname}"
+            columns.append(column)
+        rendered = f"{name}({', '.join(columns)})"
+
+        if self.include_sample_rows and entry["sample_rows"]:
+            indexes = [i for i, c in enumerate(table.columns) if c.name in visible]
+            rendered += "".join(
+                "\n  e.g. (" + ", ".join(str(row[i])[:40] for i in indexes) + ")"
+                for row in entry["sample_rows"]
+            )
+        return rendered
+
+
+def _tokens(text: str) -> set:
+    """Lower-cased word tokens with a trailing plural 's' removed, for lexical matching."""
+    words = re.findall(r"[a-z]+", text.lower().replace("_", " "))
+    return {w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if len(w) > 2}
@@ -0,0 +1,206 @@
+import atexit
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, Text, delete, insert, select, update,
+)
+from sqlalchemy.dialects import mysql
+from sqlalchemy.exc import IntegrityError
+
+from metrics import SESSION_WRITE_BEHIND_FLUSHES
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Shared persistence for chat session history, so any gunicorn worker or
+# instance can serve the next turn of a conversation.
+# Histories are keyed by (user_id, session_id). Writes are buffered and
+# flushed in the background by `WriteBehindWriter`; every flush bumps a
+# per-session revision, which lets a worker's local copy (see mem_store)
+# detect that another worker has written to the session since.
+# ---------------------------------------------------------------------
+
+SessionKey = Tuple[str, str]
+
+# ("append", messages) adds to the history; ("replace", messages) overwrites it
+Operation = Tuple[str, List[BaseMessage]]
+
+
+class ChatHistoryBackend(ABC):
+    """Durable storage of session histories."""
+
+    @abstractmethod
+    def revision(self, key: SessionKey) -> int:
+        """Current revision of the session; 0 if it has never been written."""
+
+    @abstractmethod
+    def load(self, key: SessionKey) -> Tuple[List[BaseMessage], int]:
+        """All messages of the session, oldest first, and the revision they reflect."""
+
+    @abstractmethod
+    def apply(self, key: SessionKey, operations: Sequence[Operation]) -> int:
+        """Apply buffered operations in order, atomically. Returns the new revision."""
+
+
+class SQLChatHistoryBackend(ChatHistoryBackend):
+    """
+    Stores histories in `chat_sessions`/`chat_messages` tables through a SQLAlchemy
+    engine (MySQL or SQLite). The tables are created if they don't exist.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        metadata = MetaData()
+        self.sessions = Table(
+            "chat_sessions", metadata,
+            Column("user_id", String(64), primary_key=True),
+            Column("session_id", String(128), primary_key=True),
+            Column("revision", Integer, nullable=False),
+            Column("updated_at", DateTime, nullable=False),
+        )
+        self.messages = Table(
+            "chat_messages", metadata,
+            Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+            Column("user_id", String(64), nullable=False),
+            Column("session_id", String(128), nullable=False),
+            Column("message", Text().with_variant(mysql.MEDIUMTEXT(), "mysql"), nullable=False),
+            Index("ix_chat_messages_session", "user_id", "session_id", "id"),
+        )
+        metadata.create_all(engine, checkfirst=True)
+
+    def _session_filter(self, table, key: SessionKey):
+        return (table.c.user_id == key[0]) & (table.c.session_id == key[1])
+
+    def revision(self, key: SessionKey) -> int:
+        with self.engine.connect() as connection:
+            revision = connection.execute(
+                select(self.sessions.c.revision).where(self._session_filter(self.sessions, key))
+            ).scalar()
+        return revision or 0
+
+    def load(self, key: SessionKey) -> Tuple[List[BaseMessage], int]:
+        with self.engine.connect() as connection:
+            revision = connection.execute(
+                select(self.sessions.c.revision).where(self._session_filter(self.sessions, key))
+            ).scalar()
+            rows = connection.execute(
+                select(self.messages.c.message)
+                .where(self._session_filter(self.messages, key))
+                .order_by(self.messages.c.id)
+            ).scalars().all()
+        return messages_from_dict([json.loads(row) for row in rows]), revision or 0
+
+    def apply(self, key: SessionKey, operations: Sequence[Operation]) -> int:
+        with self.engine.begin() as connection:
+            for kind, messages in operations:
+                if kind == "replace":
+                    connection.execute(delete(self.messages).where(self._session_filter(self.messages, key)))
+                if messages:
+                    connection.execute(insert(self.messages), [
+                        {"user_id": key[0], "session_id": key[1], "message": json.dumps(message_to_dict(m))}
+                        for m in messages
+                    ])
+            return self._bump_revision(connection, key)
+
+    def _bump_revision(self, connection, key: SessionKey) -> int:
+        now = datetime.utcnow()
+        bumped = connection.execute(
+            update(self.sessions).where(self._session_filter(self.sessions, key))
+            .values(revision=self.sessions.c.revision + 1, updated_at=now)
+        ).rowcount
+        if not bumped:
+            try:
+                with connection.begin_nested():
+                    connection.execute(insert(self.sessions).values(
+                        user_id=key[0], session_id=key[1], revision=1, updated_at=now))
+            except IntegrityError:
+                # Another worker created the row first
+                connection.execute(
+                    update(self.sessions).where(self._session_filter(self.sessions, key))
+                    .values(revision=self.sessions.c.revision + 1, updated_at=now)
+                )
+        return connection.execute(
+            select(self.sessions.c.revision).where(self._session_filter(self.sessions, key))
+        ).scalar()
+
+
+class WriteBehindWriter:
+    """
+    Buffers history writes per session and applies them to the backend on a background
+    thread every `flush_interval_ms`, so requests never wait on the database to save a turn.
+    """
+
+    def __init__(self, backend: ChatHistoryBackend, flush_interval_ms: int,
+                 on_flushed: Callable[[SessionKey, int], None] = None):
+        """
+        Args:
+            backend: Where buffered operations are written.
+            flush_interval_ms (int): Delay between background flushes.
+            on_flushed: Called with (key, new revision) after a session's operations are written.
+        """
+        self.backend = backend
+        self.flush_interval = flush_interval_ms / 1000
+        self.on_flushed = on_flushed
+        self._pending: "OrderedDict[SessionKey, List[Operation]]" = OrderedDict()
+        # Keys whose operations were taken out of the buffer but are not written yet
+        self._in_flight: Dict[SessionKey, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="session-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, key: SessionKey, kind: str, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            operations = self._pending.setdefault(key, [])
+            if kind == "replace":
+                # Earlier buffered writes of this session are overwritten anyway
+                operations.clear()
+            operations.append((kind, list(messages)))
+
+    def has_pending(self, key: SessionKey) -> bool:
+        with self._lock:
+            return key in self._pending or key in self._in_flight
+
+    def flush(self) -> None:
+        """Write everything buffered so far."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, OrderedDict()
+                for key in batch:
+                    self._in_flight[key] = self._in_flight.get(key, 0) + 1
+            for key, operations in batch.items():
+                try:
+                    revision = self.backend.apply(key, operations)
+                    SESSION_WRITE_BEHIND_FLUSHES.labels(result="ok").inc()
+                    if self.on_flushed:
+                        self.on_flushed(key, revision)
+                except Exception as e:
+                    SESSION_WRITE_BEHIND_FLUSHES.labels(result="error").inc()
+                    logger.error(f"Failed to persist chat history for {key}: {e}. Retrying on the next flush.")
+                    with self._lock:
+                        # Keep order: the failed operations go before anything buffered since
+                        self._pending[key] = operations + self._pending.get(key, [])
+                        self._pending.move_to_end(key, last=False)
+                finally:
+                    with self._lock:
+                        self._in_flight[key] -= 1
+                        if not self._in_flight[key]:
+                            del self._in_flight[key]
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Session write-behind flush failed: {e}")
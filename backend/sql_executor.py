@@ -0,0 +1,211 @@
+import datetime
+import decimal
+import logging
+import re
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import Config
+from schema_cache import DEFAULT_ROLE
+from sql_guard import check_read_only
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Bounded execution of LLM-generated SQL.
+# Every query runs under a server-side statement timeout and a LIMIT, rows
+# are streamed from the cursor in batches, and the result is rendered as a
+# column header plus pipe-separated rows, cut to a token budget so a broad
+# query can't flood the answer prompt.
+# ---------------------------------------------------------------------
+
+_TRAILING_LIMIT = re.compile(
+    r"\bLIMIT\s+(?:(\d+)\s*,\s*)?(\d+)(?:\s+OFFSET\s+(\d+))?\s*$", re.IGNORECASE
+)
+
+FETCH_BATCH_SIZE = 50
+
+# Driver errors raised when the server or the SQLite progress handler cancels a statement
+MYSQL_QUERY_TIMEOUT_ERRNO = 3024  # ER_QUERY_TIMEOUT, "maximum statement execution time exceeded"
+POSTGRES_QUERY_CANCELED = "57014"
+
+
+def enforce_limit(query: str, max_rows: int) -> str:
+    """
+    Cap the rows a query returns at `max_rows`: lower a trailing LIMIT that asks for more,
+    or append one when there is none.
+    """
+    query = query.strip().rstrip(";").rstrip()
+    match = _TRAILING_LIMIT.search(query)
+    if not match:
+        # New line, so a trailing "-- comment" can't swallow the clause
+        return f"{query}\nLIMIT {max_rows}"
+
+    if int(match.group(2)) <= max_rows:
+        return query
+    if match.group(1) is not None:
+        # MySQL's "LIMIT offset, count" form
+        limit = f"LIMIT {match.group(1)}, {max_rows}"
+    elif match.group(3) is not None:
+        limit = f"LIMIT {max_rows} OFFSET {match.group(3)}"
+    else:
+        limit = f"LIMIT {max_rows}"
+    return query[:match.start()] + limit
+
+
+def format_value(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return format(value.normalize(), "f") if value == value.to_integral() else str(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value).replace("\n", " ")
+
+
+def is_statement_timeout(error: SQLAlchemyError) -> bool:
+    """True when `error` is a statement cancelled by the timeout set in `SQLExecutor._apply_timeout`."""
+    orig = getattr(error, "orig", None)
+    if orig is None:
+        return False
+    # psycopg2 exposes the SQLSTATE as pgcode, psycopg 3 as sqlstate
+    if (getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)) == POSTGRES_QUERY_CANCELED:
+        return True
+    args = getattr(orig, "args", ())
+    if args and args[0] == MYSQL_QUERY_TIMEOUT_ERRNO:
+        return True
+    return str(orig) == "interrupted"  # sqlite3, aborted by the progress handler
+
+
+class SQLExecutor:
+    """
+    Runs read queries on the `SQLDatabase` engine with a statement timeout, a row cap
+    and a token-budgeted, compact text result.
+    """
+
+    def __init__(self, db, max_rows: int = None, timeout_ms: int = None, token_budget: int = None,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        """
+        Args:
+            db: The LangChain SQLDatabase returned by `db.init_db`.
+            max_rows (int): Maximum rows fetched per query.
+            timeout_ms (int): Server-side statement timeout in milliseconds. 0 disables it.
+            token_budget (int): Maximum tokens of the rendered result.
+            count_tokens: Token counter for the budget. Defaults to a 4-characters-per-token estimate.
+        """
+        self.engine = db._engine
+        self.max_rows = Config.SQL_MAX_ROWS if max_rows is None else max_rows
+        self.timeout_ms = Config.SQL_STATEMENT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+        self.token_budget = Config.SQL_RESULT_TOKEN_BUDGET if token_budget is None else token_budget
+        self.count_tokens = count_tokens or (lambda s: len(s) // 4 + 1)
+
+    def run(self, query: str, role: str = DEFAULT_ROLE) -> str:
+        """
+        Execute `query` for a user of `role` and return the compact result, "" when no rows
+        match, or an "Error: ..." string (the convention of LangChain's QuerySQLDatabaseTool).
+        """
+        reason = check_read_only(query, role)
+        if reason:
+            logger.warning(f"Refusing to execute SQL ({reason}): {query}")
+            return f"Error: {reason}."
+
+        # One row past the cap tells whether the result was cut off
+        bounded_query = enforce_limit(query, self.max_rows + 1)
+        started = time.perf_counter()
+        try:
+            with self.engine.connect() as connection:
+                reset_timeout = self._apply_timeout(connection, started)
+                result = None
+                try:
+                    result = connection.execution_options(stream_results=True).execute(text(bounded_query))
+                    if not result.returns_rows:
+                        return ""
+                    columns = list(result.keys())
+                    rows = self._fetch(result)
+                finally:
+                    # A partly read server-side cursor must be closed before the reset can run
+                    if result is not None:
+                        result.close()
+                    reset_timeout()
+        except SQLAlchemyError as e:
+            if is_statement_timeout(e):
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                logger.warning(f"SQL query cancelled after {elapsed_ms:.0f} ms: {bounded_query}")
+                return f"Error: the query exceeded the {self.timeout_ms} ms time limit and was cancelled."
+            return f"Error: {e}"
+
+        logger.info(f"SQL query returned {len(rows)} row(s) in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return self.render(columns, rows[:self.max_rows], capped=len(rows) > self.max_rows)
+
+    def _fetch(self, result) -> List[tuple]:
+        rows = []
+        while len(rows) <= self.max_rows:
+            batch = result.fetchmany(min(FETCH_BATCH_SIZE, self.max_rows + 1 - len(rows)))
+            if not batch:
+                break
+            rows.extend(tuple(row) for row in batch)
+        return rows
+
+    def _apply_timeout(self, connection, started: float) -> Callable[[], None]:
+        """
+        Set the statement timeout for this connection; returns a function that undoes it, so a
+        pooled connection never carries it over to other users of the engine (e.g. session storage).
+        """
+        if not self.timeout_ms:
+            return lambda: None
+        dialect = connection.dialect.name
+        if dialect == "mysql":
+            # Applies to read-only SELECT statements, which is all the chat pipeline runs
+            connection.execute(text(f"SET SESSION MAX_EXECUTION_TIME = {int(self.timeout_ms)}"))
+            return lambda: self._reset_session(connection, "SET SESSION MAX_EXECUTION_TIME = DEFAULT")
+        elif dialect == "postgresql":
+            # Transaction-scoped: the rollback when the connection returns to the pool undoes it
+            connection.execute(text(f"SET LOCAL statement_timeout = {int(self.timeout_ms)}"))
+        elif dialect == "sqlite":
+            # No server-side timeout: abort from the VM progress callback once the deadline passes
+            deadline = started + self.timeout_ms / 1000
+            raw = connection.connection.driver_connection
+            raw.set_progress_handler(lambda: int(time.perf_counter() > deadline), 10000)
+            return lambda: raw.set_progress_handler(None, 0)
+        return lambda: None
+
+    @staticmethod
+    def _reset_session(connection, statement: str) -> None:
+        try:
+            connection.execute(text(statement))
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not reset the statement timeout ({e}); discarding the connection.")
+            connection.invalidate()
+
+    def render(self, columns: List[str], rows: List[tuple], capped: bool = False) -> str:
+        """
+        Render a header line and pipe-separated rows, dropping trailing rows that don't fit
+        the token budget, followed by a row-count note. `capped` means the query matched
+        more rows than were fetched.
+        """
+        if not rows:
+            return ""
+
+        lines = [" | ".join(columns)]
+        used = self.count_tokens(lines[0])
+        for row in rows:
+            line = " | ".join(format_value(value) for value in row)
+            line_tokens = self.count_tokens(line)
+            if used + line_tokens > self.token_budget and len(lines) > 1:
+                break
+            lines.append(line)
+            used += line_tokens
+
+        shown = len(lines) - 1
+        if shown < len(rows):
+            lines.append(f"({shown} of {len(rows)} fetched rows shown; the rest did not fit the answer budget)")
+        elif capped:
+            lines.append(f"(first {shown} rows shown; the query matched more, results are capped at {self.max_rows})")
+        else:
+            lines.append(f"({shown} row{'s' if shown != 1 else ''})")
+        return "\n".join(lines)
@@ -0,0 +1,134 @@
+import logging
+import math
+from typing import Optional
+
+import sqlparse
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlparse import tokens as T
+
+from config import Config
+from schema_cache import DEFAULT_ROLE, ROLE_HIDDEN_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Pre-execution checks for LLM-generated SQL.
+# A query must be a single read-only SELECT (CTEs allowed) that doesn't
+# touch the tables or columns ROLE_HIDDEN_SCHEMA hides from the role (chat
+# transcripts share the engine and are hidden from everyone), and on MySQL
+# its EXPLAIN estimate of rows examined must stay under
+# SQL_MAX_ROWS_EXAMINED. The rejection reason is phrased so it can be fed
+# back to the model for a regeneration attempt.
+# ---------------------------------------------------------------------
+
+# Functions that block, touch files or take locks even inside a SELECT
+_FORBIDDEN_FUNCTIONS = {"sleep", "benchmark", "load_file", "get_lock", "release_lock", "pg_sleep"}
+
+
+def check_read_only(query: str, role: str = DEFAULT_ROLE) -> Optional[str]:
+    """
+    Return why `query` is not a single read-only SELECT that `role` may run, or None if it is.
+    Without a role the most restricted one applies.
+    """
+    statements = [s for s in sqlparse.parse(query or "") if s.token_first(skip_cm=True, skip_ws=True)]
+    if not statements:
+        return "the query is empty"
+    if len(statements) > 1:
+        return "only a single statement is allowed, but the query contains several"
+
+    statement = statements[0]
+    if statement.get_type() != "SELECT":
+        return f"only SELECT statements are allowed, not {statement.get_type()}"
+
+    hidden = ROLE_HIDDEN_SCHEMA.get(role, ROLE_HIDDEN_SCHEMA[DEFAULT_ROLE])
+    denied_tables = {table for table, columns in hidden.items() if columns == "*"}
+    denied_columns = {column.lower() for columns in hidden.values() if columns != "*" for column in columns}
+
+    previous = []
+    for token in statement.flatten():
+        if token.is_whitespace or token.ttype in T.Comment:
+            continue
+        value = token.normalized.upper()
+        if value in ("UPDATE", "SHARE") and previous[-1:] == ["FOR"]:
+            return "locking reads (FOR UPDATE/FOR SHARE) are not allowed"
+        # MySQL's older spelling of FOR SHARE; sqlparse may merge the words into one token
+        if (previous + value.split())[-4:] == ["LOCK", "IN", "SHARE", "MODE"]:
+            return "locking reads (LOCK IN SHARE MODE) are not allowed"
+        if token.ttype in T.DML and value != "SELECT" or token.ttype in T.DDL:
+            return f"the query must not contain {value}"
+        if token.ttype in T.Keyword and value == "INTO":
+            return "SELECT ... INTO is not allowed"
+        if token.ttype in T.Name and value.lower() in _FORBIDDEN_FUNCTIONS:
+            return f"the function {value.lower()}() is not allowed"
+        if token.ttype in T.Name or token.ttype in T.Keyword:
+            # Identifiers may be quoted (`chat_messages`, "users"); schema qualifiers are separate tokens
+            name = token.value.strip('`"[]').lower()
+            if name in denied_tables:
+                return f"the table {name} may not be queried"
+            if name in denied_columns:
+                return f"the column {name} may not be queried"
+        previous = (previous + value.split())[-3:]
+    return None
+
+
+class SQLGuard:
+    """
+    Read-only and cost checks run on generated SQL before it reaches the database.
+    """
+
+    def __init__(self, db, max_rows_examined: int = None):
+        """
+        Args:
+            db: The LangChain SQLDatabase returned by `db.init_db`.
+            max_rows_examined (int): EXPLAIN row estimate above which a query is rejected.
+                0 disables the cost check.
+        """
+        self.engine = db._engine
+        self.max_rows_examined = Config.SQL_MAX_ROWS_EXAMINED if max_rows_examined is None else max_rows_examined
+
+    def check(self, query: str, role: str = DEFAULT_ROLE) -> Optional[str]:
+        """Return why `query` must not run for `role`, or None if it may."""
+        reason = check_read_only(query, role)
+        if reason or not self.max_rows_examined:
+            return reason
+
+        estimate = self.estimate_rows_examined(query)
+        if estimate is not None and estimate > self.max_rows_examined:
+            return (f"the query is estimated to examine about {estimate:,} rows, over the limit of "
+                    f"{self.max_rows_examined:,}; filter on indexed columns such as employee_code and "
+                    f"avoid joins without a join condition")
+        return None
+
+    def estimate_rows_examined(self, query: str) -> Optional[int]:
+        """
+        Estimate rows examined from MySQL's EXPLAIN: within each SELECT the nested-loop
+        joins multiply, and the SELECTs of a query add up. None when no estimate is available.
+        """
+        if self.engine.dialect.name != "mysql":
+            return None
+        try:
+            with self.engine.connect() as connection:
+                result = connection.execute(text(f"EXPLAIN {query.strip().rstrip(';')}"))
+                plan = [dict(row._mapping) for row in result]
+        except SQLAlchemyError as e:
+            # Syntax and unknown-column errors surface again, with the real message, at execution
+            logger.warning(f"EXPLAIN failed, skipping the cost check: {e}")
+            return None
+
+        per_select = {}
+        for step in plan:
+            rows = step.get("rows") or 1
+            filtered = step.get("filtered")
+            per_select.setdefault(step.get("id"), []).append((rows, filtered))
+
+        total = 0
+        for steps in per_select.values():
+            examined, fan_out = 0, 1
+            for rows, filtered in steps:
+                # Each table is read once per row surviving the tables before it
+                examined += fan_out * rows
+                fan_out *= rows * (float(filtered) / 100 if filtered is not None else 1)
+            total += examined
+        logger.info(f"EXPLAIN estimates {math.ceil(total):,} rows examined")
+        return math.ceil(total)
@@ -0,0 +1,242 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+
+from config import Config
+from metrics import record_cache_event
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Intent-to-SQL template cache for write_query.
+# After an LLM-generated query executes successfully, the caller's
+# employee_code is replaced with a placeholder and the template is stored
+# under the embedding of the de-personalized question plus the role. A later
+# question from the same role that is close enough in embedding space reuses
+# the template with its own employee_code and skips the SQL LLM calls.
+# Templates whose string literals (leave types, months, ...) or numbers
+# (years, LIMITs, thresholds) don't match the new question are never reused,
+# nor are templates stored for a question with other relative-time words
+# ("last year" vs "this year"), which the SQL encodes as date arithmetic.
+# Follow-up turns ("and last year?") depend on the chat history, so callers
+# only use the cache for questions asked without history.
+# ---------------------------------------------------------------------
+
+EMPLOYEE_CODE_PLACEHOLDER = "{employee_code}"
+
+# Words that select a period without a literal: `YEAR(CURDATE()) - 1`, `DATE_FORMAT(..., '%Y-%m')`
+_TIME_WORDS = frozenset("""
+    this last next previous prior current past coming upcoming ago today yesterday tomorrow
+    week weekly month monthly quarter quarterly year yearly annual fiscal ytd
+    january february march april may june july august september october november december
+    jan feb mar apr jun jul aug sep sept oct nov dec
+""".split())
+
+_NUMBER_PATTERN = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?!\w)")
+
+# Questions referring to third parties depend on names or chat context and are never templated.
+_THIRD_PARTY_PATTERN = re.compile(r"\b(he|she|him|her|his|hers|they|them|their|theirs)\b", re.IGNORECASE)
+
+
+class SQLTemplateCache:
+    """
+    Bounded LRU/TTL cache of parameterized SQL keyed by question embedding and role.
+    """
+
+    def __init__(self, embedding_model, schema_version: Callable[[], int] = None, max_size: int = None,
+                 ttl_seconds: int = None, similarity_threshold: float = None):
+        """
+        Args:
+            embedding_model: A LangChain embeddings instance (e.g. HuggingFaceEmbeddings).
+            schema_version (Callable[[], int]): Returns the current schema snapshot version;
+                the cache is cleared whenever it changes.
+            max_size (int): Maximum number of templates kept.
+            ttl_seconds (int): Age after which a template is evicted.
+            similarity_threshold (float): Minimum cosine similarity for a hit.
+        """
+        self.embedding_model = embedding_model
+        self.schema_version = schema_version or (lambda: 0)
+        self.max_size = Config.SQL_TEMPLATE_CACHE_SIZE if max_size is None else max_size
+        self.ttl_seconds = Config.SQL_TEMPLATE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.similarity_threshold = (Config.SQL_TEMPLATE_CACHE_THRESHOLD
+                                     if similarity_threshold is None else similarity_threshold)
+
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._next_id = 0
+        self._version = self.schema_version()
+        self._lock = threading.Lock()
+
+    def lookup(self, question: str, role: str, employee_code: int) -> Optional[str]:
+        """Return SQL instantiated for the caller on a confident hit, otherwise None."""
+        if not self._cacheable_question(question):
+            return None
+        vector = self._embed(question, employee_code)
+
+        with self._lock:
+            self._expire()
+            best_id, best_similarity = None, -1.0
+            question_words = _words(question)
+            question_numbers = _question_numbers(question, employee_code)
+            time_words = _time_words(question_words)
+            for entry_id, entry in self._entries.items():
+                if (entry["role"] != role or entry["time_words"] != time_words
+                        or not _literals_mentioned(entry["literals"], question_words)
+                        or not _numbers_match(entry["numbers"], question_numbers)):
+                    continue
+                similarity = float(entry["vector"] @ vector)
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None or best_similarity < self.similarity_threshold:
+                self.misses += 1
+                record_cache_event("sql_template", False)
+                return None
+
+            self.hits += 1
+            record_cache_event("sql_template", True)
+            self._entries.move_to_end(best_id)
+            template = self._entries[best_id]["template"]
+
+        logger.info(f"SQL template cache hit (similarity={best_similarity:.3f}).")
+        return template.replace(EMPLOYEE_CODE_PLACEHOLDER, str(int(employee_code)))
+
+    def store(self, question: str, role: str, employee_code: int, sql_query: str) -> bool:
+        """
+        Store a successfully executed query as a template. Only queries scoped to the
+        caller's own employee_code are cached, so an instantiated template can never
+        read someone else's data.
+        """
+        if not self._cacheable_question(question) or employee_code is None:
+            return False
+        code_pattern = re.compile(rf"(?<![\w.]){int(employee_code)}(?![\w.])")
+        if not code_pattern.search(sql_query):
+            return False
+        template = code_pattern.sub(EMPLOYEE_CODE_PLACEHOLDER, sql_query)
+        vector = self._embed(question, employee_code)
+
+        with self._lock:
+            self._expire()
+            literals = _sql_literals(template)
+            numbers = _sql_numbers(template)
+            time_words = _time_words(_words(question))
+            for entry_id, entry in self._entries.items():
+                if (entry["role"] == role and entry["literals"] == literals and entry["numbers"] == numbers
+                        and entry["time_words"] == time_words and float(entry["vector"] @ vector) >= self.similarity_threshold):
+                    entry.update(template=template, created_at=time.monotonic())
+                    self._entries.move_to_end(entry_id)
+                    return True
+
+            self._entries[self._next_id] = {
+                "role": role, "vector": vector, "template": template, "literals": literals,
+                "numbers": numbers, "time_words": time_words, "created_at": time.monotonic()
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _expire(self) -> None:
+        """Drop everything on a schema change and templates older than the TTL. Caller holds the lock."""
+        version = self.schema_version()
+        if version != self._version:
+            logger.info(f"Schema version changed ({self._version} -> {version}); clearing SQL template cache.")
+            self._entries.clear()
+            self._version = version
+            return
+        if self.ttl_seconds:
+            cutoff = time.monotonic() - self.ttl_seconds
+            for entry_id in [i for i, e in self._entries.items() if e["created_at"] < cutoff]:
+                del self._entries[entry_id]
+
+    def _embed(self, question: str, employee_code: int) -> np.ndarray:
+        vector = np.asarray(self.embedding_model.embed_query(depersonalize(question, employee_code)),
+                            dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    @staticmethod
+    def _cacheable_question(question: str) -> bool:
+        return bool(question) and not _THIRD_PARTY_PATTERN.search(question)
+
+
+def depersonalize(question: str, employee_code: int = None) -> str:
+    """Normalize a question so that the same intent from different employees maps to the same text."""
+    text = question.strip().lower()
+    if employee_code is not None:
+        text = re.sub(rf"\b{int(employee_code)}\b", "my employee code", text)
+    text = re.sub(r"\b(i'm|i am|me|mine|myself)\b", "i", text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _sql_literals(sql_query: str) -> frozenset:
+    """Quoted string literals in a query, e.g. the leave type in `leave_type = 'Sick'`."""
+    return frozenset(literal.lower() for literal in re.findall(r"'([^']*)'", sql_query))
+
+
+def _sql_numbers(sql_query: str) -> frozenset:
+    """Numeric literals outside quoted strings, e.g. `YEAR(start_date) = 2023` or `LIMIT 5`."""
+    return frozenset(_number(n) for n in _NUMBER_PATTERN.findall(re.sub(r"'[^']*'", "''", sql_query)))
+
+
+def _question_numbers(question: str, employee_code: int = None) -> frozenset:
+    numbers = {_number(n) for n in _NUMBER_PATTERN.findall(question)}
+    if employee_code is not None:
+        numbers.discard(str(int(employee_code)))
+    return frozenset(numbers)
+
+
+def _number(text: str) -> str:
+    return text.rstrip("0").rstrip(".") if "." in text else text.lstrip("0") or "0"
+
+
+def _numbers_match(template_numbers: frozenset, question_numbers: frozenset) -> bool:
+    """
+    Embeddings barely tell 2023 from 2024 or "top 5" from "top 10", so every number in the
+    question must be in the template and vice versa. 0 and 1 are exempt on the template side,
+    since `LIMIT 1` or `> 0` usually come from the wording ("my last leave") and not a number.
+    """
+    return question_numbers <= template_numbers and template_numbers - {"0", "1"} <= question_numbers
+
+
+def _words(text: str) -> list:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def _time_words(question_words: list) -> frozenset:
+    """
+    Relative-time words of a question. "last year" and "this year" embed almost identically
+    and their SQL differs only in date arithmetic, so a template needs exactly the same set.
+    """
+    return frozenset(word for word in question_words if word in _TIME_WORDS)
+
+
+def _literals_mentioned(literals: frozenset, question_words: list) -> bool:
+    """
+    Embeddings of "sick leaves" and "casual leaves" questions are very close, so a template is
+    only reused when every word of its string literals also appears (as a prefix) in the question.
+    """
+    for literal in literals:
+        for word in _words(literal):
+            if len(word) > 2 and not any(q.startswith(word) for q in question_words):
+                return False
+    return True
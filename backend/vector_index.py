@@ -0,0 +1,253 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import pickle
+import threading
+import time
+from typing import Optional
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from config import Config
+from metrics import POLICY_INDEX_RELOADS
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Search index types for the policy vector store.
+# rag_index.py keeps an exact flat index (index.faiss) as the source of
+# truth for incremental updates. When the corpus outgrows exhaustive search
+# it also writes search.faiss, an HNSW or IVF-PQ index built from the same
+# vectors in the same order, so the docstore mapping of index.pkl applies to
+# both. With POLICY_INDEX_MMAP the inverted lists of an IVF-PQ index are
+# memory-mapped instead of read into memory; faiss 1.7 can't map any other
+# index type, so flat and HNSW indexes are always loaded into each worker.
+#
+# `VectorStoreHandle` holds the loaded store for the app and swaps in a new
+# generation when rag_index.py publishes one, without a restart.
+# ---------------------------------------------------------------------
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+SEARCH_INDEX_FILE = "search.faiss"
+SEARCH_META_FILE = "search.json"
+IVFPQ_MIN_TRAINING_VECTORS = 256
+
+
+def choose_index_type(num_vectors: int, requested: str = None) -> str:
+    """The configured index type, or for "auto" the one suited to `num_vectors`."""
+    requested = (requested or Config.POLICY_INDEX_TYPE).lower()
+    if requested in INDEX_TYPES:
+        return requested
+    if requested != "auto":
+        raise ValueError(f"Unknown index type '{requested}', expected 'auto' or one of {INDEX_TYPES}")
+    if num_vectors >= Config.POLICY_IVFPQ_MIN_VECTORS:
+        return "ivfpq"
+    if num_vectors >= Config.POLICY_HNSW_MIN_VECTORS:
+        return "hnsw"
+    return "flat"
+
+
+def pq_subquantizers(dimension: int) -> int:
+    """Largest divisor of `dimension` not above POLICY_PQ_SUBQUANTIZERS."""
+    for m in range(min(Config.POLICY_PQ_SUBQUANTIZERS, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def build_search_index(vectors: np.ndarray, index_type: str) -> Optional[faiss.Index]:
+    """
+    Build an index of `index_type` over `vectors` (added in order, so positions match the
+    flat index). Returns None for "flat", which is searched directly, and for IVF-PQ on
+    fewer vectors than its product quantizer needs to train.
+    """
+    if index_type == "flat":
+        return None
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, Config.POLICY_HNSW_M)
+        index.hnsw.efConstruction = Config.POLICY_HNSW_EF_CONSTRUCTION
+    elif index_type == "ivfpq":
+        # 8-bit PQ codes need 256 training points per subquantizer; below that faiss refuses to train
+        if count < IVFPQ_MIN_TRAINING_VECTORS:
+            logger.warning(f"Only {count} vectors, too few to train IVF-PQ; using the flat index.")
+            return None
+        # ~4 * sqrt(n) lists, with enough points per list to train the coarse quantizer
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimension), dimension, nlist, pq_subquantizers(dimension), 8)
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown index type '{index_type}'")
+
+    index.add(vectors)
+    return index
+
+
+def configure_search(index: faiss.Index) -> faiss.Index:
+    """Apply the query-time search breadth of HNSW / IVF indexes."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = Config.POLICY_HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = Config.POLICY_IVF_NPROBE
+    return index
+
+
+def write_search_index(vectorstore: FAISS, folder: str, index_type: str = None, generation: str = None) -> str:
+    """
+    Write the search index for a saved flat vector store into `folder`, recording the build's
+    `generation` id next to it. Returns the type used.
+    """
+    flat = vectorstore.index
+    index_type = choose_index_type(flat.ntotal, index_type)
+    search_path = os.path.join(folder, SEARCH_INDEX_FILE)
+    index = build_search_index(flat.reconstruct_n(0, flat.ntotal), index_type) if flat.ntotal else None
+
+    if index is None:
+        index_type = "flat"
+        if os.path.exists(search_path):
+            os.remove(search_path)
+    else:
+        faiss.write_index(index, search_path)
+    with open(os.path.join(folder, SEARCH_META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"index_type": index_type, "ntotal": flat.ntotal, "generation": generation}, f)
+    logger.info(f"Policy search index: {index_type} over {flat.ntotal} vectors.")
+    return index_type
+
+
+def read_index(path: str, mmap: bool = None) -> faiss.Index:
+    """Read a search index; `mmap` maps IVF inverted lists and is ignored by other index types."""
+    mmap = Config.POLICY_INDEX_MMAP if mmap is None else mmap
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    return configure_search(faiss.read_index(path, flags))
+
+
+def load_vectorstore(folder: str, embedding_model, mmap: bool = None) -> FAISS:
+    """
+    Open a policy vector store saved by rag_index.py for searching, using its HNSW/IVF-PQ
+    index when one was built and the flat index otherwise.
+    """
+    with open(os.path.join(folder, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    search_path = os.path.join(folder, SEARCH_INDEX_FILE)
+    index = read_index(search_path, mmap) if os.path.exists(search_path) else None
+    if index is not None and index.ntotal != len(index_to_docstore_id):
+        logger.warning(f"{search_path} is out of date ({index.ntotal} vectors, "
+                       f"{len(index_to_docstore_id)} documents); searching the flat index.")
+        index = None
+    if index is None:
+        index = read_index(os.path.join(folder, "index.faiss"), mmap)
+
+    # faiss only maps the inverted lists of IVF indexes; every other type is read into memory
+    mapped = (Config.POLICY_INDEX_MMAP if mmap is None else mmap) and isinstance(index, faiss.IndexIVF)
+    logger.info(f"Loaded policy vector store: {type(index).__name__}, {index.ntotal} vectors, "
+                f"{'inverted lists memory-mapped' if mapped else 'read into memory'}.")
+    return FAISS(embedding_model, index, docstore, index_to_docstore_id)
+
+
+def index_generation(folder: str) -> str:
+    """
+    The generation id rag_index.py wrote into search.json, identical in every worker that
+    loaded the same build. Indexes built before it was recorded get one from their fingerprint.
+    """
+    try:
+        with open(os.path.join(folder, SEARCH_META_FILE), encoding="utf-8") as f:
+            generation = json.load(f).get("generation")
+    except (OSError, ValueError):
+        generation = None
+    return generation or hashlib.sha256(repr(index_fingerprint(folder)).encode("utf-8")).hexdigest()[:16]
+
+
+def index_fingerprint(folder: str) -> tuple:
+    """
+    Identify the on-disk index generation by the size and mtime of its files. rag_index.py
+    replaces the whole folder, so any rebuild changes it.
+    """
+    fingerprint = []
+    for name in ("index.faiss", "index.pkl", SEARCH_INDEX_FILE):
+        try:
+            stat = os.stat(os.path.join(folder, name))
+            fingerprint.append((stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+class VectorStoreHandle:
+    """
+    Versioned reference to the policy vector store. A new index generation is loaded on a
+    background thread (or on an admin request) and swapped in with a single assignment,
+    so in-flight searches keep using the store they started with.
+    """
+
+    def __init__(self, folder: str, embedding_model, poll_seconds: float = None):
+        """
+        Args:
+            folder (str): Index folder written by rag_index.py.
+            embedding_model: Query embeddings of the store.
+            poll_seconds (float): How often to look for a new generation (0 disables watching).
+        """
+        self.folder = folder
+        self.embedding_model = embedding_model
+        self.poll_seconds = Config.POLICY_INDEX_POLL_SECONDS if poll_seconds is None else poll_seconds
+
+        # Build id of the active index, the same across workers (see index_generation)
+        self.generation = None
+        # Incremented on every swap in this process; local caches compare it to invalidate
+        self.version = 0
+        self._store = None
+        self._fingerprint = None
+        self._failed_fingerprint = None
+        self._reload_lock = threading.Lock()
+
+        self.reload()
+        if self.poll_seconds > 0:
+            threading.Thread(target=self._watch, name="policy-index-watch", daemon=True).start()
+
+    @property
+    def current(self) -> Optional[FAISS]:
+        """The active store, or None when no index could be loaded."""
+        return self._store
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Load the index on disk and swap it in if it is a new generation (or `force`).
+        Returns True when a new store was swapped in. Searches are never blocked.
+        """
+        with self._reload_lock:
+            fingerprint = index_fingerprint(self.folder)
+            if not force and fingerprint in (self._fingerprint, self._failed_fingerprint):
+                return False
+            try:
+                generation = index_generation(self.folder)
+                store = load_vectorstore(self.folder, self.embedding_model)
+            except Exception as e:
+                # Keep serving the previous generation; a half-swapped folder is retried on the next poll
+                self._failed_fingerprint = fingerprint
+                POLICY_INDEX_RELOADS.labels(result="error").inc()
+                logger.error(f"Failed to load policy index from {self.folder}: {e}")
+                return False
+
+            # Recorded from before the load, so a rebuild that landed meanwhile is picked up next time
+            self._fingerprint = fingerprint
+            self._failed_fingerprint = None
+            self._store = store
+            self.generation = generation
+            self.version += 1
+            POLICY_INDEX_RELOADS.labels(result="ok").inc()
+            logger.info(f"Policy index generation {generation} active ({store.index.ntotal} vectors).")
+            return True
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Policy index watch failed: {e}")
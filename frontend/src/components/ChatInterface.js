@@ -1,6 +1,5 @@
 
 import React, { useState, useRef, useEffect } from 'react';
-import axios from 'axios';
 import { Box, TextField, IconButton, Typography, CircularProgress, InputAdornment } from '@mui/material';
 import SendIcon from '@mui/icons-material/Send';
 import EmojiEmotionsIcon from '@mui/icons-material/EmojiEmotions';
@@ -26,12 +25,30 @@ function ChatInterface({ token, user, showNotification }) {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
+  const [stage, setStage] = useState('');
   const chatEndRef = useRef(null);
 
   useEffect(() => {
     chatEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages]);
 
+  const STAGE_LABELS = {
+    classified: 'Understanding your question...',
+    sql_executed: 'Looking up your records...',
+    policy_retrieved: 'Checking HR policies...'
+  };
+
+  // Parse a block of Server-Sent Events ("event: x\ndata: {...}") into { event, data }
+  const parseEvent = (block) => {
+    let event = 'message';
+    let data = '';
+    block.split('\n').forEach(line => {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data += line.slice(5).trim();
+    });
+    return { event, data: data ? JSON.parse(data) : {} };
+  };
+
   const sendMessage = async () => {
     if (!input.trim()) return;
 
@@ -41,24 +58,63 @@ function ChatInterface({ token, user, showNotification }) {
     setMessages(prev => [...prev, userMessage]);
     setInput('');
     setLoading(true);
+    setStage('');
+
+    let started = false;
+    const appendToAnswer = (text) => {
+      if (!started) {
+        started = true;
+        setLoading(false);
+        setMessages(msgs => [
+          ...msgs,
+          {
+            role: 'assistant',
+            content: text,
+            timestamp: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
+          }
+        ]);
+        return;
+      }
+      setMessages(msgs => {
+        const last = msgs[msgs.length - 1];
+        return [...msgs.slice(0, -1), { ...last, content: last.content + text }];
+      });
+    };
 
     try {
       const sessionId = getSessionId();
-      const res = await axios.post(`${BACKEND_BASE_URL}/chat`, {
-        message: input,
-        session_id: sessionId
-      }, {
-        headers: { Authorization: `Bearer ${token}` }
+      const res = await fetch(`${BACKEND_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          Authorization: `Bearer ${token}`
+        },
+        body: JSON.stringify({ message: input, session_id: sessionId })
       });
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
 
-      setMessages(msgs => [
-        ...msgs,
-        {
-          role: 'assistant',
-          content: res.data.response,
-          timestamp: new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
+        const blocks = buffer.split('\n\n');
+        buffer = blocks.pop();
+        for (const block of blocks) {
+          if (!block.trim()) continue;
+          const { event, data } = parseEvent(block);
+          if (event === 'stage') setStage(STAGE_LABELS[data.stage] || '');
+          else if (event === 'token') appendToAnswer(data.text);
+          else if (event === 'error') {
+            if (!started) appendToAnswer(data.response);
+            showNotification('Error sending message', 'error');
+          }
         }
-      ]);
+      }
     } catch (err) {
       showNotification('Error sending message', 'error');
     }
@@ -147,7 +203,7 @@ function ChatInterface({ token, user, showNotification }) {
             >
               <CircularProgress size={16} sx={{ color: '#6c5ce7' }} />
               <Typography variant="body2" sx={{ color: '#636e72' }}>
-                Typing...
+                {stage || 'Typing...'}
               </Typography>
             </Box>
           </Box>